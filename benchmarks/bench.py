@@ -0,0 +1,275 @@
+"""time and memory benchmarks for phylim
+
+Run from the repository root, for example
+
+    python -m benchmarks.bench run --quick -o results.json
+    python -m benchmarks.bench compare before.json after.json
+"""
+
+import json
+import platform
+import statistics
+import subprocess
+import time
+import tracemalloc
+
+from collections.abc import Callable, Iterator
+from typing import Union
+
+import click
+import numpy
+
+from cogent3 import get_model
+
+from benchmarks.generators import (
+    DEFAULT_MIX,
+    TREE_SHAPES,
+    assign_categories,
+    make_param_rules,
+    make_psubs,
+    make_tree,
+)
+from phylim._version import __version__
+from phylim.apps import InferenceContext, phylim
+from phylim.check_boundary import ParamArrays, check_boundary
+from phylim.classify_matrix import LIMIT, MatrixCategory, classify_matrix
+from phylim.delta_col import calc_delta_col
+from phylim.eval_identifiability import eval_paths
+from phylim.topology import clear_tree_index_cache
+
+
+TIP_COUNTS = 10, 100, 1_000, 10_000, 100_000
+QUICK_TIP_COUNTS = 10, 100, 1_000
+DIMS = 4, 20, 61
+
+# cap the number of stacked matrix elements, so codon sized psubs are not
+# generated for the largest trees
+MAX_ELEMENTS = 50_000_000
+# building a likelihood function is the limit for the end-to-end benchmark
+MAX_E2E_TIPS = 2_000
+# the upper bound of a branch length, at which a GTR psub is a limit matrix
+_LIMIT_LENGTH = 10.0
+
+
+def measure(func: Callable, repeat: int, setup: Union[Callable, None] = None) -> dict:
+    """the times of repeat calls of func, and the peak memory of one call
+
+    Args:
+        setup: called, untimed, before each call of func
+    """
+    setup = setup or (lambda: None)
+    times = []
+    for _ in range(repeat):
+        setup()
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+
+    setup()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "repeat": repeat,
+        "min_s": min(times),
+        "median_s": statistics.median(times),
+        "peak_mib": peak / 2**20,
+    }
+
+
+def _parse_mix(mix: str) -> dict[MatrixCategory, float]:
+    if not mix:
+        return dict(DEFAULT_MIX)
+    result = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition("=")
+        result[MatrixCategory(name.strip())] = float(weight)
+    return result
+
+
+def _cases(
+    shapes: tuple[str, ...],
+    tip_counts: tuple[int, ...],
+    dims: tuple[int, ...],
+    mix: dict[MatrixCategory, float],
+    repeat: int,
+    seed: int,
+) -> Iterator[dict]:
+    for shape in shapes:
+        for num_tips in tip_counts:
+            tree = make_tree(shape, num_tips, seed=seed)
+            categories = assign_categories(tree, mix, seed=seed)
+            num_edges = len(categories.mcats)
+            common = {"tree": shape, "num_tips": num_tips, "num_edges": num_edges}
+
+            # cold builds the TreeIndex every call, warm reuses the cached one
+            yield common | {"benchmark": "eval_paths", "dim": None} | measure(
+                lambda: eval_paths(categories.mcats, tree),
+                repeat,
+                setup=clear_tree_index_cache,
+            )
+            yield common | {"benchmark": "eval_paths_warm", "dim": None} | measure(
+                lambda: eval_paths(categories.mcats, tree), repeat
+            )
+            params = make_param_rules(num_edges, seed=seed)
+            yield common | {"benchmark": "check_boundary", "dim": None} | measure(
+                lambda: check_boundary(params), repeat
+            )
+
+            for dim in dims:
+                if num_edges * dim * dim > MAX_ELEMENTS:
+                    continue
+                psubs = make_psubs(categories, dim, seed=seed)
+
+                def classify():
+                    # a fresh ModelPsubs, so the stacked array is not reused
+                    return classify_matrix(type(psubs)(psubs.source, psubs.psubs))
+
+                def delta_col():
+                    return calc_delta_col(type(psubs)(psubs.source, psubs.psubs))
+
+                yield common | {"benchmark": "classify_matrix", "dim": dim} | measure(
+                    classify, repeat
+                )
+                yield common | {"benchmark": "calc_delta_col", "dim": dim} | measure(
+                    delta_col, repeat
+                )
+
+            app = phylim()
+            if 4 in dims and num_edges * 16 <= MAX_ELEMENTS:
+                # the psubs of every category in mix, with the param rules
+                psubs = make_psubs(categories, 4, seed=seed)
+                arrays = ParamArrays.from_rules(params)
+
+                def check_psubs():
+                    context = InferenceContext(
+                        source=psubs.source,
+                        model_name=None,
+                        tree=tree,
+                        psubs=type(psubs)(psubs.source, psubs.psubs),
+                        params=arrays,
+                    )
+                    return app(context)
+
+                yield common | {"benchmark": "phylim_psubs", "dim": 4} | measure(
+                    check_psubs, repeat, setup=clear_tree_index_cache
+                )
+
+            if num_tips <= MAX_E2E_TIPS:
+                # a GTR model on the tree's branch lengths, with the limit
+                # edges at the upper bound of length so their psubs are not DLC
+                lf_tree = tree.deepcopy()
+                for (name,), mcat in categories.mcats.items():
+                    if mcat is LIMIT:
+                        lf_tree.get_node_matching_name(name).length = _LIMIT_LENGTH
+                lf = get_model("GTR").make_likelihood_function(lf_tree)
+                yield common | {"benchmark": "phylim", "dim": 4} | measure(
+                    lambda: app(lf), repeat, setup=clear_tree_index_cache
+                )
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _metadata(mix: dict[MatrixCategory, float], seed: int) -> dict:
+    return {
+        "phylim_version": __version__,
+        "git_revision": _git_revision(),
+        "python": platform.python_version(),
+        "numpy": numpy.__version__,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "mix": {m.value: w for m, w in mix.items()},
+        "seed": seed,
+        "date": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+    }
+
+
+@click.group()
+def main():
+    """phylim benchmarks"""
+
+
+@main.command()
+@click.option(
+    "-o", "--output", type=click.Path(dir_okay=False), help="write results as json"
+)
+@click.option(
+    "--shape",
+    "shapes",
+    multiple=True,
+    type=click.Choice(TREE_SHAPES),
+    help="tree shapes, default all",
+)
+@click.option("--tips", "tip_counts", multiple=True, type=int, help="numbers of tips")
+@click.option("--dim", "dims", multiple=True, type=int, help="alphabet sizes")
+@click.option(
+    "--mix",
+    default="",
+    help="category proportions, e.g. DLC=0.8,sympathetic=0.2",
+)
+@click.option("--repeat", default=5, show_default=True, type=click.IntRange(min=1))
+@click.option("--seed", default=0, show_default=True)
+@click.option("--quick", is_flag=True, help=f"only {QUICK_TIP_COUNTS} tips")
+def run(output, shapes, tip_counts, dims, mix, repeat, seed, quick):
+    """time and memory-profile the phylim stages on synthetic trees"""
+    mix = _parse_mix(mix)
+    tip_counts = tip_counts or (QUICK_TIP_COUNTS if quick else TIP_COUNTS)
+    results = []
+    for result in _cases(
+        shapes or TREE_SHAPES, tip_counts, dims or DIMS, mix, repeat, seed
+    ):
+        results.append(result)
+        click.echo(
+            f"{result['benchmark']:<16} {result['tree']:<12} "
+            f"{result['num_tips']:>7} tips  dim={str(result['dim']):<4} "
+            f"{result['min_s'] * 1e3:>10.2f} ms  {result['peak_mib']:>8.1f} MiB"
+        )
+
+    if output:
+        with open(output, "w") as outfile:
+            json.dump(
+                {"metadata": _metadata(mix, seed), "results": results},
+                outfile,
+                indent=2,
+            )
+
+
+def _key(result: dict) -> tuple:
+    return result["benchmark"], result["tree"], result["num_tips"], result["dim"]
+
+
+@main.command()
+@click.argument("before", type=click.File())
+@click.argument("after", type=click.File())
+def compare(before, after):
+    """ratio of min times and peak memory, AFTER relative to BEFORE"""
+    before = {_key(r): r for r in json.load(before)["results"]}
+    after = {_key(r): r for r in json.load(after)["results"]}
+    click.echo(
+        f"{'benchmark':<16} {'tree':<12} {'tips':>7} {'dim':>4} {'time':>8} {'memory':>8}"
+    )
+    for key in sorted(before.keys() & after.keys(), key=str):
+        old, new = before[key], after[key]
+        click.echo(
+            f"{key[0]:<16} {key[1]:<12} {key[2]:>7} {str(key[3]):>4} "
+            f"{new['min_s'] / old['min_s']:>7.2f}x "
+            f"{new['peak_mib'] / max(old['peak_mib'], 1e-9):>7.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,149 @@
+"""synthetic trees, psubs and parameters for the benchmarks"""
+
+import numpy
+
+from cogent3.core.tree import PhyloNode
+from cogent3.util.dict_array import DictArray
+
+from phylim.check_boundary import ParamRules
+from phylim.classify_matrix import (
+    CHAINSAW,
+    DLC,
+    IDENTITY,
+    LIMIT,
+    SYMPATHETIC,
+    MatrixCategory,
+    ModelMatrixCategories,
+    ModelPsubs,
+)
+
+
+TREE_SHAPES = "random", "balanced", "caterpillar"
+
+DEFAULT_MIX = {DLC: 0.7, SYMPATHETIC: 0.15, LIMIT: 0.05, CHAINSAW: 0.05, IDENTITY: 0.05}
+
+
+def make_tree(shape: str, num_tips: int, seed: int = 0) -> PhyloNode:
+    """a tree with tips t0, t1, ... and internal nodes edge.0, edge.1, ...
+
+    Branch lengths are drawn from an exponential distribution with mean 0.1.
+    Trees are built without recursion, so caterpillars of any size work.
+    """
+    if num_tips < 3:
+        raise ValueError("trees need at least 3 tips")
+    if shape not in TREE_SHAPES:
+        raise ValueError(f"unknown tree shape {shape!r}, choose from {TREE_SHAPES}")
+
+    rng = numpy.random.default_rng(seed)
+    nodes = [PhyloNode(name=f"t{i}") for i in range(num_tips)]
+    num_internal = 0
+
+    def join(children):
+        nonlocal num_internal
+        node = PhyloNode(name=f"edge.{num_internal}", children=children)
+        num_internal += 1
+        return node
+
+    if shape == "caterpillar":
+        node = nodes[0]
+        for tip in nodes[1:-2]:
+            node = join([node, tip])
+        nodes = [node, nodes[-2], nodes[-1]]
+    elif shape == "balanced":
+        while len(nodes) > 3:
+            paired = [join(nodes[i : i + 2]) for i in range(0, len(nodes) - 1, 2)]
+            nodes = paired + nodes[len(paired) * 2 :]
+    else:
+        while len(nodes) > 3:
+            first, second = rng.choice(len(nodes), size=2, replace=False)
+            nodes[first] = join([nodes[first], nodes[second]])
+            nodes[second] = nodes[-1]
+            nodes.pop()
+
+    tree = PhyloNode(name="root", children=nodes)
+    for node in tree.preorder(include_self=False):
+        node.length = float(rng.exponential(0.1))
+    return tree
+
+
+def _dlc(num: int, dim: int, rng: numpy.random.Generator) -> numpy.ndarray:
+    # a diagonal weight above one half makes every diagonal the column maximum
+    weight = rng.uniform(0.55, 0.95, size=(num, 1, 1))
+    noise = rng.dirichlet(numpy.ones(dim), size=(num, dim))
+    return weight * numpy.eye(dim) + (1 - weight) * noise
+
+
+def make_matrices(
+    mcat: MatrixCategory, num: int, dim: int, rng: numpy.random.Generator
+) -> numpy.ndarray:
+    """(num, dim, dim) stochastic matrices of category mcat"""
+    if mcat is IDENTITY:
+        return numpy.broadcast_to(numpy.eye(dim), (num, dim, dim)).copy()
+    if mcat is LIMIT:
+        rows = rng.dirichlet(numpy.ones(dim), size=num)
+        return numpy.repeat(rows[:, numpy.newaxis, :], dim, axis=1)
+    if mcat is DLC:
+        return _dlc(num, dim, rng)
+    if mcat is CHAINSAW:
+        # the row permutation must not be the identity
+        return _dlc(num, dim, rng)[:, numpy.roll(numpy.arange(dim), 1), :]
+    if mcat is SYMPATHETIC:
+        if dim < 3:
+            # every 2x2 stochastic matrix is DLC, chainsaw or limit
+            raise ValueError("sympathetic matrices need a dimension of at least 3")
+        # duplicating a row ties a diagonal with an off-diagonal element and
+        # puts two column maxima in the same row
+        result = _dlc(num, dim, rng)
+        result[:, 1, :] = result[:, 0, :]
+        return result
+    raise ValueError(f"unknown category {mcat!r}")
+
+
+def assign_categories(
+    tree: PhyloNode, mix: dict[MatrixCategory, float], seed: int = 0
+) -> ModelMatrixCategories:
+    """edge categories drawn with the probabilities in mix"""
+    rng = numpy.random.default_rng(seed)
+    mcats = list(mix)
+    probs = numpy.array([mix[m] for m in mcats], dtype=float)
+    names = [n.name for n in tree.preorder(include_self=False)]
+    drawn = rng.choice(len(mcats), size=len(names), p=probs / probs.sum())
+    return ModelMatrixCategories(
+        source="synthetic", mcats={(n,): mcats[c] for n, c in zip(names, drawn)}
+    )
+
+
+def make_psubs(
+    categories: ModelMatrixCategories, dim: int, seed: int = 0
+) -> ModelPsubs:
+    """psubs of dimension dim with the given edge categories"""
+    rng = numpy.random.default_rng(seed)
+    keys = list(categories.mcats)
+    stacked = numpy.empty((len(keys), dim, dim))
+    drawn = numpy.array([m.value for m in categories.mcats.values()])
+    for mcat in MatrixCategory:
+        where = numpy.flatnonzero(drawn == mcat.value)
+        if where.size:
+            stacked[where] = make_matrices(mcat, where.size, dim, rng)
+    return ModelPsubs(
+        source=categories.source,
+        psubs={key: DictArray(matrix) for key, matrix in zip(keys, stacked)},
+    )
+
+
+def make_param_rules(
+    num_params: int, at_bound: float = 0.05, seed: int = 0
+) -> ParamRules:
+    """rate parameter rules, the fraction at_bound of them at a boundary"""
+    rng = numpy.random.default_rng(seed)
+    lower, upper = 1e-6, 50.0
+    init = rng.uniform(0.1, 10.0, size=num_params)
+    bounded = rng.random(num_params) < at_bound
+    init[bounded] = numpy.where(rng.random(bounded.sum()) < 0.5, lower, upper)
+    return ParamRules(
+        source="synthetic",
+        params=[
+            {"par_name": f"rate.{i}", "init": float(v), "lower": lower, "upper": upper}
+            for i, v in enumerate(init)
+        ],
+    )
@@ -0,0 +1,358 @@
+import collections
+import dataclasses
+import math
+
+from typing import Union
+
+import numpy
+
+from cogent3.app.composable import NotCompleted, define_app
+from cogent3.core.table import Table
+from cogent3.util.deserialise import register_deserialiser
+from cogent3.util.misc import get_object_provenance
+
+from phylim._version import __version__
+from phylim.apps import PhyloLimitRec
+from phylim.classify_matrix import DLC, MatrixCategory
+from phylim.eval_identifiability import ViolationType
+
+
+class QuantileSketch:
+    """mergeable quantile sketch with bounded relative error
+
+    Values are counted in buckets whose bounds grow geometrically, so every
+    quantile is within relative_accuracy of a value of the data. Values with
+    a magnitude below min_value are counted as zero, magnitudes above
+    max_value are counted in the largest bucket. The number of buckets is
+    fixed by these three settings, so memory does not grow with the data.
+
+    Notes:
+        Sketches with the same settings merge exactly, the result is the
+        sketch of the combined data.
+    """
+
+    __slots__ = (
+        "relative_accuracy",
+        "min_value",
+        "max_value",
+        "_log_gamma",
+        "_min_key",
+        "positive",
+        "negative",
+        "zero",
+        "min",
+        "max",
+    )
+
+    def __init__(
+        self,
+        relative_accuracy: float = 0.01,
+        min_value: float = 1e-12,
+        max_value: float = 1.0,
+    ) -> None:
+        if not 0 < relative_accuracy < 1:
+            raise ValueError(
+                f"relative_accuracy must be between 0 and 1, not {relative_accuracy}"
+            )
+        if not 0 < min_value < max_value:
+            raise ValueError(
+                f"need 0 < min_value < max_value, got {min_value=}, {max_value=}"
+            )
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.max_value = max_value
+        gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(gamma)
+        self._min_key = math.ceil(math.log(min_value) / self._log_gamma)
+        num_buckets = (
+            math.ceil(math.log(max_value) / self._log_gamma) - self._min_key + 1
+        )
+        self.positive = numpy.zeros(num_buckets, dtype=numpy.int64)
+        self.negative = numpy.zeros(num_buckets, dtype=numpy.int64)
+        self.zero = 0
+        self.min = math.inf
+        self.max = -math.inf
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(count={self.count}, "
+            f"relative_accuracy={self.relative_accuracy})"
+        )
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, QuantileSketch):
+            return NotImplemented
+        return (
+            self._settings == other._settings
+            and self.zero == other.zero
+            and numpy.array_equal(self.positive, other.positive)
+            and numpy.array_equal(self.negative, other.negative)
+        )
+
+    @property
+    def _settings(self) -> tuple[float, float, float]:
+        return self.relative_accuracy, self.min_value, self.max_value
+
+    @property
+    def count(self) -> int:
+        return int(self.positive.sum() + self.negative.sum()) + self.zero
+
+    def _buckets(self, magnitudes: numpy.ndarray) -> numpy.ndarray:
+        keys = numpy.ceil(numpy.log(magnitudes) / self._log_gamma) - self._min_key
+        return numpy.clip(keys, 0, len(self.positive) - 1).astype(numpy.int64)
+
+    def update(self, values) -> None:
+        """add values to the sketch, nan values are ignored"""
+        values = numpy.asarray(values, dtype=float).ravel()
+        values = values[~numpy.isnan(values)]
+        if not values.size:
+            return
+        self.min = min(self.min, float(values.min()))
+        self.max = max(self.max, float(values.max()))
+        magnitudes = numpy.abs(values)
+        small = magnitudes < self.min_value
+        self.zero += int(small.sum())
+        for counts, selected in (
+            (self.positive, (values > 0) & ~small),
+            (self.negative, (values < 0) & ~small),
+        ):
+            if selected.any():
+                counts += numpy.bincount(
+                    self._buckets(magnitudes[selected]), minlength=len(counts)
+                )
+
+    def merge(self, other: "QuantileSketch") -> None:
+        """add the counts of other, which must have the same settings"""
+        if self._settings != other._settings:
+            raise ValueError("can only merge sketches with the same settings")
+        self.positive += other.positive
+        self.negative += other.negative
+        self.zero += other.zero
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def quantile(self, q: float) -> float:
+        """the value at quantile q, nan for an empty sketch"""
+        if not 0 <= q <= 1:
+            raise ValueError(f"q must be between 0 and 1, not {q}")
+        count = self.count
+        if not count:
+            return math.nan
+        if q == 0:
+            return self.min
+        if q == 1:
+            return self.max
+
+        # buckets in increasing order of value: negative values from the
+        # largest magnitude down, zero, then positive values
+        counts = numpy.concatenate([self.negative[::-1], [self.zero], self.positive])
+        rank = q * (count - 1)
+        position = int(numpy.searchsorted(numpy.cumsum(counts), rank, side="right"))
+        num = len(self.positive)
+        if position == num:
+            return 0.0
+        if position < num:
+            sign, key = -1.0, num - 1 - position
+        else:
+            sign, key = 1.0, position - num - 1
+        gamma = math.exp(self._log_gamma)
+        # the midpoint, in relative terms, of the bucket bounds
+        value = 2 * gamma ** (key + self._min_key) / (gamma + 1)
+        return min(max(sign * value, self.min), self.max)
+
+    def quantiles(self, qs) -> list[float]:
+        return [self.quantile(q) for q in qs]
+
+    def to_rich_dict(self) -> dict:
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "min_value": self.min_value,
+            "max_value": self.max_value,
+            # the buckets are sparse, so only the occupied ones are stored
+            "positive": _sparse(self.positive),
+            "negative": _sparse(self.negative),
+            "zero": self.zero,
+            "min": None if self.min == math.inf else self.min,
+            "max": None if self.max == -math.inf else self.max,
+        }
+
+    @classmethod
+    def from_rich_dict(cls, data: dict) -> "QuantileSketch":
+        result = cls(data["relative_accuracy"], data["min_value"], data["max_value"])
+        for name in ("positive", "negative"):
+            keys, counts = data[name]
+            getattr(result, name)[keys] = counts
+        result.zero = data["zero"]
+        result.min = math.inf if data["min"] is None else data["min"]
+        result.max = -math.inf if data["max"] is None else data["max"]
+        return result
+
+
+def _sparse(counts: numpy.ndarray) -> list[list[int]]:
+    keys = numpy.flatnonzero(counts)
+    return [keys.tolist(), counts[keys].tolist()]
+
+
+# the quantiles shown by PhyloLimitSummary.to_table
+SUMMARY_QUANTILES = 0.01, 0.05, 0.25, 0.5, 0.75, 0.95, 0.99
+
+
+@dataclasses.dataclass(slots=True)
+class PhyloLimitSummary:
+    """run-level counts of many PhyloLimitRec, kept in bounded memory
+
+    Notes:
+        Only counters and a QuantileSketch of the delta_col of every edge
+        are kept, not the records. Summaries of separate runs merge into
+        the summary of all of them. Matrix categories are counted from the
+        non-DLC edges of each record, DLC edges are the remaining edges of
+        records with delta_col.
+    """
+
+    num_records: int = 0
+    num_not_completed: int = 0
+    num_identifiable: int = 0
+    num_with_boundary: int = 0
+    violation_types: collections.Counter = dataclasses.field(
+        default_factory=collections.Counter
+    )
+    categories: collections.Counter = dataclasses.field(
+        default_factory=collections.Counter
+    )
+    boundary_params: collections.Counter = dataclasses.field(
+        default_factory=collections.Counter
+    )
+    delta_col: QuantileSketch = dataclasses.field(default_factory=QuantileSketch)
+
+    @property
+    def fraction_identifiable(self) -> float:
+        return (
+            self.num_identifiable / self.num_records if self.num_records else math.nan
+        )
+
+    @property
+    def fraction_with_boundary(self) -> float:
+        return (
+            self.num_with_boundary / self.num_records if self.num_records else math.nan
+        )
+
+    def add(self, record: Union[PhyloLimitRec, dict, NotCompleted]) -> None:
+        """count a record, or its rich dict"""
+        if isinstance(record, NotCompleted):
+            self.num_not_completed += 1
+            return
+        if isinstance(record, dict):
+            record = PhyloLimitRec.from_rich_dict(record)
+
+        self.num_records += 1
+        self.num_identifiable += record.is_identifiable
+        self.violation_types[record.check.violation_type.name] += 1
+
+        if record.boundary_values:
+            self.num_with_boundary += 1
+            self.boundary_params.update(v["par_name"] for v in record.boundary_values)
+
+        nondlc = record.nondlc_and_identity
+        if nondlc is not None:
+            self.categories.update(m.name for m in nondlc.values())
+        if record.delta_col is not None:
+            self.delta_col.update(list(record.delta_col.values()))
+            if nondlc is not None:
+                self.categories[DLC.name] += len(record.delta_col) - len(nondlc)
+
+    def merge(self, other: "PhyloLimitSummary") -> None:
+        """add the counts of other"""
+        self.num_records += other.num_records
+        self.num_not_completed += other.num_not_completed
+        self.num_identifiable += other.num_identifiable
+        self.num_with_boundary += other.num_with_boundary
+        self.violation_types.update(other.violation_types)
+        self.categories.update(other.categories)
+        self.boundary_params.update(other.boundary_params)
+        self.delta_col.merge(other.delta_col)
+
+    def __add__(self, other: "PhyloLimitSummary") -> "PhyloLimitSummary":
+        result = PhyloLimitSummary.from_rich_dict(self.to_rich_dict())
+        result.merge(other)
+        return result
+
+    def to_rich_dict(self) -> dict:
+        return {
+            "type": get_object_provenance(self),
+            "num_records": self.num_records,
+            "num_not_completed": self.num_not_completed,
+            "num_identifiable": self.num_identifiable,
+            "num_with_boundary": self.num_with_boundary,
+            "violation_types": dict(self.violation_types),
+            "categories": dict(self.categories),
+            "boundary_params": dict(self.boundary_params),
+            "delta_col": self.delta_col.to_rich_dict(),
+            "version": __version__,
+        }
+
+    @classmethod
+    def from_rich_dict(cls, data: dict) -> "PhyloLimitSummary":
+        return cls(
+            num_records=data["num_records"],
+            num_not_completed=data["num_not_completed"],
+            num_identifiable=data["num_identifiable"],
+            num_with_boundary=data["num_with_boundary"],
+            violation_types=collections.Counter(data["violation_types"]),
+            categories=collections.Counter(data["categories"]),
+            boundary_params=collections.Counter(data["boundary_params"]),
+            delta_col=QuantileSketch.from_rich_dict(data["delta_col"]),
+        )
+
+    def to_table(self) -> Table:
+        headers = ["statistic", "value"]
+        rows = [
+            ["records", self.num_records],
+            ["not completed", self.num_not_completed],
+            ["fraction identifiable", self.fraction_identifiable],
+            ["fraction with boundary values", self.fraction_with_boundary],
+        ]
+        rows.extend(
+            [f"violation {vtype.name}", self.violation_types[vtype.name]]
+            for vtype in ViolationType
+        )
+        rows.extend(
+            [f"edges {mcat.name}", self.categories[mcat.name]]
+            for mcat in MatrixCategory
+        )
+        rows.extend(
+            [f"delta_col q{q:g}", self.delta_col.quantile(q)] for q in SUMMARY_QUANTILES
+        )
+        return Table(header=headers, data=rows, title="Phylo Limits Summary")
+
+    def _repr_html_(self) -> str:
+        table = self.to_table()
+        table.set_repr_policy(show_shape=False)
+        return table._repr_html_()
+
+
+@register_deserialiser(get_object_provenance(PhyloLimitSummary))
+def deserialise_phylo_limit_summary(data: dict) -> PhyloLimitSummary:
+    return PhyloLimitSummary.from_rich_dict(data)
+
+
+@define_app(skip_not_completed=False)
+class phylim_aggregate:
+    """count PhyloLimitRec results, or their rich dicts, into a summary
+    Args:
+        "summary" is the PhyloLimitSummary counted into, a new one if None.
+    Return:
+        the input unchanged, so the app can sit between phylim and a writer
+    Notes:
+        The running counts are in the "summary" attribute. Apps in separate
+        worker processes each keep a summary, merge them with
+        PhyloLimitSummary.merge.
+    """
+
+    def __init__(self, summary: Union[PhyloLimitSummary, None] = None) -> None:
+        self.summary = PhyloLimitSummary() if summary is None else summary
+
+    def main(
+        self, record: Union[PhyloLimitRec, dict, NotCompleted]
+    ) -> Union[PhyloLimitRec, dict, NotCompleted]:
+        self.summary.add(record)
+        return record
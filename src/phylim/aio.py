@@ -0,0 +1,262 @@
+"""asyncio front-end for checking the model_results in a data store"""
+
+import asyncio
+import dataclasses
+import os
+import time
+
+from collections.abc import AsyncIterator, Iterable
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Union
+
+from cogent3.app.composable import NotCompleted
+from cogent3.app.data_store import DataMember, DataStoreABC, get_unique_id
+from cogent3.app.io import load_db, load_json, write_db, write_json
+from cogent3.app.result import model_result
+
+from phylim.apps import (
+    BatchSummary,
+    PhyloLimitRec,
+    load_rich_dict,
+    phylim,
+    phylim_filter,
+)
+from phylim.parallel import _is_sqlite, _open_dstore, _spawn_pool
+
+
+Result = Union[PhyloLimitRec, model_result, NotCompleted]
+
+
+@dataclasses.dataclass(slots=True)
+class _Loaded:
+    """the data of a data store member, read by the reader thread
+
+    Stands in for the member when loading, as load_json and load_db only
+    call its read method.
+    """
+
+    identifier: str
+    unique_id: str
+    source: str
+    data: Union[str, bytes]
+
+    def read(self) -> Union[str, bytes]:
+        return self.data
+
+
+def _close(dstore: DataStoreABC) -> None:
+    # only sqlite data stores hold a connection
+    if _is_sqlite(dstore):
+        dstore.close()
+
+
+def _list_members(
+    source: Union[DataStoreABC, str], skip: frozenset[str]
+) -> tuple[DataStoreABC, list[DataMember], int]:
+    """the opened source, the members not in skip and the number skipped"""
+    dstore = _open_dstore(source, mode="r", reopen=True)
+    members = dstore.completed
+    todo = [m for m in members if get_unique_id(m) not in skip]
+    return dstore, todo, len(members) - len(todo)
+
+
+def _read_members(members: list[DataMember]) -> list[_Loaded]:
+    return [
+        _Loaded(
+            identifier=get_unique_id(member),
+            unique_id=member.unique_id,
+            source=str(member.data_store.source),
+            data=member.read(),
+        )
+        for member in members
+    ]
+
+
+def _check_loaded(
+    loaded: list[_Loaded],
+    sqlite: bool,
+    strict: bool,
+    verdict_only: bool,
+    as_filter: bool,
+) -> list[tuple[str, Result]]:
+    """deserialise and check members read by the reader thread, runs in a
+    worker process"""
+    if as_filter:
+        # the filter returns the model_result, so it is deserialised
+        loader = load_db() if sqlite else load_json()
+        app = loader + phylim_filter(strict=strict)
+    else:
+        app = load_rich_dict() + phylim(strict=strict, verdict_only=verdict_only)
+    return [(item.identifier, app(item)) for item in loaded]
+
+
+async def iter_phylim_async(
+    source: Union[DataStoreABC, str],
+    strict: bool = False,
+    verdict_only: bool = False,
+    as_filter: bool = False,
+    executor: Union[Executor, None] = None,
+    max_workers: Union[int, None] = None,
+    max_in_flight: Union[int, None] = None,
+    chunksize: int = 16,
+    skip: Iterable[str] = (),
+    counts: Union[dict[str, int], None] = None,
+) -> AsyncIterator[list[tuple[str, Result]]]:
+    """check the model_results in a data store, yielding the results of each
+    chunk of members as it completes
+
+    Args:
+        source: a directory or sqlitedb data store, or its path
+        strict, verdict_only: passed to phylim
+        as_filter: apply phylim_filter instead of phylim, so results are the
+            identifiable model_results or a NotCompleted
+        executor: runs the checks, the default is a process pool of
+            max_workers processes which is shut down at the end
+        max_in_flight: the most chunks being read or checked at once,
+            default twice the number of workers
+        chunksize: number of members read and checked in one task
+        skip: identifiers of members to leave out
+        counts: if provided, receives the number of members to check
+            ("num_todo") and of members skipped ("num_skipped")
+    Notes:
+        Members are read by one thread, so reading overlaps with checking.
+        No more chunks are started while max_in_flight are pending, so a slow
+        consumer of the results holds back reading.
+    """
+    if chunksize < 1:
+        raise ValueError(f"chunksize must be positive, not {chunksize}")
+    loop = asyncio.get_running_loop()
+    reader = ThreadPoolExecutor(max_workers=1, thread_name_prefix="phylim-read")
+    own_executor = executor is None
+    if own_executor:
+        executor = _spawn_pool(max_workers)
+    if max_in_flight is None:
+        max_in_flight = 2 * (max_workers or os.cpu_count() or 1)
+
+    async def read_and_check(members: list[DataMember]) -> list[tuple[str, Result]]:
+        loaded = await loop.run_in_executor(reader, _read_members, members)
+        return await loop.run_in_executor(
+            executor, _check_loaded, loaded, sqlite, strict, verdict_only, as_filter
+        )
+
+    pending = set()
+    dstore = None
+    try:
+        dstore, members, num_skipped = await loop.run_in_executor(
+            reader, _list_members, source, frozenset(skip)
+        )
+        if counts is not None:
+            counts["num_todo"] = len(members)
+            counts["num_skipped"] = num_skipped
+        sqlite = _is_sqlite(dstore)
+        chunks = (
+            members[start : start + chunksize]
+            for start in range(0, len(members), chunksize)
+        )
+        while True:
+            for chunk in chunks:
+                pending.add(asyncio.ensure_future(read_and_check(chunk)))
+                if len(pending) >= max_in_flight:
+                    break
+            if not pending:
+                return
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+            for task in done:
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
+        if own_executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+        if dstore is not None:
+            reader.submit(_close, dstore)
+        reader.shutdown(wait=False)
+
+
+class _Writer:
+    """writes results to a data store, all methods run in the writer thread"""
+
+    def __init__(self, out_dstore: Union[DataStoreABC, str]) -> None:
+        self.dstore = _open_dstore(out_dstore, mode="a", reopen=True)
+        writer = write_db if _is_sqlite(self.dstore) else write_json
+        self._writer = writer(self.dstore)
+
+    def identifiers(self) -> frozenset[str]:
+        return frozenset(get_unique_id(m) for m in self.dstore)
+
+    def write(self, results: list[tuple[str, Result]]) -> int:
+        """write results, returning the number not completed"""
+        for identifier, result in results:
+            self._writer.main(result, identifier=identifier)
+        return sum(isinstance(r, NotCompleted) for _, r in results)
+
+    def close(self) -> None:
+        _close(self.dstore)
+
+
+async def phylim_async(
+    source: Union[DataStoreABC, str],
+    out_dstore: Union[DataStoreABC, str],
+    strict: bool = False,
+    verdict_only: bool = False,
+    as_filter: bool = False,
+    executor: Union[Executor, None] = None,
+    max_workers: Union[int, None] = None,
+    max_in_flight: Union[int, None] = None,
+    chunksize: int = 16,
+) -> BatchSummary:
+    """check the model_results in source, writing the results to out_dstore
+
+    Args:
+        out_dstore: writeable data store (or its path), a sqlitedb or a
+            directory of json files
+        the other arguments are as for iter_phylim_async
+    Return:
+        BatchSummary with the number of completed / not completed results
+        and the throughput
+    Notes:
+        Reading, checking and writing overlap. Results are written by one
+        thread while further chunks are read and checked. Inputs whose
+        result is already in out_dstore are skipped. With as_filter, the
+        identifiable model_results are written.
+    """
+    start = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    writer_thread = ThreadPoolExecutor(max_workers=1, thread_name_prefix="phylim-write")
+    try:
+        writer = await loop.run_in_executor(writer_thread, _Writer, out_dstore)
+        done = await loop.run_in_executor(writer_thread, writer.identifiers)
+        num_checked = num_not_completed = 0
+        counts = {}
+        try:
+            async for results in iter_phylim_async(
+                source,
+                strict=strict,
+                verdict_only=verdict_only,
+                as_filter=as_filter,
+                executor=executor,
+                max_workers=max_workers,
+                max_in_flight=max_in_flight,
+                chunksize=chunksize,
+                skip=done,
+                counts=counts,
+            ):
+                num_not_completed += await loop.run_in_executor(
+                    writer_thread, writer.write, results
+                )
+                num_checked += len(results)
+        finally:
+            await loop.run_in_executor(writer_thread, writer.close)
+    finally:
+        writer_thread.shutdown(wait=False)
+
+    source_path = source.source if isinstance(source, DataStoreABC) else source
+    return BatchSummary(
+        source=str(source_path),
+        num_completed=num_checked - num_not_completed,
+        num_not_completed=num_not_completed,
+        num_skipped=counts.get("num_skipped", 0),
+        seconds=time.perf_counter() - start,
+    )
@@ -1,10 +1,26 @@
+import base64
 import collections
+import copy
 import dataclasses
+import time
+
+from collections.abc import Iterable, Sequence
 from functools import singledispatch
-from typing import Union
+from typing import Callable, Union
 
-from cogent3.app.composable import NotCompleted, define_app
+from cogent3 import make_tree
+from cogent3.app.composable import NON_COMPOSABLE, NotCompleted, define_app
+from cogent3.app.data_store import (
+    DataMember,
+    DataStoreABC,
+    DataStoreDirectory,
+    get_unique_id,
+    load_record_from_json,
+)
+from cogent3.app.io import load_json, unpickle_it, write_db, write_json
 from cogent3.app.result import model_result
+from cogent3.app.sqlite_data_store import DataStoreSqlite
+from cogent3.app.typing import IdentifierType
 from cogent3.core.table import Table
 from cogent3.core.tree import PhyloNode
 from cogent3.draw.dendrogram import Dendrogram
@@ -12,22 +28,53 @@ from cogent3.evolve import ns_substitution_model, predicate, substitution_model
 from cogent3.evolve.models import register_model
 from cogent3.evolve.parameter_controller import AlignmentLikelihoodFunction
 from cogent3.evolve.predicate import MotifChange
+from cogent3.recalculation.definition import ParamDefn
+from cogent3.util.deserialise import deserialise_object, register_deserialiser
+from cogent3.util.misc import get_object_provenance
+from numpy import array, empty, frombuffer, inf
 
 from phylim._version import __version__
-from phylim.check_boundary import BoundsViolation, ParamRules, check_boundary
+from phylim.check_boundary import (
+    EXCLUDE_PARS,
+    BoundarySummary,
+    BoundaryTolerance,
+    BoundsViolation,
+    ParamArrays,
+    ParamRules,
+    _warn_unchecked,
+    check_boundaries,
+)
 from phylim.classify_matrix import (
     CHAINSAW,
     DLC,
     IDENTITY,
     LIMIT,
+    RICH_DICT_FORMAT,
     SYMPATHETIC,
     MatrixCategory,
     ModelMatrixCategories,
+    ClassificationCache,
     ModelPsubs,
+    _ATOL,
+    _RTOL,
+    _check_tolerances,
+    _decode_mcats,
+    _edge_name,
+    _encode_mcats,
+    _rich_dict_format,
     classify_matrix,
 )
 from phylim.delta_col import calc_delta_col
-from phylim.eval_identifiability import IdentCheckRes, eval_identifiability
+from phylim.eval_identifiability import (
+    CheckMode,
+    IdentCheckRes,
+    eval_identifiability,
+    eval_identifiability_modes,
+    eval_verdict,
+)
+from phylim.parallel import _is_sqlite, _map_chunks, _open_dstore
+from phylim.profiling import NO_PROFILE, StageProfile, _NoProfile
+from phylim.rate_matrix import expm_lengths
 
 
 @singledispatch
@@ -42,74 +89,695 @@ def _(result: AlignmentLikelihoodFunction) -> AlignmentLikelihoodFunction:
     return result
 
 
+def _get_source(lf: AlignmentLikelihoodFunction) -> str:
+    algn = lf.get_param_value("alignment")
+    return getattr(algn, "source", None) or "Unknown"
+
+
 def load_psubs(lf: AlignmentLikelihoodFunction) -> ModelPsubs:
     """get psubs"""
-    algn = lf.get_param_value("alignment")
-    source = getattr(algn, "source", None) or "Unknown"
     return ModelPsubs(
-        source=source,
+        source=_get_source(lf),
         psubs=lf.get_all_psubs(),
     )
 
 
 def load_param_values(lf: AlignmentLikelihoodFunction) -> ParamRules:
     """get non-topology param values"""
-    algn = lf.get_param_value("alignment")
-    source = getattr(algn, "source", None) or "Unknown"
     return ParamRules(
-        source=source,
+        source=_get_source(lf),
         params=lf.get_param_rules(),
     )
 
 
+class _SettingRules(Sequence):
+    """the param rules of settings of likelihood function params, each made
+    when first read
+
+    Notes:
+        A setting is a (defn, index) pair, see _free_settings. Pickles as a
+        list of all the rules.
+    """
+
+    __slots__ = ("_settings", "_rules")
+
+    def __init__(self, settings: list[tuple[ParamDefn, int]]) -> None:
+        self._settings = settings
+        self._rules: dict[int, dict] = {}
+
+    def __len__(self) -> int:
+        return len(self._settings)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[i] for i in range(len(self))[index]]
+        index = range(len(self))[index]
+        if index not in self._rules:
+            defn, position = self._settings[index]
+            # defn.get_param_rules makes one rule per setting, in order of
+            # first use in its index
+            order = list(dict.fromkeys(defn.index.values()))
+            self._rules[index] = defn.get_param_rules()[order.index(position)]
+        return self._rules[index]
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+
+def _free_settings(
+    lf: AlignmentLikelihoodFunction, exclude: frozenset[str]
+) -> tuple[list[tuple[str, object, ParamDefn, int]], list[str]]:
+    """the (par_name, setting, defn, index) of each free scalar param
+    setting, and the names of the other params that are not constant
+
+    Notes:
+        With _SettingRules, the only reader of likelihood function internals.
+        The settings are read from the param definitions so the param rules
+        are not made, test_load_param_arrays checks they match
+        lf.get_param_rules().
+    """
+    free, unchecked = [], []
+    for name in lf.get_param_names():
+        if name in exclude:
+            continue
+        defn = lf.defn_for[name]
+        scalar = isinstance(defn, ParamDefn)
+        for index, setting in enumerate(defn.uniq):
+            # the settings of params derived from others, e.g. the rate of
+            # each bin, are not settings of free params
+            if getattr(setting, "is_constant", True):
+                continue
+            if scalar:
+                free.append((name, setting, defn, index))
+            elif name not in unchecked:
+                unchecked.append(name)
+    return free, unchecked
+
+
+def load_param_arrays(
+    lf: AlignmentLikelihoodFunction, exclude: Iterable[str] = EXCLUDE_PARS
+) -> ParamArrays:
+    """the values and bounds of the free scalar params, read from their
+    settings without making the param rules
+
+    Args:
+        exclude: names of params that are not read
+    Notes:
+        A UserWarning names the free params that are not scalar, as for
+        ParamArrays.from_rules.
+    """
+    source = _get_source(lf)
+    free, unchecked = _free_settings(lf, frozenset(exclude))
+    _warn_unchecked(source, unchecked)
+    settings = [setting for _, setting, _, _ in free]
+    return ParamArrays(
+        source=source,
+        par_names=array([name for name, *_ in free], dtype=object),
+        values=array([s.value for s in settings], dtype=float),
+        lower=array([-inf if s.lower is None else s.lower for s in settings]),
+        upper=array([inf if s.upper is None else s.upper for s in settings]),
+        rules=_SettingRules([(defn, index) for *_, defn, index in free]),
+    )
+
+
+@dataclasses.dataclass(slots=True)
+class InferenceContext:
+    """everything phylim needs from a model fit, extracted from the likelihood
+    function once so the checks do not recompute psubs or param rules"""
+
+    source: str
+    model_name: Union[str, None]
+    tree: PhyloNode
+    psubs: ModelPsubs
+    params: Union[ParamArrays, None]
+
+
+def load_context(
+    inference: (
+        model_result | AlignmentLikelihoodFunction | PhyloNode | InferenceContext | dict
+    ),
+    with_params: bool = True,
+    exclude: Iterable[str] = EXCLUDE_PARS,
+) -> InferenceContext:
+    """extract the psubs, param values and tree from a model fit
+
+    Args:
+        with_params: if False, the param values are not extracted
+        exclude: names of params that are not extracted
+    Notes:
+        A tree with piqtree params is handled by load_tree_context, and a
+        rich dict by load_rich_dict_context. An InferenceContext, e.g. from a
+        PsubArchive, is returned unchanged.
+    """
+    if isinstance(inference, InferenceContext):
+        return inference
+    if isinstance(inference, dict):
+        return load_rich_dict_context(
+            inference, with_params=with_params, exclude=exclude
+        )
+    if isinstance(inference, PhyloNode):
+        return load_tree_context(inference, with_params=with_params, exclude=exclude)
+
+    lf = _get_lf(inference)
+    source = _get_source(lf)
+    return InferenceContext(
+        source=source,
+        model_name=inference.name,
+        tree=lf.tree,
+        psubs=ModelPsubs(source=source, psubs=lf.get_all_psubs()),
+        params=load_param_arrays(lf, exclude=exclude) if with_params else None,
+    )
+
+
+# the default bounds cogent3 gives rate parameters
+_RATE_LOWER, _RATE_UPPER = 1e-6, 1e6
+
+
+def load_tree_context(
+    tree: PhyloNode, with_params: bool = True, exclude: Iterable[str] = EXCLUDE_PARS
+) -> InferenceContext:
+    """the psubs and param values of a tree with piqtree params, computed
+    without a likelihood function
+
+    Args:
+        with_params: if False, the param values are not made
+        exclude: names of params that are left out
+    Notes:
+        The rate matrix is built once and the psubs of all edges are
+        exponentiated from its eigendecomposition. The param rules carry the
+        bounds cogent3 gives rate parameters, as from phylim_to_model_result.
+    """
+    submodel, params, motif_probs = _build_submodel(tree)
+    values = {p["par_name"]: p["init"] for p in params}
+    mprobs = array([motif_probs[m] for m in submodel.get_alphabet()])
+    q_matrix = submodel.calcQ(
+        mprobs,
+        submodel.calc_word_weight_matrix(mprobs),
+        *[values[name] for name in submodel.parameter_order],
+    )
+    # ordered by name, as lf.get_all_psubs()
+    edges = sorted(tree.preorder(include_self=False), key=lambda n: n.name)
+    stacked = expm_lengths(
+        q_matrix,
+        [edge.length for edge in edges],
+        mprobs=mprobs if tree.params.get("model") != "UNREST" else None,
+    )
+
+    source = tree.source or "Unknown"
+    return InferenceContext(
+        source=source,
+        model_name=tree.params.get("model"),
+        tree=tree,
+        psubs=ModelPsubs.from_array(
+            source,
+            [edge.name for edge in edges],
+            stacked,
+            motifs=list(submodel.get_alphabet()),
+        ),
+        params=(
+            ParamArrays.from_rules(
+                ParamRules(
+                    source=source,
+                    params=[
+                        p | {"lower": _RATE_LOWER, "upper": _RATE_UPPER} for p in params
+                    ],
+                ),
+                exclude=exclude,
+            )
+            if with_params
+            else None
+        ),
+    )
+
+
+# the keys of a param rule that scope it to some edges
+_EDGE_SCOPES = frozenset({"edge", "edges"})
+# param rules scoped by these are not supported by load_rich_dict_context
+_OTHER_SCOPES = frozenset({"bin", "bins", "locus", "loci"})
+
+
+# the keys of a likelihood function rich dict read by load_rich_dict_context
+_LF_KEYS = "model", "tree", "param_rules"
+
+
+def _stored_lf(data: dict) -> Union[dict, None]:
+    """the likelihood function rich dict in data, None if it has rate
+    heterogeneity, several loci or several likelihood functions
+
+    Notes:
+        Raises ValueError if the rich dict lacks a key in _LF_KEYS.
+    """
+    if data.get("type", "").endswith(".model_result"):
+        items = data.get("items") or []
+        if len(items) != 1 or not isinstance(items[0][1], dict):
+            return None
+        data = items[0][1]
+    if not data.get("type", "").endswith(".AlignmentLikelihoodFunction"):
+        return None
+    if missing := [key for key in _LF_KEYS if key not in data]:
+        raise ValueError(f"the likelihood function rich dict has no {missing}")
+    construction = data.get("likelihood_construction") or {}
+    if construction.get("bins", 1) != 1 or construction.get("loci", 1) != 1:
+        return None
+    if data["model"].get("with_rate") or data["model"].get("distribution"):
+        return None
+    return data
+
+
+def _rule_value(rule: dict):
+    return rule["init"] if "init" in rule else rule["value"]
+
+
+def _edge_values(
+    rules: list[dict], names: list[str], edges: list[str]
+) -> Union[dict[str, list[float]], None]:
+    """the value of each of the params called names on each edge, None if a
+    rule has another scope or an edge has no value"""
+    values = {name: [None] * len(edges) for name in names}
+    position = {edge: i for i, edge in enumerate(edges)}
+    for rule in rules:
+        edge_values = values.get(rule["par_name"])
+        if edge_values is None:
+            continue
+        if _OTHER_SCOPES & rule.keys():
+            return None
+        scope = [rule["edge"]] if "edge" in rule else rule.get("edges", edges)
+        for edge in scope:
+            if edge not in position:
+                return None
+            edge_values[position[edge]] = _rule_value(rule)
+    if any(None in edge_values for edge_values in values.values()):
+        return None
+    return values
+
+
+def _stored_psubs(lf_data: dict) -> Union[tuple, None]:
+    """the tree, edge names, stacked psubs and motifs of a likelihood
+    function rich dict, None if they cannot be computed from it"""
+    submodel = deserialise_object(copy.deepcopy(lf_data["model"]))
+    if not hasattr(submodel, "calcQ"):
+        return None  # a discrete substitution model
+
+    rules = lf_data["param_rules"]
+    mprobs_rules = [rule for rule in rules if rule["par_name"] == "mprobs"]
+    if (
+        len(mprobs_rules) != 1
+        or (_EDGE_SCOPES | _OTHER_SCOPES) & mprobs_rules[0].keys()
+    ):
+        return None  # non-stationary motif probs
+    motif_probs = _rule_value(mprobs_rules[0])
+
+    tree = make_tree(lf_data["tree"]["newick"])
+    # ordered by name, as lf.get_all_psubs()
+    edges = sorted(tree.get_node_names(include_self=False))
+    order = list(submodel.parameter_order)
+    values = _edge_values(rules, ["length", *order], edges)
+    if values is None:
+        return None
+
+    mprobs = array([motif_probs[m] for m in submodel.mprob_model.get_input_alphabet()])
+    word_probs = submodel.calc_word_probs(mprobs)
+    weights = submodel.calc_word_weight_matrix(mprobs)
+    reversible = isinstance(submodel, substitution_model.TimeReversible)
+    lengths = values["length"]
+    # edges with the same rate param values share one rate matrix
+    groups = collections.defaultdict(list)
+    for i, key in enumerate(zip(*(values[name] for name in order))):
+        groups[key].append(i)
+    if not order:
+        groups[()] = list(range(len(edges)))
+
+    motifs = list(submodel.get_alphabet())
+    stacked = empty((len(edges), len(motifs), len(motifs)))
+    for key, indices in groups.items():
+        stacked[indices] = expm_lengths(
+            submodel.calcQ(word_probs, weights, *key),
+            [lengths[i] for i in indices],
+            mprobs=word_probs if reversible else None,
+        )
+    return tree, edges, stacked, motifs
+
+
+def _stored_source(alignment: dict) -> str:
+    """the source of an alignment rich dict, as _get_source"""
+    # current cogent3 keeps it in the constructor args, older in the info
+    for location in (alignment.get("init_args"), alignment.get("info")):
+        if location and location.get("source"):
+            return location["source"]
+    return "Unknown"
+
+
+def load_rich_dict_context(
+    data: dict, with_params: bool = True, exclude: Iterable[str] = EXCLUDE_PARS
+) -> InferenceContext:
+    """the psubs, param values and tree of the rich dict of a model_result or
+    likelihood function, computed without deserialising it
+
+    Args:
+        with_params: if False, the param values are not made
+        exclude: names of params that are left out
+    Notes:
+        The tree, branch lengths, rate params, motif probs and bounds are read
+        from the rich dict. One rate matrix is built for each distinct set of
+        rate param values, and the psubs of its edges are exponentiated
+        together. Rich dicts with rate heterogeneity, several loci or
+        likelihood functions, non-stationary motif probs or a discrete
+        model are deserialised and handled by load_context.
+    """
+    lf_data = _stored_lf(data)
+    stored = None if lf_data is None else _stored_psubs(lf_data)
+    if stored is None:
+        return load_context(
+            deserialise_object(copy.deepcopy(data)),
+            with_params=with_params,
+            exclude=exclude,
+        )
+
+    tree, edges, stacked, motifs = stored
+    source = _stored_source(lf_data.get("alignment") or {})
+    if lf_data is data:
+        model_name = data.get("name")
+    else:
+        model_name = (data.get("result_construction") or {}).get("name")
+    return InferenceContext(
+        source=source,
+        model_name=model_name,
+        tree=tree,
+        psubs=ModelPsubs.from_array(source, edges, stacked, motifs=motifs),
+        params=(
+            ParamArrays.from_rules(
+                ParamRules(source=source, params=lf_data["param_rules"]),
+                exclude=exclude,
+            )
+            if with_params
+            else None
+        ),
+    )
+
+
+@define_app
+class load_rich_dict:
+    """load a data store member as a rich dict, without deserialising it
+    Args:
+        "deserialiser" turns the bytes of a sqlitedb member into the rich
+        dict, the reverse of the serialiser of write_db.
+    Notes:
+        phylim checks the rich dict of a model_result without building its
+        likelihood function, see load_rich_dict_context. As for load_db, the
+        default deserialiser unpickles the member, so only load data stores
+        you trust.
+    """
+
+    def __init__(self, deserialiser: Callable = unpickle_it()) -> None:
+        self.deserialiser = deserialiser
+
+    def main(self, identifier: IdentifierType) -> Union[dict, NotCompleted]:
+        data = identifier.read()
+        if isinstance(data, bytes):
+            data = self.deserialiser(data)
+        else:
+            # write_json wraps the rich dict in a record
+            data = load_record_from_json(data)[1]
+        if isinstance(data, NotCompleted):
+            return data
+        if not isinstance(data, dict) or "type" not in data:
+            return NotCompleted(
+                "ERROR",
+                self,
+                f"{identifier} is not the rich dict of a cogent3 object",
+                source=identifier,
+            )
+        return data
+
+
 @define_app
 class check_fit_boundary:
     """check if there are any rate params proximity to the bounds as 1e-10.
     This value is important as two clusters of fits divided by the value.
+    Args:
+        "tolerance" is a BoundaryTolerance giving the absolute and relative
+        tolerances of each param, and the params that are not checked.
     """
 
+    def __init__(self, tolerance: Union[BoundaryTolerance, None] = None) -> None:
+        self.tolerance = tolerance or BoundaryTolerance()
+
     def main(
         self, inference: model_result | AlignmentLikelihoodFunction
     ) -> BoundsViolation:
-        params = load_param_values(_get_lf(inference))
-        return check_boundary(params)
+        params = load_param_arrays(_get_lf(inference), exclude=self.tolerance.exclude)
+        return check_boundaries([params], self.tolerance)[0]
+
+
+def check_fit_boundaries(
+    inferences: Iterable[model_result | AlignmentLikelihoodFunction | PhyloNode],
+    tolerance: Union[BoundaryTolerance, None] = None,
+) -> BoundarySummary:
+    """the rate params at a bound in many model fits, checked in one pass
+
+    Args:
+        tolerance: the tolerances and excluded params, see BoundaryTolerance
+    Notes:
+        Only the param values are extracted from each fit. The summary's
+        to_table() lists which params are at which bound.
+    """
+    tolerance = tolerance or BoundaryTolerance()
+    params = []
+    for inference in inferences:
+        if isinstance(inference, PhyloNode):
+            context = load_tree_context(inference, exclude=tolerance.exclude)
+            params.append(context.params)
+        else:
+            params.append(
+                load_param_arrays(_get_lf(inference), exclude=tolerance.exclude)
+            )
+    return check_boundaries(params, tolerance)
 
 
 @define_app
 class classify_model_psubs:
-    """labels all psubs in a given ModelPsubs object which has source info"""
+    """labels all psubs in a given ModelPsubs object which has source info
+    Args:
+        "atol" and "rtol" are the tolerances for treating two matrix elements
+        as equal, as for numpy.isclose.
+        "float32" screens the matrices in float32, rechecking borderline ones
+        in float64.
+        "cache_size" is the number of classified matrices remembered across
+        calls, in the ClassificationCache "cache". 0 disables the cache.
+    """
+
+    def __init__(
+        self,
+        atol: float = _ATOL,
+        rtol: float = _RTOL,
+        float32: bool = False,
+        cache_size: int = 0,
+    ) -> None:
+        _check_tolerances(atol, rtol)
+        self.atol = atol
+        self.rtol = rtol
+        self.float32 = float32
+        self.cache = ClassificationCache(cache_size) if cache_size else None
 
     def main(
         self, inference: model_result | AlignmentLikelihoodFunction
     ) -> ModelMatrixCategories:
         psubs = load_psubs(_get_lf(inference))
-        return classify_matrix(psubs)
+        return classify_matrix(
+            psubs, self.atol, self.rtol, self.float32, cache=self.cache
+        )
+
+
+@dataclasses.dataclass(slots=True)
+class _DeferredContext:
+    """what a lazy PhyloLimitRec keeps to compute its deferred fields"""
+
+    params: Union[ParamArrays, None]
+    tolerance: BoundaryTolerance
+    psubs: ModelPsubs
+    mcats: ModelMatrixCategories
+    float32: bool = False
+
+
+def _non_dlc(mcats: ModelMatrixCategories) -> dict:
+    return {k: v for k, v in mcats.items() if v is not DLC}
+
+
+_DEFERRED_FIELDS = {
+    "boundary_values": lambda context: (
+        None
+        if context.params is None
+        else check_boundaries([context.params], context.tolerance)[0].vio
+    ),
+    "nondlc_and_identity": lambda context: _non_dlc(context.mcats),
+    "delta_col": lambda context: calc_delta_col(context.psubs, context.float32),
+}
+
+
+def _encode_delta_col(delta_col: dict) -> dict:
+    """edge names and the base64 encoded little-endian float64 values, which
+    load several times faster from json than a list of floats"""
+    values = array(list(delta_col.values()), dtype="<f8")
+    return {
+        "edges": [_edge_name(k) for k in delta_col],
+        "values": base64.b64encode(values.tobytes()).decode("ascii"),
+    }
+
+
+def _decode_delta_col(data: dict, layout: int = RICH_DICT_FORMAT) -> dict[str, float]:
+    if layout < 2:
+        # edge names to values, as written before _encode_delta_col
+        return dict(data)
+    values = frombuffer(base64.b64decode(data["values"]), dtype="<f8")
+    return dict(zip(data["edges"], values.tolist()))
+
+
+def _encode_checks(checks: dict[CheckMode, IdentCheckRes]) -> list[dict]:
+    return [
+        {"mode": mode.to_rich_dict(), "check": check.to_rich_dict()}
+        for mode, check in checks.items()
+    ]
+
+
+def _decode_checks(data: list[dict]) -> dict[CheckMode, IdentCheckRes]:
+    return {
+        CheckMode.from_rich_dict(c["mode"]): IdentCheckRes.from_rich_dict(c["check"])
+        for c in data
+    }
 
 
 # a rich dataclass to store bound violations, ISCL matrices, etc., besides identifiability
 @dataclasses.dataclass(slots=True)
 class PhyloLimitRec:
-    """the record of phylogenetic limits"""
+    """the record of phylogenetic limits
+
+    Notes:
+        A record made by deferred() computes boundary_values,
+        nondlc_and_identity and delta_col when they are first read. checks
+        holds the verdict of each mode given to phylim, if any.
+    """
 
     check: IdentCheckRes
     model_name: Union[str, None]
     boundary_values: Union[list[dict], None]
     nondlc_and_identity: Union[dict[tuple[str, ...], MatrixCategory], None]
-    delta_col: dict[str, float]
+    delta_col: Union[dict[str, float], None]
+    profile: Union[StageProfile, None] = None
+    checks: Union[dict[CheckMode, IdentCheckRes], None] = None
+    _context: Union[_DeferredContext, None] = dataclasses.field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    @classmethod
+    def deferred(
+        cls,
+        check: IdentCheckRes,
+        model_name: Union[str, None],
+        context: _DeferredContext,
+        checks: Union[dict[CheckMode, IdentCheckRes], None] = None,
+    ) -> "PhyloLimitRec":
+        """a record whose boundary_values, nondlc_and_identity and delta_col
+        are computed from context on first access"""
+        # the deferred slots are left unset, so reading them calls __getattr__
+        record = cls.__new__(cls)
+        record.check = check
+        record.model_name = model_name
+        record.profile = None
+        record.checks = checks
+        record._context = context
+        return record
+
+    def __getattr__(self, name: str):
+        # only called for unset slots, which are the deferred fields
+        if name not in _DEFERRED_FIELDS:
+            raise AttributeError(
+                f"{type(self).__name__!r} object has no attribute {name!r}"
+            )
+        value = _DEFERRED_FIELDS[name](self._context)
+        setattr(self, name, value)
+        return value
+
+    @property
+    def pending(self) -> list[str]:
+        """names of the deferred fields not computed yet"""
+        pending = []
+        for name in _DEFERRED_FIELDS:
+            # reading the slot itself, which does not call __getattr__
+            try:
+                getattr(PhyloLimitRec, name).__get__(self)
+            except AttributeError:
+                pending.append(name)
+        return pending
+
+    def materialize(self) -> "PhyloLimitRec":
+        """compute all deferred fields and release the context, returns self"""
+        for name in _DEFERRED_FIELDS:
+            getattr(self, name)
+        self._context = None
+        return self
+
+    def __getstate__(self) -> list:
+        # a pickled record does not carry the context
+        self.materialize()
+        return [getattr(self, field.name) for field in dataclasses.fields(self)]
+
+    def __setstate__(self, state: list) -> None:
+        for field, value in zip(dataclasses.fields(self), state):
+            setattr(self, field.name, value)
 
     def to_rich_dict(self) -> dict:
+        self.materialize()
         result = self.check.to_rich_dict()
+        result["type"] = get_object_provenance(self)
         result["model_name"] = self.model_name or ""
-        result["boundary_values"] = self.boundary_values or []
-        result["nondlc_and_identity"] = {}
-        if self.nondlc_and_identity:
-            result["nondlc_and_identity"] = {
-                k[0]: v.value for k, v in self.nondlc_and_identity.items()
-            }
-        result["delta_col"] = self.delta_col or {}
+        result["boundary_values"] = self.boundary_values
+        result["nondlc_and_identity"] = (
+            None
+            if self.nondlc_and_identity is None
+            else _encode_mcats(self.nondlc_and_identity)
+        )
+        result["delta_col"] = (
+            None if self.delta_col is None else _encode_delta_col(self.delta_col)
+        )
+        if self.profile is not None:
+            result["profile"] = self.profile.to_rich_dict()
+        if self.checks is not None:
+            result["checks"] = _encode_checks(self.checks)
+        result["format"] = RICH_DICT_FORMAT
         result["version"] = __version__
         return result
 
+    @classmethod
+    def from_rich_dict(cls, data: dict) -> "PhyloLimitRec":
+        """the record of a to_rich_dict() result, with edges keyed by name
+
+        Notes:
+            Rich dicts without a format are read with the earlier layout,
+            where every field was checked, so their boundary_values are a
+            list.
+        """
+        layout = _rich_dict_format(data)
+        nondlc = data["nondlc_and_identity"]
+        delta_col = data["delta_col"]
+        boundary_values = data["boundary_values"]
+        if layout < 2:
+            boundary_values = boundary_values or []
+        profile = data.get("profile")
+        checks = data.get("checks")
+        return cls(
+            check=IdentCheckRes.from_rich_dict(data),
+            model_name=data["model_name"] or None,
+            boundary_values=boundary_values,
+            nondlc_and_identity=(
+                None if nondlc is None else _decode_mcats(nondlc, layout)
+            ),
+            delta_col=(
+                None if delta_col is None else _decode_delta_col(delta_col, layout)
+            ),
+            profile=None if profile is None else StageProfile.from_rich_dict(profile),
+            checks=None if checks is None else _decode_checks(checks),
+        )
+
     @property
     def is_identifiable(self) -> bool:
         return self.check.is_identifiable
@@ -148,39 +816,206 @@ class PhyloLimitRec:
         return table._repr_html_()
 
 
+@register_deserialiser(get_object_provenance(PhyloLimitRec))
+def deserialise_phylo_limit_rec(data: dict) -> PhyloLimitRec:
+    return PhyloLimitRec.from_rich_dict(data)
+
+
 @define_app
 class phylim:
-    """record psubs classes, identifiability, boundary values etc of a model_result.
+    """record psubs classes, identifiability, boundary values etc of a model_result,
+    a likelihood function, or a tree with piqtree params.
     Args:
         "strict" controls the sensitivity for Identity matrix (I); if false,
         treat I as DLC.
+        "verdict_only" only records the first violation, it cannot be
+        combined with lazy, modes or bound_tolerance.
+        "atol" and "rtol" are the tolerances for classifying psubs.
+        "float32" screens the psubs, and their delta_col, in float32.
+        "profile" attaches a StageProfile to the record, "on_profile" is
+        called with the StageProfile of every check.
+        "cache_size" is the number of classified psubs remembered across
+        checks, 0 disables the cache.
+        "lazy" defers the boundary, non-DLC and delta_col fields of the
+        record until they are read.
+        "bound_tolerance" is a BoundaryTolerance for the boundary check.
+        "modes" are CheckMode settings, or bools for strict, whose verdicts
+        are recorded in the checks of the record.
     Return:
         PhyloLimitRec object
     """
 
-    def __init__(self, strict: bool = False) -> None:
+    def __init__(
+        self,
+        strict: bool = False,
+        verdict_only: bool = False,
+        atol: float = _ATOL,
+        rtol: float = _RTOL,
+        float32: bool = False,
+        profile: bool = False,
+        on_profile: Union[Callable[[StageProfile], None], None] = None,
+        cache_size: int = 0,
+        lazy: bool = False,
+        bound_tolerance: Union[BoundaryTolerance, None] = None,
+        modes: Union[Iterable[Union[CheckMode, bool]], None] = None,
+    ) -> None:
+        _check_tolerances(atol, rtol)
+        if verdict_only and (
+            ignored := [
+                name
+                for name, value in [
+                    ("lazy", lazy),
+                    ("modes", modes),
+                    ("bound_tolerance", bound_tolerance),
+                ]
+                if value
+            ]
+        ):
+            raise ValueError(f"verdict_only cannot be combined with {ignored}")
+        self.modes = tuple(
+            dict.fromkeys(
+                CheckMode(mode, atol, rtol) if isinstance(mode, bool) else mode
+                for mode in modes or ()
+            )
+        )
+        for mode in self.modes:
+            _check_tolerances(mode.atol, mode.rtol)
         self.strict = strict
+        self.verdict_only = verdict_only
+        self.lazy = lazy
+        self.bound_tolerance = bound_tolerance or BoundaryTolerance()
+        self.atol = atol
+        self.rtol = rtol
+        self.float32 = float32
+        self.profile = profile
+        self.on_profile = on_profile
+        self.cache = ClassificationCache(cache_size) if cache_size else None
 
     def main(
-        self, inference: model_result | AlignmentLikelihoodFunction
+        self,
+        inference: (
+            model_result
+            | AlignmentLikelihoodFunction
+            | PhyloNode
+            | InferenceContext
+            | dict
+        ),
     ) -> PhyloLimitRec:
-        tree = _get_lf(inference).tree
+        profiling = self.profile or self.on_profile is not None
+        profile = StageProfile() if profiling else NO_PROFILE
+        record = self._check(inference, profile)
+        if profiling:
+            profile.source = record.check.source
+            if self.profile:
+                record.profile = profile
+            if self.on_profile is not None:
+                self.on_profile(profile)
+        return record
 
-        check_bound_app = check_fit_boundary()
-        classify_psubs_app = classify_model_psubs()
+    def _check(
+        self,
+        inference: (
+            model_result
+            | AlignmentLikelihoodFunction
+            | PhyloNode
+            | InferenceContext
+            | dict
+        ),
+        profile: Union[StageProfile, _NoProfile],
+    ) -> PhyloLimitRec:
+        with profile.stage("extract") as counts:
+            context = load_context(
+                inference,
+                with_params=not self.verdict_only,
+                exclude=self.bound_tolerance.exclude,
+            )
+            counts["edges"] = len(context.psubs.psubs)
+
+        if self.verdict_only:
+            with profile.stage("verdict") as counts:
+                check = eval_verdict(
+                    context.psubs,
+                    context.tree,
+                    self.strict,
+                    atol=self.atol,
+                    rtol=self.rtol,
+                    float32=self.float32,
+                    counts=counts,
+                    cache=self.cache,
+                )
+            return PhyloLimitRec(
+                check=check,
+                model_name=context.model_name,
+                boundary_values=None,
+                nondlc_and_identity=None,
+                delta_col=None,
+            )
+
+        if not self.lazy:
+            with profile.stage("boundary") as counts:
+                # an InferenceContext from a PsubArchive has no param values
+                boundary_values = None
+                if context.params is not None:
+                    boundary_values = check_boundaries(
+                        [context.params], self.bound_tolerance
+                    )[0].vio
+                    counts["params"] = len(context.params)
+                    counts["violations"] = len(boundary_values)
+
+        with profile.stage("classify") as counts:
+            psubs_labelled = classify_matrix(
+                context.psubs, self.atol, self.rtol, self.float32, cache=self.cache
+            )
+            counts["edges_classified"] = len(psubs_labelled.mcats)
+            if not self.lazy:
+                nondlc_and_identity = _non_dlc(psubs_labelled)
+                counts["non_dlc"] = len(nondlc_and_identity)
+
+        with profile.stage("identifiability") as counts:
+            checks = None
+            if self.modes:
+                own = CheckMode(self.strict, self.atol, self.rtol)
+                checks = eval_identifiability_modes(
+                    context.psubs,
+                    context.tree,
+                    (own, *self.modes),
+                    float32=self.float32,
+                    cache=self.cache,
+                    classified={(self.atol, self.rtol): psubs_labelled},
+                    counts=counts,
+                )
+                result = checks[own]
+                checks = {mode: checks[mode] for mode in self.modes}
+            else:
+                result = eval_identifiability(
+                    psubs_labelled, context.tree, self.strict, counts=counts
+                )
+
+        if self.lazy:
+            return PhyloLimitRec.deferred(
+                check=result,
+                model_name=context.model_name,
+                context=_DeferredContext(
+                    params=context.params,
+                    tolerance=self.bound_tolerance,
+                    psubs=context.psubs,
+                    mcats=psubs_labelled,
+                    float32=self.float32,
+                ),
+                checks=checks,
+            )
+
+        with profile.stage("delta_col") as counts:
+            delta_col = calc_delta_col(context.psubs, self.float32)
+            counts["edges"] = len(delta_col)
 
-        boundary_values = check_bound_app(inference).vio
-        psubs_labelled = classify_psubs_app(inference)
-        result = eval_identifiability(psubs_labelled, tree, self.strict)
-        delta_col = calc_delta_col(load_psubs(_get_lf(inference)))
         return PhyloLimitRec(
             check=result,
-            model_name=inference.name,
+            model_name=context.model_name,
             boundary_values=boundary_values,
-            nondlc_and_identity={
-                k: v for k, v in psubs_labelled.items() if v is not DLC
-            },
+            nondlc_and_identity=nondlc_and_identity,
             delta_col=delta_col,
+            checks=checks,
         )
 
 
@@ -252,15 +1087,7 @@ class phylim_to_model_result:
         self.stationarity = stationarity
 
     def main(self, tree: PhyloNode) -> model_result:
-        params, predicate_names, motif_probs = _parse_params(tree)
-        # decide model type based on number of rates/predicates
-        if tree.params["model"] == "UNREST":
-            submodel = _build_unrest_model(predicate_names)
-            # skip "T/G" since it's reference rate
-            params = [p for p in params if p.get("par_name") != "T/G"]
-        else:
-            submodel = _build_reversible_model(predicate_names)
-
+        submodel, params, motif_probs = _build_submodel(tree)
         lf = submodel.make_likelihood_function(tree, aligned=True)
 
         lf.set_motif_probs(motif_probs)
@@ -310,6 +1137,19 @@ def _parse_params(result: PhyloNode) -> tuple[list[dict], list[str], dict]:
     return param_rules, predicate_names, motif_probs
 
 
+def _build_submodel(tree: PhyloNode) -> tuple:
+    """the substitution model, param rules and motif probs of a piqtree tree"""
+    params, predicate_names, motif_probs = _parse_params(tree)
+    # decide model type based on number of rates/predicates
+    if tree.params.get("model") == "UNREST":
+        submodel = _build_unrest_model(predicate_names)
+        # skip "T/G" since it's reference rate
+        params = [p for p in params if p.get("par_name") != "T/G"]
+    else:
+        submodel = _build_reversible_model(predicate_names)
+    return submodel, params, motif_probs
+
+
 @register_model("nucleotide")
 def _build_reversible_model(
     predicate_names: list[str],
@@ -346,14 +1186,33 @@ class phylim_filter:
     Args:
         "strict" controls the sensitivity for Identity matrix (I); if false,
         treat I as DLC.
+        "atol", "rtol", "float32", "on_profile" and "cache_size" are as for
+        phylim.
     """
 
-    def __init__(self, strict: bool = False) -> None:
+    def __init__(
+        self,
+        strict: bool = False,
+        atol: float = _ATOL,
+        rtol: float = _RTOL,
+        float32: bool = False,
+        on_profile: Union[Callable[[StageProfile], None], None] = None,
+        cache_size: int = 0,
+    ) -> None:
         self.strict = strict
+        self._phylim = phylim(
+            strict=strict,
+            verdict_only=True,
+            atol=atol,
+            rtol=rtol,
+            float32=float32,
+            on_profile=on_profile,
+            cache_size=cache_size,
+        )
+        self.cache = self._phylim.cache
 
     def main(self, model_result: model_result) -> Union[model_result, NotCompleted]:
-        phylim_app = phylim(strict=self.strict)
-        record = phylim_app(model_result)
+        record = self._phylim(model_result)
         return (
             model_result
             if record.is_identifiable
@@ -364,3 +1223,141 @@ class phylim_filter:
                 source=model_result.source,
             )
         )
+
+
+def _phylim_members(
+    members: list[DataMember | str], strict: bool, verdict_only: bool
+) -> list[tuple[str, PhyloLimitRec | NotCompleted]]:
+    """load and check a chunk of model_result data store members or json file
+    paths, runs in a worker process"""
+    if not members:
+        return []
+    # data store members are checked from their rich dicts
+    loader = load_rich_dict() if isinstance(members[0], DataMember) else load_json()
+    app = loader + phylim(strict=strict, verdict_only=verdict_only)
+    return [(get_unique_id(member), app(member)) for member in members]
+
+
+@dataclasses.dataclass(slots=True)
+class BatchSummary:
+    """counts and timing of a phylim_batch run"""
+
+    source: str
+    num_completed: int
+    num_not_completed: int
+    num_skipped: int
+    seconds: float
+
+    @property
+    def throughput(self) -> float:
+        """number of model results checked per second"""
+        num = self.num_completed + self.num_not_completed
+        return num / self.seconds if self.seconds else 0.0
+
+    def to_rich_dict(self) -> dict:
+        return {
+            "source": self.source,
+            "num_completed": self.num_completed,
+            "num_not_completed": self.num_not_completed,
+            "num_skipped": self.num_skipped,
+            "seconds": self.seconds,
+            "version": __version__,
+        }
+
+    def to_table(self) -> Table:
+        headers = [
+            "source",
+            "completed",
+            "not completed",
+            "skipped",
+            "seconds",
+            "models per second",
+        ]
+        rows = [
+            [
+                self.source,
+                self.num_completed,
+                self.num_not_completed,
+                self.num_skipped,
+                self.seconds,
+                self.throughput,
+            ]
+        ]
+        return Table(header=headers, data=rows, title="phylim batch summary")
+
+    def _repr_html_(self) -> str:
+        table = self.to_table()
+        table.set_repr_policy(show_shape=False)
+        return table._repr_html_()
+
+
+@define_app(app_type=NON_COMPOSABLE)
+class phylim_batch:
+    """apply phylim to every model_result in a data store, using a process pool
+    Args:
+        "out_dstore" writeable data store (or its path) for the PhyloLimitRec
+        results, a sqlitedb or a directory of json files.
+        "strict", "verdict_only" are passed to phylim.
+        "max_workers" number of worker processes, if 1 runs in this process.
+        "chunksize" number of model results sent to a worker in one task.
+    Return:
+        BatchSummary with the number of completed / not completed results
+        and the throughput
+    Notes:
+        Workers load and check the model results, the results are written by
+        this process. Inputs whose result is already in out_dstore are skipped.
+    """
+
+    def __init__(
+        self,
+        out_dstore: DataStoreABC | str,
+        strict: bool = False,
+        verdict_only: bool = False,
+        max_workers: int | None = None,
+        chunksize: int = 64,
+    ) -> None:
+        # opened by main, so the app is cheap to make and can be pickled
+        self.out_dstore = out_dstore
+        self.strict = strict
+        self.verdict_only = verdict_only
+        self.max_workers = max_workers
+        self.chunksize = chunksize
+
+    def _chunks(self, members: list[DataMember]):
+        for start in range(0, len(members), self.chunksize):
+            yield members[start : start + self.chunksize]
+
+    def main(self, dstore: DataStoreDirectory | DataStoreSqlite | str) -> BatchSummary:
+        start = time.perf_counter()
+        dstore = _open_dstore(dstore, mode="r")
+        out_dstore = _open_dstore(self.out_dstore, mode="a")
+        writer = (write_db if _is_sqlite(out_dstore) else write_json)(out_dstore)
+        done = {get_unique_id(m) for m in out_dstore}
+        members = [m for m in dstore.completed if get_unique_id(m) not in done]
+
+        num_completed = num_not_completed = 0
+        try:
+            for results in _map_chunks(
+                _phylim_members,
+                self._chunks(members),
+                self.max_workers,
+                self.strict,
+                self.verdict_only,
+            ):
+                for identifier, result in results:
+                    writer.main(result, identifier=identifier)
+                    if isinstance(result, NotCompleted):
+                        num_not_completed += 1
+                    else:
+                        num_completed += 1
+        finally:
+            if out_dstore is not self.out_dstore and _is_sqlite(out_dstore):
+                out_dstore.close()
+
+        return BatchSummary(
+            source=str(dstore.source),
+            num_completed=num_completed,
+            num_not_completed=num_not_completed,
+            num_skipped=len(dstore.completed) - len(members),
+            seconds=time.perf_counter() - start,
+        )
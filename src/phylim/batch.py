@@ -0,0 +1,461 @@
+import array
+import json
+import os
+
+from collections.abc import Iterable, Iterator, Mapping
+from typing import Union
+
+import numpy
+
+from cogent3.core.table import Table
+
+from phylim._version import __version__
+from phylim.apps import PhyloLimitRec, _decode_checks, _encode_checks
+from phylim.classify_matrix import CATEGORY_CODES, MATRIX_CATEGORIES, _edge_name
+from phylim.eval_identifiability import IDENTIFIABLE, IdentCheckRes, ViolationType
+from phylim.profiling import StageProfile
+
+
+_VIOLATION_TYPES = tuple(ViolationType)
+_VIOLATION_CODES = {vtype: code for code, vtype in enumerate(_VIOLATION_TYPES)}
+
+# bits of the "present" column, for the PhyloLimitRec fields that can be None
+_HAS_MODEL_NAME = 1
+_HAS_NAMES = 2
+_HAS_BOUNDARY = 4
+_HAS_MCATS = 8
+_HAS_DELTA_COL = 16
+
+_BOUNDARY_FIELDS = "par_name", "init", "lower", "upper"
+
+_DTYPES = {
+    "B": numpy.uint8,
+    "i": numpy.intc,
+    "q": numpy.int64,
+    "d": numpy.float64,
+}
+
+# one value per record
+_RECORD_COLUMNS = {
+    "source": "i",
+    "model_name": "i",
+    "strict": "B",
+    "violation_type": "B",
+    "present": "B",
+    # the json of the profile and checks, -1 for records without them
+    "profile": "i",
+    "checks": "i",
+}
+
+# a variable number of values per record, stored in one array per field
+# with <group>_offsets giving the start of each record's values
+_SEGMENT_COLUMNS = {
+    "names": {"name": "i"},
+    "boundary": {
+        "par_name": "i",
+        "init": "d",
+        "lower": "d",
+        "upper": "d",
+        "extra": "i",
+    },
+    "mcats": {"edge": "i", "code": "B"},
+    "delta_col": {"edge": "i", "value": "d"},
+}
+
+
+def _bound(value: Union[float, None], missing: float) -> float:
+    return missing if value is None else float(value)
+
+
+def _to_buffer(typecode: str, values: numpy.ndarray) -> array.array:
+    result = array.array(typecode)
+    result.frombytes(numpy.ascontiguousarray(values, dtype=_DTYPES[typecode]).tobytes())
+    return result
+
+
+def _segment_positions(
+    offsets: numpy.ndarray, indices: numpy.ndarray
+) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """new offsets, and the positions of the values, for the selected records"""
+    starts = offsets[:-1][indices]
+    lengths = offsets[1:][indices] - starts
+    new_offsets = numpy.zeros(len(indices) + 1, dtype=numpy.int64)
+    numpy.cumsum(lengths, out=new_offsets[1:])
+    positions = numpy.repeat(starts - new_offsets[:-1], lengths)
+    positions += numpy.arange(new_offsets[-1])
+    return new_offsets, positions
+
+
+class _StringTable:
+    """strings stored as integer codes, in order of first use"""
+
+    __slots__ = ("values", "_codes")
+
+    def __init__(self, values: Iterable[str] = ()) -> None:
+        self.values: list[str] = list(values)
+        self._codes = {value: code for code, value in enumerate(self.values)}
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def __getitem__(self, code: int) -> str:
+        return self.values[code]
+
+    def code(self, value: str) -> int:
+        """the code of value, which is added if it is new"""
+        code = self._codes.get(value)
+        if code is None:
+            code = self._codes[value] = len(self.values)
+            self.values.append(value)
+        return code
+
+    def copy(self) -> "_StringTable":
+        return self.__class__(self.values)
+
+    def to_arrays(self) -> dict[str, numpy.ndarray]:
+        """the strings as one array of their utf-8 bytes, and the offsets of
+        each string in it, for numpy.savez
+
+        Notes:
+            A fixed width array would pad every string to the longest, e.g.
+            a newick tree.
+        """
+        encoded = [value.encode("utf-8") for value in self.values]
+        offsets = numpy.zeros(len(encoded) + 1, dtype=numpy.int64)
+        numpy.cumsum([len(e) for e in encoded], out=offsets[1:])
+        return {
+            "strings": numpy.frombuffer(b"".join(encoded), dtype=numpy.uint8),
+            "string_offsets": offsets,
+        }
+
+    @classmethod
+    def from_arrays(cls, data: Mapping[str, numpy.ndarray]) -> "_StringTable":
+        """the strings written by to_arrays, or as a fixed width array by
+        earlier versions"""
+        if "string_offsets" not in data:
+            return cls(data["strings"].tolist())
+        blob = data["strings"].tobytes()
+        offsets = data["string_offsets"].tolist()
+        return cls(
+            blob[start:end].decode("utf-8")
+            for start, end in zip(offsets[:-1], offsets[1:])
+        )
+
+
+class PhyloLimitBatch:
+    """columnar storage for many PhyloLimitRec results
+
+    Record fields are held in typed buffers, strings are interned and
+    stored as integer codes, and the per-edge values of each record are held
+    as contiguous slices of shared arrays. Numpy views of the columns are
+    available as properties.
+
+    Notes:
+        Edge names are stored without the tuple wrapping of ModelPsubs keys,
+        records rebuilt from a batch use plain edge name keys.
+        The profile and checks of a record are stored as json strings.
+        Missing bounds of boundary values are stored as -inf or inf.
+    """
+
+    def __init__(self) -> None:
+        self._strings = _StringTable()
+        self._columns = {name: array.array(t) for name, t in _RECORD_COLUMNS.items()}
+        for group, fields in _SEGMENT_COLUMNS.items():
+            self._columns[f"{group}_offsets"] = array.array("q", [0])
+            for field, typecode in fields.items():
+                self._columns[f"{group}_{field}"] = array.array(typecode)
+
+    def __len__(self) -> int:
+        return len(self._columns["source"])
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(num_records={len(self)})"
+
+    def _array(self, name: str) -> numpy.ndarray:
+        column = self._columns[name]
+        return numpy.frombuffer(column, dtype=_DTYPES[column.typecode])
+
+    def _end_segment(self, group: str) -> None:
+        """record where the values of the latest record in group end"""
+        first = next(iter(_SEGMENT_COLUMNS[group]))
+        end = len(self._columns[f"{group}_{first}"])
+        self._columns[f"{group}_offsets"].append(end)
+
+    def append(self, record: PhyloLimitRec) -> None:
+        """add a record to the end of the batch"""
+        columns = self._columns
+        check = record.check
+        present = 0
+
+        columns["source"].append(self._strings.code(check.source))
+        if record.model_name is not None:
+            present |= _HAS_MODEL_NAME
+        columns["model_name"].append(self._strings.code(record.model_name or ""))
+        columns["strict"].append(bool(check.strict))
+        columns["violation_type"].append(_VIOLATION_CODES[check.violation_type])
+
+        if check.names is not None:
+            present |= _HAS_NAMES
+            columns["names_name"].extend(self._strings.code(n) for n in check.names)
+        self._end_segment("names")
+
+        if record.boundary_values is not None:
+            present |= _HAS_BOUNDARY
+            for value in record.boundary_values:
+                extra = {k: v for k, v in value.items() if k not in _BOUNDARY_FIELDS}
+                columns["boundary_par_name"].append(
+                    self._strings.code(value["par_name"])
+                )
+                columns["boundary_init"].append(float(value["init"]))
+                # a missing bound is unbounded, as for ParamArrays.from_rules
+                columns["boundary_lower"].append(_bound(value.get("lower"), -numpy.inf))
+                columns["boundary_upper"].append(_bound(value.get("upper"), numpy.inf))
+                columns["boundary_extra"].append(
+                    self._strings.code(json.dumps(extra)) if extra else -1
+                )
+        self._end_segment("boundary")
+
+        if record.nondlc_and_identity is not None:
+            present |= _HAS_MCATS
+            for edge, mcat in record.nondlc_and_identity.items():
+                columns["mcats_edge"].append(self._strings.code(_edge_name(edge)))
+                columns["mcats_code"].append(CATEGORY_CODES[mcat])
+        self._end_segment("mcats")
+
+        if record.delta_col is not None:
+            present |= _HAS_DELTA_COL
+            for edge, value in record.delta_col.items():
+                columns["delta_col_edge"].append(self._strings.code(_edge_name(edge)))
+                columns["delta_col_value"].append(float(value))
+        self._end_segment("delta_col")
+
+        columns["present"].append(present)
+        columns["profile"].append(
+            -1
+            if record.profile is None
+            else self._strings.code(json.dumps(record.profile.to_rich_dict()))
+        )
+        columns["checks"].append(
+            -1
+            if record.checks is None
+            else self._strings.code(json.dumps(_encode_checks(record.checks)))
+        )
+
+    def extend(self, records: Iterable[PhyloLimitRec]) -> None:
+        """add records to the end of the batch"""
+        for record in records:
+            self.append(record)
+
+    @classmethod
+    def from_records(cls, records: Iterable[PhyloLimitRec]) -> "PhyloLimitBatch":
+        result = cls()
+        result.extend(records)
+        return result
+
+    def _segment(self, group: str, index: int) -> slice:
+        offsets = self._columns[f"{group}_offsets"]
+        return slice(offsets[index], offsets[index + 1])
+
+    def __getitem__(self, index: int) -> PhyloLimitRec:
+        """the record at index, rebuilt as a PhyloLimitRec"""
+        index = range(len(self))[index]
+        columns = self._columns
+        strings = self._strings
+        present = columns["present"][index]
+
+        names = None
+        if present & _HAS_NAMES:
+            names = {
+                strings[c] for c in columns["names_name"][self._segment("names", index)]
+            }
+
+        boundary_values = None
+        if present & _HAS_BOUNDARY:
+            segment = self._segment("boundary", index)
+            boundary_values = []
+            for par_name, init, lower, upper, extra in zip(
+                *(
+                    columns[f"boundary_{f}"][segment]
+                    for f in _SEGMENT_COLUMNS["boundary"]
+                )
+            ):
+                value = {
+                    "par_name": strings[par_name],
+                    "init": init,
+                    "lower": lower,
+                    "upper": upper,
+                }
+                if extra >= 0:
+                    value |= json.loads(strings[extra])
+                boundary_values.append(value)
+
+        nondlc_and_identity = None
+        if present & _HAS_MCATS:
+            segment = self._segment("mcats", index)
+            nondlc_and_identity = {
+                strings[edge]: MATRIX_CATEGORIES[code]
+                for edge, code in zip(
+                    columns["mcats_edge"][segment], columns["mcats_code"][segment]
+                )
+            }
+
+        delta_col = None
+        if present & _HAS_DELTA_COL:
+            segment = self._segment("delta_col", index)
+            delta_col = {
+                strings[edge]: value
+                for edge, value in zip(
+                    columns["delta_col_edge"][segment],
+                    columns["delta_col_value"][segment],
+                )
+            }
+
+        check = IdentCheckRes(
+            source=strings[columns["source"][index]],
+            strict=bool(columns["strict"][index]),
+            names=names,
+            violation_type=_VIOLATION_TYPES[columns["violation_type"][index]],
+        )
+        return PhyloLimitRec(
+            check=check,
+            model_name=(
+                strings[columns["model_name"][index]]
+                if present & _HAS_MODEL_NAME
+                else None
+            ),
+            boundary_values=boundary_values,
+            nondlc_and_identity=nondlc_and_identity,
+            delta_col=delta_col,
+            profile=(
+                None
+                if (profile := columns["profile"][index]) < 0
+                else StageProfile.from_rich_dict(json.loads(strings[profile]))
+            ),
+            checks=(
+                None
+                if (checks := columns["checks"][index]) < 0
+                else _decode_checks(json.loads(strings[checks]))
+            ),
+        )
+
+    def __iter__(self) -> Iterator[PhyloLimitRec]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def to_records(self) -> list[PhyloLimitRec]:
+        return list(self)
+
+    def take(self, indices: Union[numpy.ndarray, list[int]]) -> "PhyloLimitBatch":
+        """a new batch of the records at indices, in that order"""
+        indices = numpy.asarray(indices, dtype=numpy.int64)
+        if indices.size and (indices.min() < -len(self) or indices.max() >= len(self)):
+            raise IndexError("record index out of range")
+        indices = indices % max(len(self), 1)
+
+        result = self.__class__()
+        result._strings = self._strings.copy()
+        for name, typecode in _RECORD_COLUMNS.items():
+            result._columns[name] = _to_buffer(typecode, self._array(name)[indices])
+        for group, fields in _SEGMENT_COLUMNS.items():
+            offsets, positions = _segment_positions(
+                self._array(f"{group}_offsets"), indices
+            )
+            result._columns[f"{group}_offsets"] = _to_buffer("q", offsets)
+            for field, typecode in fields.items():
+                name = f"{group}_{field}"
+                result._columns[name] = _to_buffer(
+                    typecode, self._array(name)[positions]
+                )
+        return result
+
+    def filter(self, mask: numpy.ndarray) -> "PhyloLimitBatch":
+        """a new batch of the records where mask is True"""
+        mask = numpy.asarray(mask, dtype=bool)
+        if mask.shape != (len(self),):
+            raise ValueError(
+                f"mask shape {mask.shape} does not match {len(self)} records"
+            )
+        return self.take(numpy.flatnonzero(mask))
+
+    @property
+    def source(self) -> numpy.ndarray:
+        return numpy.array(self._strings.values, dtype=object)[self._array("source")]
+
+    @property
+    def model_name(self) -> numpy.ndarray:
+        return numpy.array(self._strings.values, dtype=object)[
+            self._array("model_name")
+        ]
+
+    @property
+    def strict(self) -> numpy.ndarray:
+        return self._array("strict").astype(bool)
+
+    @property
+    def violation_type(self) -> numpy.ndarray:
+        """the ViolationType names"""
+        names = numpy.array([v.name for v in _VIOLATION_TYPES], dtype=object)
+        return names[self._array("violation_type")]
+
+    @property
+    def is_identifiable(self) -> numpy.ndarray:
+        return self._array("violation_type") == _VIOLATION_CODES[IDENTIFIABLE]
+
+    @property
+    def has_BV(self) -> numpy.ndarray:
+        return numpy.diff(self._array("boundary_offsets")) > 0
+
+    @property
+    def delta_col_min(self) -> numpy.ndarray:
+        """the smallest delta_col of each record, nan for records without any"""
+        offsets = self._array("delta_col_offsets")
+        values = self._array("delta_col_value")
+        result = numpy.full(len(self), numpy.nan)
+        nonempty = numpy.diff(offsets) > 0
+        if nonempty.any():
+            result[nonempty] = numpy.minimum.reduceat(values, offsets[:-1][nonempty])
+        return result
+
+    def to_table(self) -> Table:
+        headers = [
+            "source",
+            "model name",
+            "identifiable",
+            "has boundary values",
+            "version",
+        ]
+        data = {
+            "source": self.source.tolist(),
+            "model name": self.model_name.tolist(),
+            "identifiable": self.is_identifiable.tolist(),
+            "has boundary values": self.has_BV.tolist(),
+            "version": [__version__] * len(self),
+        }
+        return Table(header=headers, data=data, title="Phylo Limits Records")
+
+    def _repr_html_(self) -> str:
+        table = self.to_table()
+        table.set_repr_policy(show_shape=False)
+        return table._repr_html_()
+
+    def save(self, path: Union[str, os.PathLike], compress: bool = False) -> None:
+        """write the batch to a numpy .npz file"""
+        arrays = {name: self._array(name) for name in self._columns}
+        arrays |= self._strings.to_arrays()
+        arrays["version"] = numpy.array(__version__)
+        savez = numpy.savez_compressed if compress else numpy.savez
+        savez(path, **arrays)
+
+    @classmethod
+    def load(cls, path: Union[str, os.PathLike]) -> "PhyloLimitBatch":
+        """read a batch written by save"""
+        result = cls()
+        with numpy.load(path, allow_pickle=False) as data:
+            result._strings = _StringTable.from_arrays(data)
+            for name, column in result._columns.items():
+                # batches saved before the profile and checks were stored
+                values = (
+                    data[name] if name in data else numpy.full(len(data["source"]), -1)
+                )
+                result._columns[name] = _to_buffer(column.typecode, values)
+        return result
@@ -1,6 +1,18 @@
 import dataclasses
+import numbers
+import warnings
+
+from collections.abc import Iterable, Mapping, Sequence
+from typing import Union
+
+import numpy
+
+from cogent3.core.table import Table
+from cogent3.util.deserialise import register_deserialiser
+from cogent3.util.misc import get_object_provenance
 
 from phylim._version import __version__
+from phylim.classify_matrix import _check_tolerances
 
 
 @dataclasses.dataclass(slots=True)
@@ -15,22 +27,258 @@ class BoundsViolation:
     vio: list[dict]
 
     def to_rich_dict(self) -> dict:
-        return {"source": self.source, "vio": self.vio, "version": __version__}
+        return {
+            "type": get_object_provenance(self),
+            "source": self.source,
+            "vio": self.vio,
+            "version": __version__,
+        }
+
+    @classmethod
+    def from_rich_dict(cls, data: dict) -> "BoundsViolation":
+        return cls(source=data["source"], vio=data["vio"])
+
+
+@register_deserialiser(get_object_provenance(BoundsViolation))
+def deserialise_bounds_violation(data: dict) -> BoundsViolation:
+    return BoundsViolation.from_rich_dict(data)
 
 
 EXCLUDE_PARS = "length", "mprobs"
 
+# two clusters of fits are divided by this distance from a bound
+BOUND_ATOL = 1e-10
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class BoundaryTolerance:
+    """how close a parameter must be to a bound to be at it
+
+    A value is at a bound when |value - bound| <= atol + rtol * |bound|.
+
+    Args:
+        atol, rtol: tolerances of the parameters not in per_param
+        per_param: par_name -> (atol, rtol) of individual parameters
+        exclude: names of parameters that are not checked
+    """
+
+    atol: float = BOUND_ATOL
+    rtol: float = 0.0
+    per_param: Mapping[str, tuple[float, float]] = dataclasses.field(
+        default_factory=dict
+    )
+    exclude: frozenset[str] = frozenset(EXCLUDE_PARS)
+
+    def __post_init__(self) -> None:
+        for atol, rtol in [(self.atol, self.rtol), *self.per_param.values()]:
+            _check_tolerances(atol, rtol)
+        object.__setattr__(self, "exclude", frozenset(self.exclude))
+
+
+def _bounds(bounds: list, missing: float) -> numpy.ndarray:
+    return numpy.array([missing if b is None else b for b in bounds], dtype=float)
+
+
+def _warn_unchecked(source: str, names: Iterable[str]) -> None:
+    if names := sorted(set(names)):
+        warnings.warn(
+            f"{source}: the bounds of {names} are not checked, they are not "
+            "scalar parameters",
+            UserWarning,
+            stacklevel=3,
+        )
+
+
+@dataclasses.dataclass(slots=True)
+class ParamArrays:
+    """the values and bounds of the free scalar parameters of one fit
+
+    Notes:
+        rules[i] is the param rule dict of the i-th value. The rules of a
+        likelihood function are made when first read, see load_param_arrays,
+        and are all made when pickled.
+    """
+
+    source: str
+    par_names: numpy.ndarray
+    values: numpy.ndarray
+    lower: numpy.ndarray
+    upper: numpy.ndarray
+    rules: Sequence[dict] = dataclasses.field(repr=False, compare=False)
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def rule(self, index: int) -> dict:
+        """the param rule of the value at index"""
+        return self.rules[index]
+
+    @classmethod
+    def from_rules(
+        cls, params: ParamRules, exclude: Iterable[str] = EXCLUDE_PARS
+    ) -> "ParamArrays":
+        """the params with a scalar init, constants are left out
 
-def check_boundary(params: ParamRules) -> BoundsViolation:
+        Notes:
+            A UserWarning names the params that are neither constant nor
+            scalar, as their bounds cannot be checked.
+        """
+        exclude = frozenset(exclude)
+        rules, unchecked = [], []
+        for rule in params.params:
+            if rule["par_name"] in exclude or rule.get("is_constant"):
+                continue
+            if isinstance(rule.get("init"), numbers.Real):
+                rules.append(rule)
+            else:
+                unchecked.append(rule["par_name"])
+        _warn_unchecked(params.source, unchecked)
+        return cls(
+            source=params.source,
+            par_names=numpy.array([p["par_name"] for p in rules], dtype=object),
+            values=numpy.array([p["init"] for p in rules], dtype=float),
+            lower=_bounds([p.get("lower") for p in rules], -numpy.inf),
+            upper=_bounds([p.get("upper") for p in rules], numpy.inf),
+            rules=rules,
+        )
+
+
+def _at_bound(
+    values: numpy.ndarray,
+    bound: numpy.ndarray,
+    atol: numpy.ndarray,
+    rtol: numpy.ndarray,
+) -> numpy.ndarray:
+    with numpy.errstate(invalid="ignore"):
+        return numpy.isfinite(bound) & (
+            numpy.abs(values - bound) <= atol + rtol * numpy.abs(bound)
+        )
+
+
+@dataclasses.dataclass(slots=True)
+class BoundarySummary:
+    """which parameters of many fits are at a bound
+
+    Notes:
+        The values of the i-th fit are at offsets[i]:offsets[i + 1] of the
+        at_lower and at_upper masks. A value equal to both bounds is only
+        reported at the lower one.
+    """
+
+    params: list[ParamArrays]
+    offsets: numpy.ndarray
+    at_lower: numpy.ndarray
+    at_upper: numpy.ndarray
+
+    def __len__(self) -> int:
+        return len(self.params)
+
+    @property
+    def sources(self) -> list[str]:
+        return [p.source for p in self.params]
+
+    @property
+    def num_violations(self) -> numpy.ndarray:
+        """the number of values at a bound in each fit"""
+        total = numpy.zeros(len(self.at_lower) + 1, dtype=numpy.int64)
+        numpy.cumsum(self.at_lower | self.at_upper, out=total[1:])
+        return numpy.diff(total[self.offsets])
+
+    @property
+    def has_violation(self) -> numpy.ndarray:
+        return self.num_violations > 0
+
+    def __getitem__(self, index: int) -> BoundsViolation:
+        """the BoundsViolation of the fit at index"""
+        params = self.params[index]
+        index = range(len(self))[index]
+        segment = slice(self.offsets[index], self.offsets[index + 1])
+        at = self.at_lower[segment] | self.at_upper[segment]
+        return BoundsViolation(
+            source=params.source, vio=[params.rule(i) for i in numpy.flatnonzero(at)]
+        )
+
+    def to_list(self) -> list[BoundsViolation]:
+        return [self[i] for i in range(len(self))]
+
+    def to_table(self) -> Table:
+        """one row for each parameter value at a bound"""
+        headers = ["source", "par_name", "bound", "value", "bound value"]
+        fits = numpy.repeat(numpy.arange(len(self)), numpy.diff(self.offsets))
+        rows = []
+        for position in numpy.flatnonzero(self.at_lower | self.at_upper):
+            params = self.params[fits[position]]
+            i = position - self.offsets[fits[position]]
+            lower = bool(self.at_lower[position])
+            rows.append(
+                [
+                    params.source,
+                    params.par_names[i],
+                    "lower" if lower else "upper",
+                    params.values[i],
+                    params.lower[i] if lower else params.upper[i],
+                ]
+            )
+        return Table(header=headers, data=rows or None, title="Boundary Summary")
+
+    def _repr_html_(self) -> str:
+        table = self.to_table()
+        table.set_repr_policy(show_shape=False)
+        return table._repr_html_()
+
+
+def _concat(arrays: list[numpy.ndarray], dtype) -> numpy.ndarray:
+    return numpy.concatenate(arrays) if arrays else numpy.empty(0, dtype=dtype)
+
+
+def check_boundaries(
+    params: Sequence[ParamArrays],
+    tolerance: Union[BoundaryTolerance, None] = None,
+) -> BoundarySummary:
+    """the parameters of many fits at a bound, checked in one pass
+
+    Args:
+        tolerance: the default is BOUND_ATOL for every parameter, excluding
+            EXCLUDE_PARS
+    """
+    tolerance = tolerance or BoundaryTolerance()
+    params = list(params)
+    offsets = numpy.zeros(len(params) + 1, dtype=numpy.int64)
+    numpy.cumsum([len(p) for p in params], out=offsets[1:])
+    par_names = _concat([p.par_names for p in params], object)
+    values = _concat([p.values for p in params], float)
+
+    atol = numpy.full(len(values), float(tolerance.atol))
+    rtol = numpy.full(len(values), float(tolerance.rtol))
+    for name, (name_atol, name_rtol) in tolerance.per_param.items():
+        selected = par_names == name
+        atol[selected] = name_atol
+        rtol[selected] = name_rtol
+    checked = numpy.array([n not in tolerance.exclude for n in par_names], dtype=bool)
+
+    at_lower = checked & _at_bound(
+        values, _concat([p.lower for p in params], float), atol, rtol
+    )
+    at_upper = (
+        checked
+        & ~at_lower
+        & _at_bound(values, _concat([p.upper for p in params], float), atol, rtol)
+    )
+    return BoundarySummary(
+        params=params, offsets=offsets, at_lower=at_lower, at_upper=at_upper
+    )
+
+
+def check_boundary(
+    params: ParamRules, tolerance: Union[BoundaryTolerance, None] = None
+) -> BoundsViolation:
     """check if there are any rate params proximity to the bounds as 1e-10.
-    This value is important as two clusters of fits divided by the value."""
-
-    vio = []
-    list_of_params = params.params
-    for param in list_of_params:
-        if param["par_name"] not in EXCLUDE_PARS:
-            if (abs(param["init"] - param["lower"]) <= 1e-10) or (
-                abs(param["init"] - param["upper"]) <= 1e-10
-            ):
-                vio.append(param)
-    return BoundsViolation(source=params.source, vio=vio)
+    This value is important as two clusters of fits divided by the value.
+
+    Args:
+        tolerance: the tolerances and excluded parameters, see
+            BoundaryTolerance
+    """
+    tolerance = tolerance or BoundaryTolerance()
+    arrays = ParamArrays.from_rules(params, exclude=tolerance.exclude)
+    return check_boundaries([arrays], tolerance)[0]
@@ -1,12 +1,19 @@
+import collections
 import dataclasses
+import functools
+import hashlib
 
+from collections.abc import Iterable, Iterator
 from enum import Enum
+from typing import Callable, Union
 
 import numpy
 
-from cogent3.util.dict_array import DictArray
+from cogent3.util.dict_array import DictArray, DictArrayTemplate
 from cogent3.core.table import Table
-from numpy import allclose, eye, ndarray, tile
+from cogent3.util.deserialise import register_deserialiser
+from cogent3.util.misc import get_object_provenance
+from numpy import eye, ndarray
 
 from phylim._version import __version__
 
@@ -26,14 +33,296 @@ DLC = MatrixCategory.dlc
 CHAINSAW = MatrixCategory.chainsaw
 
 
+MATRIX_CATEGORIES = tuple(MatrixCategory)
+"""the category for each integer code returned by `classify_psubs`"""
+
+CATEGORY_CODES = {mcat: code for code, mcat in enumerate(MATRIX_CATEGORIES)}
+
+
+def _edge_name(key: Union[tuple[str, ...], str]) -> str:
+    return key[0] if isinstance(key, tuple) else key
+
+
+# the layout of the rich dicts of ModelMatrixCategories and PhyloLimitRec,
+# rich dicts without a "format" are the layout before the edge categories
+# and delta_col were encoded
+RICH_DICT_FORMAT = 2
+
+
+def _rich_dict_format(data: dict) -> int:
+    layout = data.get("format", 1)
+    if layout > RICH_DICT_FORMAT:
+        raise ValueError(
+            f"rich dict format {layout} is newer than {RICH_DICT_FORMAT}, "
+            "upgrade phylim to load it"
+        )
+    return layout
+
+
+def _encode_mcats(mcats: dict) -> dict:
+    """edge names and a string of the category code of each edge"""
+    return {
+        "edges": [_edge_name(k) for k in mcats],
+        "codes": "".join([str(CATEGORY_CODES[v]) for v in mcats.values()]),
+    }
+
+
+def _decode_mcats(
+    data: dict, layout: int = RICH_DICT_FORMAT
+) -> dict[str, MatrixCategory]:
+    """edge names to categories, keyed as the psubs of a likelihood function"""
+    if layout < 2:
+        # edge names to category values
+        return {_edge_name(k): MatrixCategory(v) for k, v in data.items()}
+    return {
+        edge: MATRIX_CATEGORIES[int(code)]
+        for edge, code in zip(data["edges"], data["codes"])
+    }
+
+
+@functools.cache
+def _off_diag_mask(dim: int) -> ndarray:
+    result = ~eye(dim, dtype=bool)
+    result.flags.writeable = False
+    return result
+
+
+def _col_off_diag_max(p_matrices: ndarray) -> ndarray:
+    """the largest off-diagonal element of each column, shape (n, k)"""
+    dim = p_matrices.shape[-1]
+    return p_matrices.max(axis=1, where=_off_diag_mask(dim), initial=-numpy.inf)
+
+
+# numpy.isclose defaults
+_ATOL = 1e-08
+_RTOL = 1e-05
+
+# bound on the change to any statistic below from rounding entries of
+# magnitude <= 1 to float32, plus the float32 arithmetic on them
+_FLOAT32_GUARD = 8 * float(numpy.finfo(numpy.float32).eps)
+
+
+def _check_tolerances(atol: float, rtol: float) -> None:
+    if atol < 0 or rtol < 0:
+        raise ValueError(f"tolerances must not be negative, got {atol=}, {rtol=}")
+
+
+def _check_stacked(p_matrices: ndarray) -> None:
+    if p_matrices.ndim != 3 or p_matrices.shape[1] != p_matrices.shape[2]:
+        raise ValueError(f"expected a (n, k, k) array, not {p_matrices.shape}")
+
+
+# The statistics below are per matrix and compared with atol, so that the same
+# values can be checked against several tolerances. Each one applies the
+# numpy.isclose test, |a - b| <= atol + rtol * |b|, to every element. The
+# expensive part of a statistic is only computed for matrices where a cheap
+# partial value is within bound, the partial value is returned otherwise.
+
+
+def _identity_excess(p_matrices: ndarray, rtol: float, bound: float) -> ndarray:
+    """the identity matrix test passes where this is <= atol"""
+    diags = numpy.diagonal(p_matrices, axis1=1, axis2=2)
+    result = (numpy.abs(diags - 1.0) - rtol).max(axis=1)
+    candidates = numpy.flatnonzero(result <= bound)
+    if candidates.size:
+        subset = p_matrices[candidates] if candidates.size < len(result) else p_matrices
+        off_mask = _off_diag_mask(p_matrices.shape[-1])
+        off_max = subset.max(axis=1, where=off_mask, initial=-numpy.inf)
+        off_min = subset.min(axis=1, where=off_mask, initial=numpy.inf)
+        off_excess = numpy.maximum(off_max, -off_min).max(axis=1)
+        result[candidates] = numpy.maximum(result[candidates], off_excess)
+    return result
+
+
+def _limit_excess(p_matrices: ndarray, rtol: float, bound: float) -> ndarray:
+    """the limit matrix test passes where this is <= atol"""
+    first = p_matrices[:, 0, :]
+    tol = rtol * numpy.abs(first)
+    # only matrices whose first and last rows agree need all rows checked
+    result = (numpy.abs(p_matrices[:, -1, :] - first) - tol).max(axis=1)
+    candidates = numpy.flatnonzero(result <= bound)
+    if candidates.size:
+        subset = p_matrices[candidates] if candidates.size < len(result) else p_matrices
+        first = first[candidates]
+        spread = numpy.maximum(subset.max(axis=1) - first, first - subset.min(axis=1))
+        result[candidates] = (spread - tol[candidates]).max(axis=1)
+    return result
+
+
+def _dlc_margin(top: ndarray, runner_up: ndarray, rtol: float) -> ndarray:
+    """every column's top value is strictly, and not just numerically, larger
+    than its runner up where this is > atol"""
+    return (top - runner_up - rtol * numpy.abs(top)).min(axis=1)
+
+
+def _chainsaw_margin(p_matrices: ndarray, rtol: float) -> ndarray:
+    """the chainsaw test passes where this is > atol"""
+    num, dim = p_matrices.shape[:2]
+    result = numpy.full(num, -numpy.inf)
+    order = numpy.arange(dim)
+    max_rows = p_matrices.argmax(axis=1)
+    # the column maxima must sit in distinct rows, and not all on the diagonal
+    candidates = (numpy.sort(max_rows, axis=1) == order).all(axis=1)
+    candidates &= ~(max_rows == order).all(axis=1)
+    candidates = numpy.flatnonzero(candidates)
+    if candidates.size:
+        # permuting the column maxima onto the diagonal makes the diagonal the
+        # column maximum and the largest off-diagonal element the runner up,
+        # so the permuted copy is never needed
+        subset = p_matrices[candidates] if candidates.size < num else p_matrices
+        rows = max_rows[candidates]
+        top = numpy.take_along_axis(subset, rows[:, None, :], axis=1)[:, 0, :]
+        others = order[None, :, None] != rows[:, None, :]
+        runner_up = subset.max(axis=1, where=others, initial=-numpy.inf)
+        result[candidates] = _dlc_margin(top, runner_up, rtol)
+    return result
+
+
+@dataclasses.dataclass(slots=True)
+class _PsubStats:
+    identity: ndarray
+    limit: ndarray
+    dlc: ndarray
+    chainsaw: ndarray
+
+    @classmethod
+    def from_array(cls, p_matrices: ndarray, rtol: float, bound: float):
+        diags = numpy.diagonal(p_matrices, axis1=1, axis2=2)
+        return cls(
+            identity=_identity_excess(p_matrices, rtol, bound),
+            limit=_limit_excess(p_matrices, rtol, bound),
+            dlc=_dlc_margin(diags, _col_off_diag_max(p_matrices), rtol),
+            chainsaw=_chainsaw_margin(p_matrices, rtol),
+        )
+
+    def codes(self, atol: float) -> ndarray:
+        # earlier conditions take precedence
+        conditions = [
+            self.identity <= atol,
+            self.limit <= atol,
+            self.dlc > atol,
+            self.chainsaw > atol,
+        ]
+        choices = [CATEGORY_CODES[c] for c in (IDENTITY, LIMIT, DLC, CHAINSAW)]
+        return numpy.select(
+            conditions, choices, default=CATEGORY_CODES[SYMPATHETIC]
+        ).astype(numpy.uint8)
+
+
+def identity_mask(
+    p_matrices: ndarray, atol: float = _ATOL, rtol: float = _RTOL
+) -> ndarray:
+    """True for each matrix in a stacked (n, k, k) array that is an identity matrix"""
+    return _identity_excess(p_matrices, rtol, atol) <= atol
+
+
+def limit_mask(
+    p_matrices: ndarray, atol: float = _ATOL, rtol: float = _RTOL
+) -> ndarray:
+    """True for each matrix in a stacked (n, k, k) array whose rows are all the same"""
+    return _limit_excess(p_matrices, rtol, atol) <= atol
+
+
+def dlc_mask(p_matrices: ndarray, atol: float = _ATOL, rtol: float = _RTOL) -> ndarray:
+    """True for each matrix in a stacked (n, k, k) array that is DLC, i.e. every
+    diagonal element is strictly larger than the off-diagonal elements in its column
+    """
+    diags = numpy.diagonal(p_matrices, axis1=1, axis2=2)
+    return _dlc_margin(diags, _col_off_diag_max(p_matrices), rtol) > atol
+
+
+def chainsaw_mask(
+    p_matrices: ndarray, atol: float = _ATOL, rtol: float = _RTOL
+) -> ndarray:
+    """True for each matrix in a stacked (n, k, k) array that is a chainsaw, i.e.
+    a row permutation (other than the identity) of a DLC matrix
+    """
+    return _chainsaw_margin(p_matrices, rtol) > atol
+
+
+def classify_psubs(
+    p_matrices: ndarray, atol: float = _ATOL, rtol: float = _RTOL
+) -> ndarray:
+    """labels every matrix in a stacked (n, k, k) array
+
+    Args:
+        atol, rtol: tolerances for treating two elements as equal, as for
+            numpy.isclose
+    Returns
+    -------
+    uint8 array of category codes, use MATRIX_CATEGORIES to map them to
+    MatrixCategory members
+    """
+    p_matrices = numpy.asarray(p_matrices)
+    _check_stacked(p_matrices)
+    _check_tolerances(atol, rtol)
+    return _PsubStats.from_array(p_matrices, rtol, atol).codes(atol)
+
+
+def _has_near_tie(p_matrices: ndarray, gap: float) -> ndarray:
+    """True for each matrix with a column whose two largest values differ by
+    at most gap"""
+    top = p_matrices.max(axis=1, keepdims=True)
+    return ((p_matrices >= top - gap).sum(axis=1) > 1).any(axis=1)
+
+
+def screen_psubs(
+    p_matrices: ndarray,
+    atol: float = _ATOL,
+    rtol: float = _RTOL,
+    take: Union[Callable[[ndarray], ndarray], None] = None,
+) -> ndarray:
+    """classify_psubs in float32, with float64 rechecks of borderline matrices
+
+    Args:
+        p_matrices: stacked (n, k, k) array, converted to float32 if needed
+        atol, rtol: tolerances for treating two elements as equal, as for
+            numpy.isclose
+        take: returns the float64 matrices at an array of indices, by
+            default they are taken from p_matrices
+    Returns
+    -------
+    uint8 array of category codes, the same as classify_psubs on the float64
+    matrices
+    Notes
+    -----
+    Matrices whose category could change when atol moves by the float32
+    rounding error, and sympathetic matrices with a near tie for a column
+    maximum, are reclassified in float64. The default atol is below float32
+    resolution, so identity and limit matrices are always rechecked.
+    """
+    p_matrices = numpy.asarray(p_matrices)
+    _check_stacked(p_matrices)
+    _check_tolerances(atol, rtol)
+
+    low = p_matrices.astype(numpy.float32, copy=False)
+    stats = _PsubStats.from_array(low, rtol, atol + _FLOAT32_GUARD)
+    codes = stats.codes(atol + _FLOAT32_GUARD)
+    uncertain = codes != stats.codes(atol - _FLOAT32_GUARD)
+    if atol <= _FLOAT32_GUARD:
+        # rounding can move a column maximum to another row, which changes
+        # the permutation tested for a chainsaw
+        sym = numpy.flatnonzero(~uncertain & (codes == CATEGORY_CODES[SYMPATHETIC]))
+        uncertain[sym] = _has_near_tie(low[sym], _FLOAT32_GUARD)
+
+    recheck = numpy.flatnonzero(uncertain)
+    if recheck.size:
+        exact = (
+            take(recheck)
+            if take
+            else p_matrices[recheck].astype(numpy.float64, copy=False)
+        )
+        codes[recheck] = classify_psubs(exact, atol, rtol)
+    return codes
+
+
 def is_identity(p_matrix: ndarray) -> bool:
-    return allclose(p_matrix, eye(p_matrix.shape[0]))
+    return bool(identity_mask(p_matrix[numpy.newaxis])[0])
 
 
 def is_limit(p_matrix: ndarray) -> bool:
     """check if a given matrix is a Limit matrix, which all rows are same"""
-    p_limit = tile(p_matrix[0], (p_matrix.shape[0], 1))
-    return allclose(p_matrix, p_limit)
+    return bool(limit_mask(p_matrix[numpy.newaxis])[0])
 
 
 def is_dlc(p_matrix: ndarray) -> bool:
@@ -41,16 +330,7 @@ def is_dlc(p_matrix: ndarray) -> bool:
     Judge whether the given matrix is DLC. IMPORTANT: whether it is in limit distribution does not matter,
     but the equality between the diagnoal and off-diag elements matters.
     """
-    diags = numpy.diag(p_matrix)
-    off_diags = p_matrix.T[~eye(p_matrix.shape[0], dtype=bool)].reshape(
-        p_matrix.shape[0], p_matrix.shape[0] - 1
-    )  # take all off-diags as each column in p_matrix a vector
-    for i in range(len(diags)):
-        off_max = off_diags[i].max()
-        diag = diags[i]
-        if off_max >= diag or allclose(off_max, diag):
-            return False
-    return True
+    return bool(dlc_mask(p_matrix[numpy.newaxis])[0])
 
 
 def is_chainsaw(p_matrix: ndarray) -> bool:
@@ -58,39 +338,212 @@ def is_chainsaw(p_matrix: ndarray) -> bool:
     Judge whether the given matrix is a chainsaw. IMPORTANT: whether it is in limit distribution does
     not matter, but the equality between the diagnoal and off-diag elements matters.
     """
-    max_indices = p_matrix.argmax(axis=0)
-    unique = set(max_indices)
-    if len(unique) != p_matrix.shape[0]:
-        return False
-    if (
-        max_indices == numpy.arange(p_matrix.shape[0])
-    ).all():  # make sure it's not DLC preliminarily
-        return False
-    return is_dlc(p_matrix[max_indices, :])
+    return bool(chainsaw_mask(p_matrix[numpy.newaxis])[0])
 
 
 def classify_psub(p_matrix: ndarray) -> MatrixCategory:
     """Take a p_matrix and label it"""
-    if is_identity(p_matrix):
-        return IDENTITY
-    elif is_limit(p_matrix):
-        return LIMIT
-    elif is_dlc(p_matrix):
-        return DLC
-    elif is_chainsaw(p_matrix):
-        return CHAINSAW
-    else:
-        return SYMPATHETIC
+    return MATRIX_CATEGORIES[classify_psubs(p_matrix[numpy.newaxis])[0]]
+
+
+@functools.cache
+def _hash_weights(dim: int) -> ndarray:
+    # odd multipliers, so that every element affects the hash
+    rng = numpy.random.default_rng(dim)
+    result = rng.integers(1, 2**63, size=(2, dim), dtype=numpy.uint64)
+    result |= numpy.uint64(1)
+    result.flags.writeable = False
+    return result
+
+
+def distinct_matrices(p_matrices: ndarray) -> tuple[ndarray, ndarray]:
+    """groups the bitwise identical matrices of a stacked (n, k, k) array
+
+    Returns
+    -------
+    the index of the first of each distinct matrix, in increasing order, and
+    for every matrix the position of its distinct matrix in that array
+    """
+    num, dim = p_matrices.shape[:2]
+    if not num:
+        return numpy.empty(0, dtype=numpy.intp), numpy.empty(0, dtype=numpy.intp)
+
+    bits = numpy.ascontiguousarray(p_matrices)
+    bits = bits.view(f"u{bits.dtype.itemsize}")
+    # hash the diagonal and the first row, then compare candidates in full
+    weights = _hash_weights(dim)
+    hashes = numpy.diagonal(bits, axis1=1, axis2=2) @ weights[0]
+    hashes += bits[:, 0, :] @ weights[1]
+    _, first, inverse = numpy.unique(hashes, return_index=True, return_inverse=True)
+    rep = first[inverse]
+    dup = numpy.flatnonzero(rep != numpy.arange(num))
+    differs = dup[(bits[dup] != bits[rep[dup]]).any(axis=(1, 2))]
+    rep[differs] = differs
+    first, inverse = numpy.unique(rep, return_inverse=True)
+    return first, inverse
+
+
+@dataclasses.dataclass(slots=True, frozen=True)
+class CacheStats:
+    hits: int
+    misses: int
+    evictions: int
+    maxsize: int
+    currsize: int
+
+
+class ClassificationCache:
+    """least recently used cache of psub category codes
+
+    Entries are keyed by a hash of the float64 bytes of a matrix and the
+    classification tolerances, so identical psubs from different models
+    share an entry.
+    """
+
+    def __init__(self, maxsize: int = 2**16) -> None:
+        if maxsize < 1:
+            raise ValueError(f"maxsize must be at least 1, not {maxsize}")
+        self.maxsize = maxsize
+        self._codes: collections.OrderedDict[bytes, int] = collections.OrderedDict()
+        self._hits = self._misses = self._evictions = 0
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    @staticmethod
+    def keys(matrices: Iterable[ndarray], atol: float, rtol: float) -> list[bytes]:
+        """the cache keys of matrices classified with atol and rtol"""
+        base = hashlib.blake2b(f"{atol!r},{rtol!r}".encode(), digest_size=16)
+        result = []
+        for matrix in matrices:
+            matrix = numpy.ascontiguousarray(matrix, dtype=numpy.float64)
+            digest = base.copy()
+            digest.update(matrix.shape[-1].to_bytes(4, "little"))
+            digest.update(matrix.data)
+            result.append(digest.digest())
+        return result
+
+    def lookup(self, keys: list[bytes]) -> ndarray:
+        """cached codes of keys, -1 where a key is not cached"""
+        result = numpy.full(len(keys), -1, dtype=numpy.int16)
+        codes = self._codes
+        for i, key in enumerate(keys):
+            code = codes.get(key)
+            if code is not None:
+                codes.move_to_end(key)
+                result[i] = code
+        found = int((result >= 0).sum())
+        self._hits += found
+        self._misses += len(keys) - found
+        return result
+
+    def store(self, keys: list[bytes], codes: ndarray) -> None:
+        for key, code in zip(keys, codes.tolist()):
+            self._codes[key] = code
+            self._codes.move_to_end(key)
+        excess = len(self._codes) - self.maxsize
+        for _ in range(max(excess, 0)):
+            self._codes.popitem(last=False)
+        self._evictions += max(excess, 0)
+
+    @property
+    def stats(self) -> CacheStats:
+        return CacheStats(
+            hits=self._hits,
+            misses=self._misses,
+            evictions=self._evictions,
+            maxsize=self.maxsize,
+            currsize=len(self._codes),
+        )
+
+    def clear(self) -> None:
+        """remove all entries and reset the statistics"""
+        self._codes.clear()
+        self._hits = self._misses = self._evictions = 0
 
 
 @dataclasses.dataclass(slots=True)
 class ModelPsubs:
     source: str
     psubs: dict[tuple[str, ...], DictArray]
+    _stacked: dict = dataclasses.field(
+        default_factory=dict, init=False, repr=False, compare=False
+    )
+    _distinct: Union[tuple[ndarray, ndarray], None] = dataclasses.field(
+        default=None, init=False, repr=False, compare=False
+    )
+
+    @classmethod
+    def from_array(
+        cls,
+        source: str,
+        keys: list[tuple[str, ...]],
+        stacked: ndarray,
+        motifs: Union[list[str], None] = None,
+    ) -> "ModelPsubs":
+        """psubs of keys from a stacked (n, k, k) float64 array, which becomes
+        the array returned by to_array()"""
+        stacked = stacked.view()
+        stacked.flags.writeable = False
+        motifs = list(range(stacked.shape[-1])) if motifs is None else motifs
+        template = DictArrayTemplate(motifs, motifs)
+        result = cls(
+            source=source,
+            psubs={key: template.wrap(psub) for key, psub in zip(keys, stacked)},
+        )
+        result._stacked[stacked.dtype] = stacked
+        return result
 
     def items(self):
         return self.psubs.items()
 
+    def to_array(self, dtype=numpy.float64) -> ndarray:
+        """all psubs stacked into a (n, k, k) array, in the order of items().
+        The array is built once per dtype and shared between callers, do not
+        modify it."""
+        dtype = numpy.dtype(dtype)
+        if dtype not in self._stacked:
+            exact = self._stacked.get(numpy.dtype(numpy.float64))
+            if exact is not None:
+                stacked = exact.astype(dtype)
+            else:
+                stacked = numpy.stack(
+                    [numpy.asarray(value) for value in self.psubs.values()],
+                    dtype=dtype,
+                )
+            stacked.flags.writeable = False
+            self._stacked[dtype] = stacked
+        return self._stacked[dtype]
+
+    def distinct(self) -> tuple[ndarray, ndarray]:
+        """distinct_matrices of the stacked psubs, computed once"""
+        if self._distinct is None:
+            self._distinct = distinct_matrices(self.to_array())
+        return self._distinct
+
+    def matrices(self, indices: ndarray) -> Iterator[ndarray]:
+        """the float64 psubs at indices, one at a time and without copying
+        them into a stacked array"""
+        values = list(self.psubs.values())
+        for i in indices:
+            yield numpy.asarray(values[i], dtype=numpy.float64)
+
+    def take(self, indices: ndarray) -> ndarray:
+        """float64 (len(indices), k, k) array of the psubs at indices"""
+        if numpy.dtype(numpy.float64) in self._stacked:
+            return self._stacked[numpy.dtype(numpy.float64)][indices]
+        return numpy.stack(list(self.matrices(indices)), dtype=numpy.float64)
+
+    def take_columns(self, indices: ndarray, columns: ndarray) -> ndarray:
+        """float64 (len(indices), k) array of column columns[i] of the psub
+        at indices[i]"""
+        if numpy.dtype(numpy.float64) in self._stacked:
+            return self._stacked[numpy.dtype(numpy.float64)][indices, :, columns]
+        matrices = self.matrices(indices)
+        return numpy.stack(
+            [m[:, c] for m, c in zip(matrices, columns.tolist())], dtype=numpy.float64
+        )
+
 
 @dataclasses.dataclass(slots=True)
 class ModelMatrixCategories:
@@ -102,18 +555,26 @@ class ModelMatrixCategories:
 
     def to_rich_dict(self) -> dict:
         return {
+            "type": get_object_provenance(self),
             "source": self.source,
-            "mcats": {k: v.value for k, v in self.items()},
+            "mcats": _encode_mcats(self.mcats),
+            "format": RICH_DICT_FORMAT,
             "version": __version__,
         }
 
+    @classmethod
+    def from_rich_dict(cls, data: dict) -> "ModelMatrixCategories":
+        """the categories of a to_rich_dict() result, with edges keyed by name"""
+        mcats = _decode_mcats(data["mcats"], _rich_dict_format(data))
+        return cls(source=data["source"], mcats=mcats)
+
     def to_table(self) -> Table:
         headers = [
             "edge name",
             "matrix category",
         ]
         rows = []
-        rows.extend([edge[0], mcat.value] for edge, mcat in self.items())
+        rows.extend([_edge_name(edge), mcat.value] for edge, mcat in self.items())
         return Table(
             header=headers, data=rows, title="Substitution Matrices Categories"
         )
@@ -124,11 +585,92 @@ class ModelMatrixCategories:
         return table._repr_html_()
 
 
-def classify_matrix(psubs: ModelPsubs) -> ModelMatrixCategories:
-    """labels all psubs in a given ModelPsubs object which has source info"""
-    labelled_psubs_dict = {}
-    for key, value in psubs.items():
-        p_matrix = value.to_array()
-        labelled_psubs_dict[key] = classify_psub(p_matrix)
+def classify_psub_codes(
+    psubs: ModelPsubs,
+    atol: float = _ATOL,
+    rtol: float = _RTOL,
+    float32: bool = False,
+    indices: Union[ndarray, None] = None,
+    cache: Union[ClassificationCache, None] = None,
+) -> ndarray:
+    """category codes of the psubs at indices, by default all, in the order
+    of items()
 
+    Args:
+        float32: classify with screen_psubs on a float32 copy of the psubs
+        cache: codes of previously classified matrices, updated with the
+            new ones
+    """
+    if cache is not None:
+        positions = numpy.arange(len(psubs.psubs)) if indices is None else indices
+        # hashed from the psubs themselves, so no float64 stack is made
+        keys = cache.keys(psubs.matrices(positions), atol, rtol)
+        codes = cache.lookup(keys)
+        if (missing := numpy.flatnonzero(codes < 0)).size:
+            found = classify_psub_codes(
+                psubs, atol, rtol, float32, indices=positions[missing]
+            )
+            codes[missing] = found
+            cache.store([keys[i] for i in missing], found)
+        return codes.astype(numpy.uint8)
+
+    stacked = psubs.to_array(numpy.float32 if float32 else numpy.float64)
+    if indices is not None:
+        stacked = stacked[indices]
+    if not float32:
+        return classify_psubs(stacked, atol, rtol)
+
+    def take(positions: ndarray) -> ndarray:
+        return psubs.take(positions if indices is None else indices[positions])
+
+    return screen_psubs(stacked, atol, rtol, take=take)
+
+
+def distinct_psubs(
+    psubs: ModelPsubs, float32: bool = False
+) -> tuple[Union[ndarray, None], Union[ndarray, None]]:
+    """ModelPsubs.distinct, or None for both when there are no duplicate psubs
+    or when in float32 mode, where the float64 stack is not built"""
+    if float32:
+        return None, None
+    first, inverse = psubs.distinct()
+    if len(first) == len(inverse):
+        return None, None
+    return first, inverse
+
+
+def classify_matrix(
+    psubs: ModelPsubs,
+    atol: float = _ATOL,
+    rtol: float = _RTOL,
+    float32: bool = False,
+    cache: Union[ClassificationCache, None] = None,
+) -> ModelMatrixCategories:
+    """labels all psubs in a given ModelPsubs object which has source info
+
+    Args:
+        atol, rtol: tolerances for treating two elements as equal, as for
+            numpy.isclose
+        float32: screen in float32, rechecking borderline matrices in float64
+        cache: codes of previously classified matrices, updated with the
+            new ones
+    Notes:
+        Identical psubs are only classified once.
+    """
+    _check_tolerances(atol, rtol)
+    if not psubs.psubs:
+        return ModelMatrixCategories(source=psubs.source, mcats={})
+
+    first, inverse = distinct_psubs(psubs, float32)
+    codes = classify_psub_codes(psubs, atol, rtol, float32, first, cache)
+    if inverse is not None:
+        codes = codes[inverse]
+    labelled_psubs_dict = {
+        key: MATRIX_CATEGORIES[code] for key, code in zip(psubs.psubs, codes)
+    }
     return ModelMatrixCategories(source=psubs.source, mcats=labelled_psubs_dict)
+
+
+@register_deserialiser(get_object_provenance(ModelMatrixCategories))
+def deserialise_model_matrix_categories(data: dict) -> ModelMatrixCategories:
+    return ModelMatrixCategories.from_rich_dict(data)
@@ -0,0 +1,161 @@
+import glob
+import json
+import pathlib
+import time
+
+from collections.abc import Iterable, Iterator
+from itertools import islice
+
+import click
+
+from cogent3.app.composable import NotCompleted
+from cogent3.app.data_store import DataMember, get_unique_id
+from cogent3.app.io import open_data_store, write_db
+
+from phylim.apps import PhyloLimitRec, _phylim_members
+from phylim.parallel import _map_chunks
+
+
+_GLOB_CHARS = set("*?[")
+
+
+def _iter_inputs(source: str, suffix: str) -> Iterator[DataMember | str]:
+    """data store members, or json file paths when source is a glob pattern"""
+    if _GLOB_CHARS & set(source):
+        yield from glob.iglob(source, recursive=True)
+        return
+
+    dstore = open_data_store(source, suffix=suffix, mode="r")
+    yield from dstore.completed
+
+
+def _batched(items: Iterable, size: int) -> Iterator[list]:
+    items = iter(items)
+    while batch := list(islice(items, size)):
+        yield batch
+
+
+class _JsonLinesWriter:
+    """appends one json record per line, flushed after every batch"""
+
+    def __init__(self, path: pathlib.Path, resume: bool) -> None:
+        self.path = path
+        if resume and path.exists():
+            self._drop_partial_line()
+        self._file = path.open("a" if resume else "w")
+
+    def _drop_partial_line(self) -> None:
+        # an interrupted run can leave a truncated final record
+        data = self.path.read_bytes()
+        if data and not data.endswith(b"\n"):
+            self.path.write_bytes(data[: data.rfind(b"\n") + 1])
+
+    def identifiers(self) -> set[str]:
+        with self.path.open() as infile:
+            return {json.loads(line)["identifier"] for line in infile if line.strip()}
+
+    def write(self, results: list[tuple[str, PhyloLimitRec | NotCompleted]]) -> None:
+        for identifier, result in results:
+            record = {
+                "identifier": identifier,
+                "completed": not isinstance(result, NotCompleted),
+                "data": result.to_rich_dict(),
+            }
+            self._file.write(json.dumps(record) + "\n")
+        self._file.flush()
+
+    def close(self) -> None:
+        self._file.close()
+
+
+class _DataStoreWriter:
+    """writes to a sqlitedb data store"""
+
+    def __init__(self, path: pathlib.Path, resume: bool) -> None:
+        self.dstore = open_data_store(path, mode="a" if resume else "w")
+        self._writer = write_db(self.dstore)
+
+    def identifiers(self) -> set[str]:
+        return {get_unique_id(m) for m in self.dstore}
+
+    def write(self, results: list[tuple[str, PhyloLimitRec | NotCompleted]]) -> None:
+        for identifier, result in results:
+            self._writer.main(result, identifier=identifier)
+
+    def close(self) -> None:
+        self.dstore.close()
+
+
+@click.command(no_args_is_help=True)
+@click.argument("source")
+@click.argument("output", type=click.Path(dir_okay=False, path_type=pathlib.Path))
+@click.option(
+    "--suffix", default="json", show_default=True, help="suffix of directory members"
+)
+@click.option("--strict", is_flag=True, help="treat identity matrices as violations")
+@click.option(
+    "--verdict-only",
+    is_flag=True,
+    help="only decide identifiability, skipping boundary and delta_col checks",
+)
+@click.option(
+    "--batch-size",
+    default=100,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="number of results written at a time",
+)
+@click.option(
+    "--workers",
+    default=1,
+    show_default=True,
+    type=click.IntRange(min=1),
+    help="number of worker processes",
+)
+@click.option("--resume", is_flag=True, help="skip inputs already in OUTPUT")
+@click.option("--overwrite", is_flag=True, help="replace an existing OUTPUT")
+def main(
+    source: str,
+    output: pathlib.Path,
+    suffix: str,
+    strict: bool,
+    verdict_only: bool,
+    batch_size: int,
+    workers: int,
+    resume: bool,
+    overwrite: bool,
+) -> None:
+    """Check the model_results in SOURCE with phylim, writing to OUTPUT.
+
+    SOURCE is a directory or sqlitedb data store, or a quoted glob pattern of
+    json files. OUTPUT is a .jsonl file or a .sqlitedb data store.
+    """
+    if output.suffix not in (".jsonl", ".sqlitedb"):
+        raise click.BadParameter(
+            "must end with .jsonl or .sqlitedb", param_hint="OUTPUT"
+        )
+    if output.exists() and not (resume or overwrite):
+        raise click.UsageError(f"{output} exists, use --resume or --overwrite")
+
+    writer_type = _JsonLinesWriter if output.suffix == ".jsonl" else _DataStoreWriter
+    writer = writer_type(output, resume=resume)
+    done = writer.identifiers() if resume else set()
+
+    start = time.perf_counter()
+    todo = (i for i in _iter_inputs(source, suffix) if get_unique_id(i) not in done)
+    num_completed = num_not_completed = 0
+    try:
+        for results in _map_chunks(
+            _phylim_members, _batched(todo, batch_size), workers, strict, verdict_only
+        ):
+            writer.write(results)
+            failed = sum(isinstance(r, NotCompleted) for _, r in results)
+            num_not_completed += failed
+            num_completed += len(results) - failed
+    finally:
+        writer.close()
+
+    click.echo(
+        f"checked {num_completed + num_not_completed} ({num_not_completed} not "
+        f"completed), {len(done)} already done, in {time.perf_counter() - start:.1f}s"
+    )
@@ -1,10 +1,31 @@
+from typing import Union
+
 import numpy
 
-from phylim.classify_matrix import ModelPsubs
+from phylim.classify_matrix import (
+    _FLOAT32_GUARD,
+    ModelPsubs,
+    _col_off_diag_max,
+    distinct_psubs,
+)
+
+
+def col_margins(p_matrices: numpy.ndarray) -> numpy.ndarray:
+    """difference between the diagonal and the largest off-diagonal element
+    of each column, for every matrix in a stacked (n, k, k) array
+
+    Returns
+    -------
+    (n, k) array
+    """
+    diags = numpy.diagonal(p_matrices, axis1=1, axis2=2)
+    return diags - _col_off_diag_max(p_matrices)
 
 
 def min_diff_from_diag(
-    m: numpy.ndarray, diag_indices: tuple, off_diag_indices: numpy.ndarray
+    m: numpy.ndarray,
+    diag_indices: Union[tuple, None] = None,
+    off_diag_indices: Union[numpy.ndarray, None] = None,
 ) -> numpy.ndarray:
     """compute difference for each column between diagonal and
     the largest off-diagonal element
@@ -13,27 +34,73 @@ def min_diff_from_diag(
         m (numpy.ndarray): a matrix
         diag_indices (tuple): diagonal indices
         off_diag_indices (numpy.ndarray): off-diagonal indices in boolean
+    Notes:
+        Without indices the margins are those of col_margins.
     """
+    if diag_indices is None and off_diag_indices is None:
+        return col_margins(m[numpy.newaxis])[0]
+    if diag_indices is None:
+        diag_indices = numpy.diag_indices(m.shape[0])
+    if off_diag_indices is None:
+        off_diag_indices = ~numpy.eye(m.shape[0], dtype=bool)
     return m[diag_indices] - m.max(axis=0, where=off_diag_indices, initial=m.min())
 
 
 def min_col_diff(
     m: numpy.ndarray,
-    diag_indices: tuple,  # = DIAG,
-    off_diag_indices: numpy.ndarray,  # = OFFDIAG,
+    diag_indices: Union[tuple, None] = None,
+    off_diag_indices: Union[numpy.ndarray, None] = None,
 ) -> float:
-    return min_diff_from_diag(m, diag_indices, off_diag_indices).min()
-
-
-def calc_delta_col(psubs: ModelPsubs) -> dict:
-    """calculate delta_col for given psubs"""
-    psubs_dict = {}
-    for key, value in psubs.items():
-        p = value.to_array()
-        shape = p.shape
-        mask = numpy.ones(shape, bool)
-        mask[numpy.diag_indices(shape[0])] = False
-        diag_indices = numpy.diag_indices(shape[0])
-        offdiag_indices = mask
-        psubs_dict[key] = min_col_diff(p, diag_indices, offdiag_indices)
-    return psubs_dict
+    return float(min_diff_from_diag(m, diag_indices, off_diag_indices).min())
+
+
+def calc_delta_col_margins(psubs: ModelPsubs) -> tuple[numpy.ndarray, numpy.ndarray]:
+    """per-edge delta_col and the per-column margins it is the minimum of
+
+    Returns
+    -------
+    (n_edges,) array of delta_col and (n_edges, k) array of column margins,
+    both in the order of psubs.items()
+    Notes:
+        Identical psubs are only evaluated once.
+    """
+    if not psubs.psubs:
+        return numpy.empty(0), numpy.empty((0, 0))
+    stacked = psubs.to_array()
+    first, inverse = distinct_psubs(psubs)
+    if first is None:
+        margins = col_margins(stacked)
+    else:
+        margins = col_margins(stacked[first])[inverse]
+    return margins.min(axis=1), margins
+
+
+def _screen_delta_col(psubs: ModelPsubs) -> numpy.ndarray:
+    """delta_col from the float32 psubs, with the margins of the columns that
+    could be the smallest of their matrix recomputed in float64"""
+    margins = col_margins(psubs.to_array(numpy.float32))
+    # rounding moves each float32 margin by at most _FLOAT32_GUARD, so the
+    # smallest float64 margin is within twice that of the smallest float32 one
+    bound = margins.min(axis=1, keepdims=True) + 2 * _FLOAT32_GUARD
+    edges, columns = numpy.nonzero(margins <= bound)
+    exact = psubs.take_columns(edges, columns)
+    rows = numpy.arange(len(edges))
+    diags = exact[rows, columns]
+    exact[rows, columns] = -numpy.inf
+    result = numpy.full(len(margins), numpy.inf)
+    numpy.minimum.at(result, edges, diags - exact.max(axis=1))
+    return result
+
+
+def calc_delta_col(psubs: ModelPsubs, float32: bool = False) -> dict:
+    """calculate delta_col for given psubs
+
+    Args:
+        float32: find the smallest column margins in float32, only the
+            candidate columns are read in float64. The values are the same.
+    """
+    if float32 and psubs.psubs:
+        delta_col = _screen_delta_col(psubs)
+    else:
+        delta_col, _ = calc_delta_col_margins(psubs)
+    return dict(zip(psubs.psubs, delta_col.tolist()))
@@ -1,20 +1,35 @@
 import dataclasses
 
+from collections.abc import Iterable, Sequence
 from enum import Enum
 from itertools import chain
 from typing import Union
 
+import numpy
+
 from cogent3.core.tree import PhyloNode
+from cogent3.util.deserialise import register_deserialiser
+from cogent3.util.misc import get_object_provenance
 
 from phylim._version import __version__
 from phylim.classify_matrix import (
+    CATEGORY_CODES,
     CHAINSAW,
     IDENTITY,
     LIMIT,
     SYMPATHETIC,
+    ClassificationCache,
     MatrixCategory,
     ModelMatrixCategories,
+    ModelPsubs,
+    _ATOL,
+    _RTOL,
+    _edge_name,
+    classify_matrix,
+    classify_psub_codes,
+    distinct_psubs,
 )
+from phylim.topology import TreeIndex, make_tree_index
 
 
 def trav_tip_to_root(tree: PhyloNode) -> list[list[str]]:
@@ -70,27 +85,97 @@ def find_bad_nodes(reachable: list[set], tips: set, nodes: set) -> set:
     return nodes - good_nodes
 
 
+# matrices that break a path to a tip
+PATH_BREAKING = frozenset({SYMPATHETIC, LIMIT})
+
+
+def bad_categories(strict: bool) -> frozenset[MatrixCategory]:
+    """matrix categories that make a model non-identifiable"""
+    return frozenset({IDENTITY, CHAINSAW} if strict else {CHAINSAW})
+
+
 def eval_mcats(mcats: dict[tuple[str, ...], MatrixCategory], strict: bool) -> set:
     """return any chainsaws or identity matrices (depend on `strict`)"""
-    bad_categories = {IDENTITY, CHAINSAW} if strict else {CHAINSAW}
-    return {k[0] for k, v in mcats.items() if v in bad_categories}
+    bad = bad_categories(strict)
+    return {_edge_name(k) for k, v in mcats.items() if v in bad}
+
 
+def tip_reachable(
+    parents: list[int], is_tip: list[bool], cut: list[bool]
+) -> list[bool]:
+    """for each node, whether a tip can be reached without passing a cut edge
 
-def eval_paths(mcats: dict[tuple[str, ...], MatrixCategory], tree: PhyloNode) -> set:
+    Args:
+        parents: parent id of each node, in preorder (see TreeIndex)
+        is_tip: whether each node is a tip
+        cut: whether the edge between each node and its parent is cut
+    Notes:
+        the nodes joined by uncut edges form connected components, a node is
+        reachable if its component contains a tip. One postorder pass finds
+        whether a tip is reachable below each node, then one preorder pass
+        copies the answer of the top of each component down to its members.
+    """
+    num = len(parents)
+    below = list(is_tip)
+    for node in range(num - 1, 0, -1):
+        if below[node] and not cut[node]:
+            below[parents[node]] = True
+
+    reachable = below
+    for node in range(1, num):
+        if not cut[node]:
+            reachable[node] = reachable[parents[node]]
+    return reachable
+
+
+def find_unreachable(
+    parents: list[int], is_tip: list[bool], cut: list[bool]
+) -> Union[int, None]:
+    """the id of a node that cannot reach a tip, or None if all nodes can
+
+    Same arguments as tip_reachable, but stops as soon as the top node of a
+    component without a tip is found.
+    """
+    below = list(is_tip)
+    for node in range(len(parents) - 1, -1, -1):
+        if not below[node] and (node == 0 or cut[node]):
+            return node
+        if node and below[node] and not cut[node]:
+            below[parents[node]] = True
+    return None
+
+
+def eval_paths(
+    mcats: dict[tuple[str, ...], MatrixCategory],
+    tree: PhyloNode,
+    counts: Union[dict[str, int], None] = None,
+) -> set:
     """if num of S = 1 or 0, return an empty set; if num of S >= 2, run the path validation algm,
-    then return a set for bad nodes."""
-    msyms = {k[0] for k, v in mcats.items() if v in {SYMPATHETIC, LIMIT}}
+    then return a set for bad nodes.
+
+    Args:
+        counts: if provided, receives the number of path-breaking edges
+            ("paths_broken") and of tree nodes examined ("nodes_examined")
+    """
+    msyms = {_edge_name(k) for k, v in mcats.items() if v in PATH_BREAKING}
+    if counts is not None:
+        counts["paths_broken"] = len(msyms)
+        counts["nodes_examined"] = 0
     if len(msyms) < 2:
         return set()
-    tips = set(tree.get_tip_names())
-    nodes = set(tree.get_node_names()) - tips
-    traversed = trav_tip_to_root(tree)
 
-    breaked_paths = []
-    for i in traversed:
-        breaked_paths = breaked_paths + break_path(i, msyms)
-
-    return find_bad_nodes(find_intersection(breaked_paths), tips, nodes)
+    index = make_tree_index(tree)
+    if counts is not None:
+        counts["nodes_examined"] = len(index)
+    is_tip = index.is_tip.tolist()
+    reachable = tip_reachable(
+        index.parents.tolist(), is_tip, index.mask(msyms).tolist()
+    )
+    return {
+        name
+        for name, tip, good in zip(index.names, is_tip, reachable)
+        if not (tip or good)
+    }
 
 
 class ViolationType(Enum):
@@ -113,6 +198,7 @@ class IdentCheckRes:
 
     def to_rich_dict(self) -> dict:
         result = {
+            "type": get_object_provenance(self),
             "source": self.source,
             "strict": self.strict,
             "names": None,
@@ -124,34 +210,238 @@ class IdentCheckRes:
 
         return result
 
+    @classmethod
+    def from_rich_dict(cls, data: dict) -> "IdentCheckRes":
+        names = data["names"]
+        return cls(
+            source=data["source"],
+            strict=data["strict"],
+            names=None if names is None else set(names),
+            violation_type=ViolationType[data["violation_type"]],
+        )
+
     @property
     def is_identifiable(self) -> bool:
         return self.violation_type is IDENTIFIABLE
 
 
+@register_deserialiser(get_object_provenance(IdentCheckRes))
+def deserialise_ident_check_res(data: dict) -> IdentCheckRes:
+    return IdentCheckRes.from_rich_dict(data)
+
+
 def eval_identifiability(
-    psubs: ModelMatrixCategories, tree: PhyloNode, strict: bool
+    psubs: ModelMatrixCategories,
+    tree: PhyloNode,
+    strict: bool,
+    counts: Union[dict[str, int], None] = None,
 ) -> IdentCheckRes:
     """check the identifiability of a model fit, provided tree and matrices categories.
     Args:
         strict: controls the sensitivity for Identity matrix (I); if false, treat I as DLC.
+        counts: if provided, receives the counts described in eval_paths, and
+            the number of bad matrices ("bad_matrices")
     """
-    if bad_mtx_names := eval_mcats(psubs.mcats, strict=strict):
-        return IdentCheckRes(
+    return eval_strictness(psubs, tree, [strict], counts)[strict]
+
+
+def eval_strictness(
+    psubs: ModelMatrixCategories,
+    tree: PhyloNode,
+    stricts: Iterable[bool] = (False, True),
+    counts: Union[dict[str, int], None] = None,
+) -> dict[bool, IdentCheckRes]:
+    """eval_identifiability for each of stricts, from one pass over the tree
+
+    Args:
+        counts: as for eval_identifiability, "bad_matrices" counts the edges
+            that are bad matrices in any of stricts
+    Notes:
+        The settings only differ in which categories are bad matrices, see
+        bad_categories, so the paths are evaluated at most once, and only if
+        a setting has no bad matrix.
+    """
+    stricts = list(dict.fromkeys(stricts))
+    bad_mtx_names = {
+        strict: eval_mcats(psubs.mcats, strict=strict) for strict in stricts
+    }
+    if counts is not None:
+        counts["bad_matrices"] = len(set().union(*bad_mtx_names.values()))
+        counts["paths_broken"] = counts["nodes_examined"] = 0
+
+    bad_node_names = None
+    results = {}
+    for strict in stricts:
+        if bad_mtx_names[strict]:
+            names, violation_type = bad_mtx_names[strict], BADMTX
+        else:
+            if bad_node_names is None:
+                bad_node_names = eval_paths(psubs.mcats, tree, counts)
+            names, violation_type = (
+                (set(bad_node_names), BADNODES)
+                if bad_node_names
+                else (None, IDENTIFIABLE)
+            )
+        results[strict] = IdentCheckRes(
             source=psubs.source,
             strict=strict,
-            names=bad_mtx_names,
-            violation_type=BADMTX,
+            names=names,
+            violation_type=violation_type,
         )
+    return results
 
-    bad_node_names = eval_paths(psubs.mcats, tree)
-    if bad_node_names:
-        return IdentCheckRes(
-            source=psubs.source,
-            strict=strict,
-            names=bad_node_names,
-            violation_type=BADNODES,
+
+@dataclasses.dataclass(slots=True, frozen=True)
+class CheckMode:
+    """the settings of an identifiability check that can change its verdict
+
+    Args:
+        strict: controls the sensitivity for Identity matrix (I); if false,
+            treat I as DLC.
+        atol, rtol: tolerances for treating two elements as equal when
+            classifying psubs, as for classify_matrix
+    """
+
+    strict: bool = False
+    atol: float = _ATOL
+    rtol: float = _RTOL
+
+    def to_rich_dict(self) -> dict:
+        return dataclasses.asdict(self)
+
+    @classmethod
+    def from_rich_dict(cls, data: dict) -> "CheckMode":
+        return cls(**data)
+
+
+def eval_identifiability_modes(
+    psubs: ModelPsubs,
+    tree: PhyloNode,
+    modes: Iterable[CheckMode],
+    float32: bool = False,
+    cache: Union[ClassificationCache, None] = None,
+    classified: Union[dict[tuple[float, float], ModelMatrixCategories], None] = None,
+    counts: Union[dict[str, int], None] = None,
+) -> dict[CheckMode, IdentCheckRes]:
+    """check the identifiability of a model fit in each of modes
+
+    Args:
+        float32, cache: passed to classify_matrix
+        classified: categories of psubs already classified, keyed by their
+            (atol, rtol). Reused, and updated with the new classifications.
+        counts: if provided, receives the number of classifications made
+            ("classifications"), and the counts of eval_strictness summed
+            over the classifications
+    Notes:
+        The psubs are classified once per distinct tolerances, and the modes
+        sharing tolerances are evaluated together by eval_strictness.
+    """
+    classified = {} if classified is None else classified
+    stricts = {}
+    for mode in modes:
+        stricts.setdefault((mode.atol, mode.rtol), []).append(mode.strict)
+
+    if counts is not None:
+        counts |= {
+            "classifications": 0,
+            "bad_matrices": 0,
+            "paths_broken": 0,
+            "nodes_examined": 0,
+        }
+    results = {}
+    for (atol, rtol), group in stricts.items():
+        if (atol, rtol) not in classified:
+            classified[atol, rtol] = classify_matrix(
+                psubs, atol, rtol, float32, cache=cache
+            )
+            if counts is not None:
+                counts["classifications"] += 1
+        group_counts = {}
+        checks = eval_strictness(classified[atol, rtol], tree, group, group_counts)
+        if counts is not None:
+            for name, value in group_counts.items():
+                counts[name] += value
+        results |= {
+            CheckMode(strict, atol, rtol): check for strict, check in checks.items()
+        }
+    return results
+
+
+def eval_verdict(
+    psubs: ModelPsubs,
+    tree: PhyloNode,
+    strict: bool,
+    chunk_size: int = 256,
+    atol: float = _ATOL,
+    rtol: float = _RTOL,
+    float32: bool = False,
+    counts: Union[dict[str, int], None] = None,
+    cache: Union[ClassificationCache, None] = None,
+) -> IdentCheckRes:
+    """check the identifiability of a model fit, stopping at the first violation.
+
+    Args:
+        strict: controls the sensitivity for Identity matrix (I); if false, treat I as DLC.
+        chunk_size: number of distinct psubs classified at a time
+        atol, rtol, float32, cache: passed to classify_psub_codes
+        counts: if provided, receives the number of edges whose psub was
+            classified ("edges_classified") and the counts described in
+            eval_paths
+    Notes:
+        The verdict is the same as eval_identifiability, but names holds only
+        the first bad matrix or bad node found. Identical psubs are only
+        classified once.
+    """
+    keys = list(psubs.psubs)
+    bad_codes = [CATEGORY_CODES[c] for c in bad_categories(strict)]
+    breaking_codes = [CATEGORY_CODES[c] for c in PATH_BREAKING]
+    first, inverse = distinct_psubs(psubs, float32)
+    if first is None:
+        first = numpy.arange(len(keys))
+        group_sizes = numpy.ones(len(keys), dtype=numpy.intp)
+    else:
+        group_sizes = numpy.bincount(inverse, minlength=len(first))
+    codes = numpy.empty(len(first), dtype=numpy.uint8)
+    if counts is None:
+        counts = {}
+    counts |= {"edges_classified": 0, "paths_broken": 0, "nodes_examined": 0}
+    for start in range(0, len(first), chunk_size):
+        chunk = first[start : start + chunk_size]
+        codes[start : start + len(chunk)] = chunk_codes = classify_psub_codes(
+            psubs, atol, rtol, float32, indices=chunk, cache=cache
         )
+        counts["edges_classified"] += int(group_sizes[start : start + len(chunk)].sum())
+        if (bad := numpy.flatnonzero(numpy.isin(chunk_codes, bad_codes))).size:
+            return IdentCheckRes(
+                source=psubs.source,
+                strict=strict,
+                names={_edge_name(keys[chunk[bad[0]]])},
+                violation_type=BADMTX,
+            )
+
+    if inverse is not None:
+        codes = codes[inverse]
+    msyms = {
+        _edge_name(keys[i])
+        for i in numpy.flatnonzero(numpy.isin(codes, breaking_codes))
+    }
+
+    counts["paths_broken"] = len(msyms)
+    if len(msyms) >= 2:
+        index = make_tree_index(tree)
+        counts["nodes_examined"] = len(index)
+        bad_node = find_unreachable(
+            index.parents.tolist(),
+            index.is_tip.tolist(),
+            index.mask(msyms).tolist(),
+        )
+        if bad_node is not None:
+            return IdentCheckRes(
+                source=psubs.source,
+                strict=strict,
+                names={index.names[bad_node]},
+                violation_type=BADNODES,
+            )
 
     return IdentCheckRes(
         source=psubs.source,
@@ -159,3 +449,284 @@ def eval_identifiability(
         names=None,
         violation_type=IDENTIFIABLE,
     )
+
+
+def tip_reachable_batch(index: TreeIndex, cut: numpy.ndarray) -> numpy.ndarray:
+    """tip_reachable for many sets of cut edges on one topology
+
+    Args:
+        index: the topology
+        cut: (n_replicates, n_nodes) whether the edge above each node is cut
+    Returns
+    -------
+    (n_replicates, n_nodes) boolean array
+    Notes:
+        The two passes of tip_reachable are made one tree level at a time,
+        for all replicates at once.
+    """
+    levels = index.levels
+    below = numpy.repeat(index.is_tip[numpy.newaxis], len(cut), axis=0)
+    for nodes, _, starts, level_parents in reversed(levels):
+        up = below[:, nodes] & ~cut[:, nodes]
+        below[:, level_parents] |= numpy.logical_or.reduceat(up, starts, axis=1)
+
+    reachable = below
+    for nodes, parents, _, _ in levels:
+        reachable[:, nodes] = numpy.where(
+            cut[:, nodes], reachable[:, nodes], reachable[:, parents]
+        )
+    return reachable
+
+
+@dataclasses.dataclass(slots=True)
+class ReplicateChecks:
+    """the identifiability of replicate fits that share one topology
+
+    Row i of each array is replicate i, the columns of bad_matrices are edges
+    and those of bad_nodes are nodes.
+    """
+
+    strict: bool
+    sources: tuple[str, ...]
+    edges: tuple[str, ...]
+    nodes: tuple[str, ...]
+    bad_matrices: numpy.ndarray
+    bad_nodes: numpy.ndarray
+
+    def __len__(self) -> int:
+        return len(self.sources)
+
+    @property
+    def is_identifiable(self) -> numpy.ndarray:
+        return ~(self.bad_matrices.any(axis=1) | self.bad_nodes.any(axis=1))
+
+    def __getitem__(self, index: int) -> IdentCheckRes:
+        """the IdentCheckRes of a replicate, as from eval_identifiability"""
+        for mask, names, violation_type in (
+            (self.bad_matrices[index], self.edges, BADMTX),
+            (self.bad_nodes[index], self.nodes, BADNODES),
+        ):
+            if mask.any():
+                return IdentCheckRes(
+                    source=self.sources[index],
+                    strict=self.strict,
+                    names={names[i] for i in numpy.flatnonzero(mask)},
+                    violation_type=violation_type,
+                )
+        return IdentCheckRes(
+            source=self.sources[index],
+            strict=self.strict,
+            names=None,
+            violation_type=IDENTIFIABLE,
+        )
+
+    def to_list(self) -> list[IdentCheckRes]:
+        return [self[i] for i in range(len(self))]
+
+
+def eval_identifiability_batch(
+    codes: numpy.ndarray,
+    tree: PhyloNode,
+    strict: bool,
+    edges: Union[Sequence[str], None] = None,
+    sources: Union[Sequence[str], None] = None,
+) -> ReplicateChecks:
+    """check the identifiability of replicate fits on the topology of tree,
+    such as fits to bootstrap samples
+
+    Args:
+        codes: (n_replicates, n_edges) category codes (see CATEGORY_CODES) of
+            the psubs of each replicate
+        strict: controls the sensitivity for Identity matrix (I); if false,
+            treat I as DLC.
+        edges: the edge name of each column of codes, by default the nodes of
+            tree in preorder, without the root
+        sources: the source of each replicate, by default its row number
+    Notes:
+        Each replicate gets the verdict and names of eval_identifiability.
+        The topology is indexed once and the replicates are evaluated
+        together.
+    """
+    codes = numpy.asarray(codes)
+    index = make_tree_index(tree)
+    edges = tuple(index.names[1:] if edges is None else edges)
+    if codes.ndim != 2 or codes.shape[1] != len(edges):
+        raise ValueError(
+            f"codes must have shape (n_replicates, {len(edges)}), not {codes.shape}"
+        )
+    sources = tuple([str(i) for i in range(len(codes))] if sources is None else sources)
+    if len(sources) != len(codes):
+        raise ValueError(f"{len(sources)} sources for {len(codes)} replicates")
+
+    bad_codes = [CATEGORY_CODES[c] for c in bad_categories(strict)]
+    breaking_codes = [CATEGORY_CODES[c] for c in PATH_BREAKING]
+    bad_matrices = numpy.isin(codes, bad_codes)
+
+    breaking = numpy.isin(codes, breaking_codes)
+    bad_nodes = numpy.zeros((len(codes), len(index)), dtype=bool)
+    # fewer than two path breaking edges cannot isolate a node, as in
+    # eval_paths
+    if (rows := numpy.flatnonzero(breaking.sum(axis=1) >= 2)).size:
+        cut = numpy.zeros((rows.size, len(index)), dtype=bool)
+        cut[:, index.node_ids(edges)] = breaking[rows]
+        reachable = tip_reachable_batch(index, cut)
+        bad_nodes[rows] = ~(reachable | index.is_tip)
+
+    return ReplicateChecks(
+        strict=strict,
+        sources=sources,
+        edges=edges,
+        nodes=index.names,
+        bad_matrices=bad_matrices,
+        bad_nodes=bad_nodes,
+    )
+
+
+class IdentifiabilityEvaluator:
+    """identifiability of a model fit that is updated as edge categories change
+
+    Args:
+        psubs: the categories of all psubs of the model
+        tree: the tree of the model
+        strict: controls the sensitivity for Identity matrix (I); if false,
+            treat I as DLC.
+    Notes:
+        For every node we keep the number of children that reach a tip without
+        crossing a sympathetic or limit edge. Changing the category of an edge
+        only updates those counts on the path from the edge towards the root,
+        plus the bad-node status of the one or two connected components that
+        gain or lose their tip. The `check` property is always equal to
+        `eval_identifiability` on the current categories.
+    """
+
+    def __init__(
+        self, psubs: ModelMatrixCategories, tree: PhyloNode, strict: bool = False
+    ) -> None:
+        self.source = psubs.source
+        self.strict = strict
+        self._bad_categories = bad_categories(strict)
+        self._mcats = {_edge_name(k): v for k, v in psubs.items()}
+        self._bad_mtx = {k for k, v in self._mcats.items() if v in self._bad_categories}
+        self._num_breaking = sum(v in PATH_BREAKING for v in self._mcats.values())
+
+        index = make_tree_index(tree)
+        self._ids = index.ids
+        self._parents = index.parents.tolist()
+        self._is_tip = index.is_tip.tolist()
+        children = index.children.tolist()
+        offsets = index.child_offsets.tolist()
+        self._children = [
+            children[start:stop] for start, stop in zip(offsets, offsets[1:])
+        ]
+        self._names = index.names
+        self._cut = [self._mcats.get(n) in PATH_BREAKING for n in self._names]
+
+        # number of children that reach a tip without a cut edge
+        self._num_open = [0] * len(self._parents)
+        for node in range(len(self._parents) - 1, 0, -1):
+            if self._below(node) and not self._cut[node]:
+                self._num_open[self._parents[node]] += 1
+
+        reachable = tip_reachable(self._parents, self._is_tip, self._cut)
+        self._bad_nodes = {
+            self._names[node]
+            for node, good in enumerate(reachable)
+            if not (good or self._is_tip[node])
+        }
+
+    def _below(self, node: int) -> bool:
+        return self._is_tip[node] or self._num_open[node] > 0
+
+    def _component_top(self, node: int) -> int:
+        while node and not self._cut[node]:
+            node = self._parents[node]
+        return node
+
+    def _propagate(self, node: int, delta: int) -> None:
+        """the contribution of node to its parent's count changed by delta"""
+        while node:
+            parent = self._parents[node]
+            before = self._below(parent)
+            self._num_open[parent] += delta
+            if self._below(parent) == before or self._cut[parent]:
+                return
+            node = parent
+
+    def _set_component(self, top: int, good: bool, skip: int = -1) -> None:
+        """set the bad-node status of the component whose top node is top"""
+        stack = [top]
+        while stack:
+            node = stack.pop()
+            if not self._is_tip[node]:
+                if good:
+                    self._bad_nodes.discard(self._names[node])
+                else:
+                    self._bad_nodes.add(self._names[node])
+            stack.extend(
+                c for c in self._children[node] if not self._cut[c] and c != skip
+            )
+
+    def update(self, edge: str, mcat: MatrixCategory) -> None:
+        """record that the psub of edge now has category mcat"""
+        old = self._mcats.get(edge)
+        if old is mcat:
+            return
+
+        self._mcats[edge] = mcat
+        self._num_breaking += (mcat in PATH_BREAKING) - (old in PATH_BREAKING)
+        if mcat in self._bad_categories:
+            self._bad_mtx.add(edge)
+        else:
+            self._bad_mtx.discard(edge)
+
+        node = self._ids.get(edge)
+        cut = mcat in PATH_BREAKING
+        if not node or cut == self._cut[node]:
+            return  # not an edge of the tree, or the tree structure is unchanged
+
+        top = self._component_top(self._parents[node])
+        below = self._below(node)  # determined by the subtree, so unchanged
+        top_before = self._below(top)
+        self._cut[node] = cut
+        if below:
+            self._propagate(node, -1 if cut else 1)
+        top_after = self._below(top)
+
+        if cut:  # the component splits in two
+            if below != top_before:
+                self._set_component(node, below)
+            if top_after != top_before:
+                self._set_component(top, top_after)
+        else:  # the two components merge
+            if below != top_after:
+                self._set_component(node, top_after)
+            if top_before != top_after:
+                self._set_component(top, top_after, skip=node)
+
+    def update_many(
+        self, mcats: dict[Union[str, tuple[str, ...]], MatrixCategory]
+    ) -> None:
+        """apply several updates, keys are edge names or ModelMatrixCategories keys"""
+        for edge, mcat in mcats.items():
+            self.update(edge[0] if isinstance(edge, tuple) else edge, mcat)
+
+    @property
+    def bad_nodes(self) -> set[str]:
+        """internal nodes without a path to a tip free of sympathetic matrices"""
+        return set(self._bad_nodes) if self._num_breaking >= 2 else set()
+
+    @property
+    def check(self) -> IdentCheckRes:
+        """the identifiability of the model with the current categories"""
+        if self._bad_mtx:
+            names, violation_type = set(self._bad_mtx), BADMTX
+        elif bad_nodes := self.bad_nodes:
+            names, violation_type = bad_nodes, BADNODES
+        else:
+            names, violation_type = None, IDENTIFIABLE
+        return IdentCheckRes(
+            source=self.source,
+            strict=self.strict,
+            names=names,
+            violation_type=violation_type,
+        )
@@ -0,0 +1,72 @@
+"""process pools and data stores shared by the batch front-ends"""
+
+import multiprocessing
+import os
+
+from collections.abc import Callable, Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from itertools import islice
+from typing import Union
+
+from cogent3.app.data_store import DataStoreABC, Mode
+from cogent3.app.io import open_data_store
+
+
+def _spawn_pool(max_workers: Union[int, None]) -> ProcessPoolExecutor:
+    # forking a process that has started numba / TBB threads can deadlock
+    context = multiprocessing.get_context("spawn")
+    return ProcessPoolExecutor(max_workers=max_workers, mp_context=context)
+
+
+def _map_chunks(
+    func: Callable, chunks: Iterable[list], max_workers: Union[int, None], *args
+) -> Iterator:
+    """func(chunk, *args) of each chunk, in the order they complete
+
+    Notes:
+        With max_workers=1 the chunks are checked in this process. Otherwise
+        at most 2 * max_workers chunks are in flight, so chunks are only
+        taken from the iterable as workers become free, and each result is
+        released once it has been yielded.
+    """
+    if max_workers == 1:
+        for chunk in chunks:
+            yield func(chunk, *args)
+        return
+
+    max_in_flight = 2 * (max_workers or os.cpu_count() or 1)
+    chunks = iter(chunks)
+    with _spawn_pool(max_workers) as executor:
+        pending = set()
+        while True:
+            for chunk in islice(chunks, max_in_flight - len(pending)):
+                pending.add(executor.submit(func, chunk, *args))
+            if not pending:
+                return
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            while done:
+                yield done.pop().result()
+
+
+def _is_sqlite(dstore: DataStoreABC) -> bool:
+    return str(dstore.source).endswith(".sqlitedb")
+
+
+def _open_dstore(
+    dstore: Union[DataStoreABC, str], mode: str, reopen: bool = False
+) -> DataStoreABC:
+    """dstore, or its path, opened with mode
+
+    Args:
+        reopen: open a data store again from its source. A sqlite connection
+            can only be used by the thread that made it, so threads other
+            than the one that opened dstore must reopen it.
+    """
+    if not isinstance(dstore, DataStoreABC):
+        return open_data_store(dstore, suffix="json", mode=mode)
+    if not reopen and (mode != "r" or dstore.mode is Mode.r):
+        return dstore
+    # members are sent to worker processes, which must not reopen the
+    # data store for writing
+    suffix = getattr(dstore, "suffix", None) or "json"
+    return open_data_store(dstore.source, suffix=suffix, mode=mode)
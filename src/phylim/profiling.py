@@ -0,0 +1,88 @@
+import contextlib
+import dataclasses
+import time
+
+from collections.abc import Iterator
+from typing import Union
+
+from cogent3.core.table import Table
+
+from phylim._version import __version__
+
+
+@dataclasses.dataclass(slots=True)
+class StageTiming:
+    name: str
+    seconds: float
+    counts: dict[str, int]
+
+
+@dataclasses.dataclass(slots=True)
+class StageProfile:
+    """wall times and counts of the stages of one phylim check"""
+
+    source: Union[str, None] = None
+    stages: list[StageTiming] = dataclasses.field(default_factory=list)
+
+    @contextlib.contextmanager
+    def stage(self, name: str) -> Iterator[dict[str, int]]:
+        """time the body of a with block, the yielded dict takes its counts"""
+        counts = {}
+        start = time.perf_counter()
+        try:
+            yield counts
+        finally:
+            self.stages.append(StageTiming(name, time.perf_counter() - start, counts))
+
+    def __getitem__(self, name: str) -> StageTiming:
+        for stage in self.stages:
+            if stage.name == name:
+                return stage
+        raise KeyError(name)
+
+    @property
+    def total_seconds(self) -> float:
+        return sum(stage.seconds for stage in self.stages)
+
+    def to_rich_dict(self) -> dict:
+        return {
+            "source": self.source,
+            "stages": [dataclasses.asdict(stage) for stage in self.stages],
+            "version": __version__,
+        }
+
+    @classmethod
+    def from_rich_dict(cls, data: dict) -> "StageProfile":
+        return cls(
+            source=data["source"],
+            stages=[StageTiming(**stage) for stage in data["stages"]],
+        )
+
+    def to_table(self) -> Table:
+        headers = ["stage", "seconds", "counts"]
+        rows = [
+            [
+                stage.name,
+                stage.seconds,
+                ", ".join(f"{k}={v}" for k, v in stage.counts.items()),
+            ]
+            for stage in self.stages
+        ]
+        return Table(header=headers, data=rows, title="Stage Profile")
+
+    def _repr_html_(self) -> str:
+        table = self.to_table()
+        table.set_repr_policy(show_shape=False)
+        return table._repr_html_()
+
+
+class _NoProfile:
+    """stands in for a StageProfile when profiling is off"""
+
+    __slots__ = ()
+
+    def stage(self, name: str) -> contextlib.nullcontext:
+        return contextlib.nullcontext({})
+
+
+NO_PROFILE = _NoProfile()
@@ -0,0 +1,215 @@
+import array
+import functools
+import json
+import os
+import pathlib
+
+from collections.abc import Iterable, Iterator
+from typing import Union
+
+import numpy
+
+from cogent3 import make_tree
+from cogent3.app.result import model_result
+from cogent3.core.tree import PhyloNode
+from cogent3.evolve.parameter_controller import AlignmentLikelihoodFunction
+
+from phylim._version import __version__
+from phylim.apps import InferenceContext, load_context
+from phylim.batch import _StringTable
+from phylim.classify_matrix import ModelPsubs, _edge_name
+
+
+_PSUBS = "psubs.f8"
+_INDEX = "index.npz"
+_DTYPE = numpy.dtype("<f8")
+
+# per model values, and the offsets of the edges and matrix elements of each
+# model, which have one more entry than there are models
+_INDEX_COLUMNS = {
+    "source": "i",
+    "model_name": "i",
+    "tree": "i",
+    "motifs": "i",
+    "edge_offsets": "q",
+    "element_offsets": "q",
+    "edge_names": "i",
+}
+
+# number of distinct trees kept parsed by each PsubArchive
+TREE_CACHE_SIZE = 256
+
+
+class PsubArchiveWriter:
+    """appends the psubs of model fits to an archive directory
+
+    The psubs of all fits are written, as little-endian float64, to one flat
+    file. An index of the source, model name, tree, motifs and edge names of
+    each fit, and where its psubs are in the flat file, is written on close.
+    Strings are interned, so fits on the same tree share its newick.
+    """
+
+    def __init__(self, path: Union[str, os.PathLike], overwrite: bool = False) -> None:
+        self.path = pathlib.Path(path)
+        if self.path.exists() and any(self.path.iterdir()) and not overwrite:
+            raise FileExistsError(f"{self.path} exists, use overwrite=True")
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path / _PSUBS, "wb")
+        self._strings = _StringTable()
+        self._columns = {name: array.array(t) for name, t in _INDEX_COLUMNS.items()}
+        self._columns["edge_offsets"].append(0)
+        self._columns["element_offsets"].append(0)
+
+    def __len__(self) -> int:
+        return len(self._columns["source"])
+
+    def __enter__(self) -> "PsubArchiveWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def add(
+        self,
+        inference: Union[
+            model_result, AlignmentLikelihoodFunction, PhyloNode, InferenceContext
+        ],
+    ) -> None:
+        """write the psubs of a model fit, see load_context"""
+        context = (
+            inference
+            if isinstance(inference, InferenceContext)
+            else load_context(inference, with_params=False)
+        )
+        psubs = context.psubs
+        columns = self._columns
+        motifs = (
+            [str(m) for m in next(iter(psubs.psubs.values())).keys()]
+            if psubs.psubs
+            else []
+        )
+        stacked = psubs.to_array() if psubs.psubs else numpy.empty((0, 0, 0))
+        stacked.astype(_DTYPE, copy=False).tofile(self._file)
+
+        columns["source"].append(self._strings.code(context.source))
+        columns["model_name"].append(self._strings.code(context.model_name or ""))
+        columns["tree"].append(
+            self._strings.code(context.tree.get_newick(with_node_names=True))
+        )
+        columns["motifs"].append(self._strings.code(json.dumps(motifs)))
+        columns["edge_names"].extend(
+            self._strings.code(_edge_name(key)) for key in psubs.psubs
+        )
+        columns["edge_offsets"].append(len(columns["edge_names"]))
+        columns["element_offsets"].append(columns["element_offsets"][-1] + stacked.size)
+
+    def extend(self, inferences: Iterable) -> None:
+        for inference in inferences:
+            self.add(inference)
+
+    def close(self) -> None:
+        """write the index, the archive can then be opened with PsubArchive"""
+        if self._file.closed:
+            return
+        self._file.close()
+        arrays = {
+            name: numpy.frombuffer(column, dtype=column.typecode)
+            for name, column in self._columns.items()
+        }
+        arrays |= self._strings.to_arrays()
+        arrays["version"] = numpy.array(__version__)
+        numpy.savez(self.path / _INDEX, **arrays)
+
+
+def write_psub_archive(
+    path: Union[str, os.PathLike], inferences: Iterable, overwrite: bool = False
+) -> "PsubArchive":
+    """write the psubs of model fits to an archive, and open it"""
+    with PsubArchiveWriter(path, overwrite=overwrite) as writer:
+        writer.extend(inferences)
+    return PsubArchive(path)
+
+
+class PsubArchive:
+    """the psubs of many model fits, memory-mapped from an archive written by
+    PsubArchiveWriter
+
+    Notes:
+        archive[i] is an InferenceContext, without params, which phylim
+        accepts. Its psubs are read-only views of the mapped file, so
+        classify_matrix and calc_delta_col read the file directly. Parsed
+        trees are cached and shared between fits, do not modify them.
+    """
+
+    def __init__(self, path: Union[str, os.PathLike]) -> None:
+        self.path = pathlib.Path(path)
+        with numpy.load(self.path / _INDEX, allow_pickle=False) as data:
+            self._strings = _StringTable.from_arrays(data).values
+            self._columns = {name: data[name] for name in _INDEX_COLUMNS}
+        num_elements = int(self._columns["element_offsets"][-1])
+        self._psubs = (
+            numpy.memmap(self.path / _PSUBS, dtype=_DTYPE, mode="r")
+            if num_elements
+            else numpy.empty(0, dtype=_DTYPE)
+        )
+        self._tree = functools.lru_cache(maxsize=TREE_CACHE_SIZE)(self._parse_tree)
+
+    def __len__(self) -> int:
+        return len(self._columns["source"])
+
+    def __repr__(self) -> str:
+        return f"{self.__class__.__name__}(path={str(self.path)!r}, num_models={len(self)})"
+
+    def _parse_tree(self, code: int) -> PhyloNode:
+        return make_tree(self._strings[code])
+
+    def _string(self, name: str, index: int) -> str:
+        return self._strings[self._columns[name][index]]
+
+    @property
+    def sources(self) -> list[str]:
+        return [self._strings[c] for c in self._columns["source"]]
+
+    def edge_names(self, index: int) -> list[str]:
+        index = range(len(self))[index]
+        offsets = self._columns["edge_offsets"]
+        codes = self._columns["edge_names"][offsets[index] : offsets[index + 1]]
+        return [self._strings[c] for c in codes]
+
+    def stacked(self, index: int) -> numpy.ndarray:
+        """the (n, k, k) psubs of the model at index, a view of the file"""
+        index = range(len(self))[index]
+        offsets = self._columns["element_offsets"]
+        flat = self._psubs[offsets[index] : offsets[index + 1]]
+        num_edges = len(self.edge_names(index))
+        if not num_edges:
+            return numpy.empty((0, 0, 0), dtype=_DTYPE)
+        dim = round((flat.size // num_edges) ** 0.5)
+        return flat.reshape(num_edges, dim, dim)
+
+    def psubs(self, index: int) -> ModelPsubs:
+        motifs = json.loads(self._string("motifs", index))
+        return ModelPsubs.from_array(
+            self._string("source", index),
+            # keyed by edge name, as lf.get_all_psubs()
+            self.edge_names(index),
+            self.stacked(index),
+            motifs=motifs or None,
+        )
+
+    def tree(self, index: int) -> PhyloNode:
+        return self._tree(int(self._columns["tree"][index]))
+
+    def __getitem__(self, index: int) -> InferenceContext:
+        index = range(len(self))[index]
+        return InferenceContext(
+            source=self._string("source", index),
+            model_name=self._string("model_name", index) or None,
+            tree=self.tree(index),
+            psubs=self.psubs(index),
+            params=None,
+        )
+
+    def __iter__(self) -> Iterator[InferenceContext]:
+        for index in range(len(self)):
+            yield self[index]
@@ -0,0 +1,58 @@
+import numpy
+
+from cogent3.maths.matrix_exponentiation import PadeExponentiator
+from numpy import ndarray
+
+
+def _eigen(q_matrix: ndarray, mprobs: ndarray | None) -> tuple | None:
+    """the eigenvalues and the left and right factors of q_matrix, or None if
+    the decomposition is not accurate enough"""
+    if mprobs is not None and (mprobs > 0).all():
+        # Q of a reversible process is similar to a symmetric matrix
+        root = numpy.sqrt(mprobs)
+        sym = q_matrix * numpy.divide.outer(root, root)
+        roots, vecs = numpy.linalg.eigh((sym + sym.T) / 2)
+        return roots, vecs / root[:, numpy.newaxis], vecs.T * root
+
+    roots, vecs = numpy.linalg.eig(q_matrix)
+    try:
+        inverse = numpy.linalg.inv(vecs)
+    except numpy.linalg.LinAlgError:
+        return None
+    if not numpy.allclose((vecs * roots) @ inverse, q_matrix):
+        return None
+    return roots, vecs, inverse
+
+
+def expm_lengths(
+    q_matrix: ndarray, lengths: ndarray, mprobs: ndarray | None = None
+) -> ndarray:
+    """psubs exp(Q * t) of every branch length t, from one eigendecomposition
+
+    Args:
+        q_matrix: (k, k) rate matrix
+        lengths: (n,) branch lengths
+        mprobs: the stationary distribution when Q is reversible, used for a
+            more accurate symmetric eigendecomposition
+    Returns
+    -------
+    (n, k, k) array
+    Notes:
+        Like cogent3, falls back to a Pade approximation of each psub when
+        the eigendecomposition of Q fails a precision test, and clips
+        negative elements to 0.
+    """
+    lengths = numpy.asarray(lengths, dtype=float)
+    if not lengths.size:
+        return numpy.empty((0, *q_matrix.shape))
+    eigen = _eigen(q_matrix, mprobs)
+    if eigen is None:
+        expm = PadeExponentiator(q_matrix)
+        result = numpy.stack([expm(t) for t in lengths])
+    else:
+        roots, left, right = eigen
+        exp_roots = numpy.exp(lengths[:, numpy.newaxis] * roots)
+        result = (left * exp_roots[:, numpy.newaxis, :]) @ right
+        if result.dtype.kind == "c":
+            result = numpy.ascontiguousarray(result.real)
+    return numpy.maximum(result, 0.0, out=result)
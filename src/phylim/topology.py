@@ -0,0 +1,163 @@
+import dataclasses
+import functools
+
+import numpy
+
+from cogent3.core.tree import PhyloNode
+
+
+# number of distinct topologies whose TreeIndex is kept
+INDEX_CACHE_SIZE = 256
+
+
+@dataclasses.dataclass(slots=True, frozen=True, eq=False)
+class TreeIndex:
+    """integer node ids for a tree topology
+
+    Nodes are numbered in preorder, so the root is 0 and a parent id is
+    always smaller than the ids of its children. Iterating the ids in
+    reverse therefore visits every child before its parent.
+
+    Notes:
+        Indexes are shared between trees with the same topology, so the
+        arrays are read-only.
+    """
+
+    names: tuple[str, ...]
+    parents: numpy.ndarray  # parent id of each node, -1 for the root
+    is_tip: numpy.ndarray  # boolean tip mask
+    ids: dict[str, int]
+    # the children of node i are children[child_offsets[i]:child_offsets[i + 1]]
+    child_offsets: numpy.ndarray
+    children: numpy.ndarray
+    depth: numpy.ndarray  # number of edges between each node and the root
+    # the non-root nodes grouped by depth, shallowest first, see _levels
+    levels: tuple[tuple[numpy.ndarray, ...], ...]
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def tip_names(self) -> list[str]:
+        return [n for n, tip in zip(self.names, self.is_tip) if tip]
+
+    def node_ids(self, names) -> numpy.ndarray:
+        """the ids of the nodes called names"""
+        ids = self.ids
+        return numpy.array([ids[name] for name in names], dtype=numpy.int64)
+
+    def mask(self, names) -> numpy.ndarray:
+        """boolean array that is True for the nodes called names"""
+        result = numpy.zeros(len(self.names), dtype=bool)
+        result[self.node_ids(names)] = True
+        return result
+
+
+def _read_only(array: numpy.ndarray) -> numpy.ndarray:
+    array.flags.writeable = False
+    return array
+
+
+def _levels(
+    parents: numpy.ndarray, depth: numpy.ndarray
+) -> tuple[tuple[numpy.ndarray, ...], ...]:
+    """the non-root nodes grouped by depth, shallowest first
+
+    Each level holds the node ids, their parent ids, the offsets of each run
+    of siblings and the parent of each run. Within a level sorted by id,
+    siblings are adjacent because preorder places only deeper nodes between
+    them.
+    """
+    order = numpy.argsort(depth, kind="stable")
+    bounds = numpy.flatnonzero(numpy.diff(depth[order])) + 1
+    levels = []
+    for nodes in numpy.split(order, bounds)[1:]:
+        level_parents = parents[nodes]
+        starts = numpy.flatnonzero(numpy.diff(level_parents, prepend=-1))
+        levels.append(
+            tuple(
+                _read_only(a)
+                for a in (nodes, level_parents, starts, level_parents[starts])
+            )
+        )
+    return tuple(levels)
+
+
+def topology_key(tree: PhyloNode) -> tuple[tuple[str, ...], tuple[int, ...]]:
+    """the node names and numbers of children in preorder, which identify a
+    topology with named nodes"""
+    names = []
+    num_children = []
+    stack = [tree]
+    while stack:
+        node = stack.pop()
+        names.append(node.name)
+        children = node.children
+        num_children.append(len(children))
+        stack.extend(reversed(children))
+    return tuple(names), tuple(num_children)
+
+
+@functools.lru_cache(maxsize=INDEX_CACHE_SIZE)
+def _index_from_key(names: tuple[str, ...], num_children: tuple[int, ...]) -> TreeIndex:
+    ids = {name: i for i, name in enumerate(names)}
+    if len(ids) != len(names):
+        raise ValueError("tree node names must be unique")
+
+    num = len(names)
+    parents = [-1] * num
+    depth = [0] * num
+    # nodes still expecting children, the last one is the parent of the next
+    open_nodes = []
+    remaining = []
+    for node, count in enumerate(num_children):
+        if open_nodes:
+            parent = open_nodes[-1]
+            parents[node] = parent
+            depth[node] = depth[parent] + 1
+            remaining[-1] -= 1
+            if not remaining[-1]:
+                open_nodes.pop()
+                remaining.pop()
+        if count:
+            open_nodes.append(node)
+            remaining.append(count)
+
+    parents = numpy.array(parents, dtype=numpy.int64)
+    depth = numpy.array(depth, dtype=numpy.int64)
+    child_offsets = numpy.zeros(num + 1, dtype=numpy.int64)
+    numpy.cumsum(num_children, out=child_offsets[1:])
+    # children in preorder are sorted by parent, as a stable sort of ids
+    children = numpy.argsort(parents[1:], kind="stable") + 1
+    return TreeIndex(
+        names=names,
+        parents=_read_only(parents),
+        is_tip=_read_only(numpy.array(num_children) == 0),
+        ids=ids,
+        child_offsets=_read_only(child_offsets),
+        children=_read_only(children),
+        depth=_read_only(depth),
+        levels=_levels(parents, depth),
+    )
+
+
+def make_tree_index(tree: PhyloNode) -> TreeIndex:
+    """the TreeIndex for a tree, node names must be unique
+
+    Notes:
+        Indexes are cached by topology_key, so trees with the same topology
+        and node names share one index. The cache keeps the
+        INDEX_CACHE_SIZE most recently used topologies, see
+        tree_index_cache_info. The tree is walked on every call, so a
+        renamed or restructured tree gets the index of its new topology.
+    """
+    return _index_from_key(*topology_key(tree))
+
+
+def tree_index_cache_info() -> functools._CacheInfo:
+    """hits, misses, maxsize and currsize of the TreeIndex cache"""
+    return _index_from_key.cache_info()
+
+
+def clear_tree_index_cache() -> None:
+    _index_from_key.cache_clear()
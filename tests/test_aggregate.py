@@ -0,0 +1,142 @@
+import json
+import pathlib
+import pickle
+
+import numpy
+import pytest
+
+from cogent3.app.composable import NotCompleted
+from cogent3.util.deserialise import deserialise_object
+
+from phylim.aggregate import PhyloLimitSummary, QuantileSketch, phylim_aggregate
+from phylim.apps import phylim
+
+
+DATADIR = pathlib.Path(__file__).parent / "data"
+
+_model_res = deserialise_object(
+    f"{DATADIR}/eval_identifiability/unid_model_result.json"
+)
+
+
+@pytest.fixture(scope="module")
+def record():
+    return phylim()(_model_res)
+
+
+@pytest.mark.parametrize("q", [0.001, 0.05, 0.3, 0.5, 0.9, 0.999])
+def test_quantile_sketch(q):
+    rng = numpy.random.default_rng(0)
+    values = numpy.concatenate(
+        [rng.uniform(-0.5, 1, 10_000), rng.exponential(1e-6, 500)]
+    )
+    sketch = QuantileSketch(relative_accuracy=0.01)
+    sketch.update(values)
+    assert sketch.count == len(values)
+    # within the relative accuracy of the data value at that rank
+    expect = numpy.sort(values)[int(q * (len(values) - 1))]
+    assert abs(sketch.quantile(q) - expect) <= 0.01 * abs(expect)
+
+
+def test_quantile_sketch_merge():
+    rng = numpy.random.default_rng(1)
+    values = rng.uniform(-1, 1, 1000)
+    whole = QuantileSketch()
+    whole.update(values)
+    first, second = QuantileSketch(), QuantileSketch()
+    first.update(values[:300])
+    second.update(values[300:])
+    first.merge(second)
+    assert first == whole
+    assert first.quantiles([0, 0.5, 1]) == whole.quantiles([0, 0.5, 1])
+    assert first.quantile(0) == values.min()
+    assert first.quantile(1) == values.max()
+    with pytest.raises(ValueError):
+        first.merge(QuantileSketch(relative_accuracy=0.05))
+
+
+def test_quantile_sketch_bounded():
+    sketch = QuantileSketch()
+    size = sketch.positive.nbytes
+    sketch.update(numpy.linspace(-1, 1, 100_001))
+    sketch.update([0.0, 1e-20, numpy.nan])
+    assert sketch.positive.nbytes == size
+    assert sketch.count == 100_003
+    assert sketch.quantile(0.5) == 0.0
+
+
+def test_quantile_sketch_empty():
+    sketch = QuantileSketch()
+    assert numpy.isnan(sketch.quantile(0.5))
+    assert QuantileSketch.from_rich_dict(sketch.to_rich_dict()) == sketch
+    with pytest.raises(ValueError):
+        sketch.quantile(1.5)
+    with pytest.raises(ValueError):
+        QuantileSketch(relative_accuracy=0)
+
+
+def test_quantile_sketch_rich_dict():
+    sketch = QuantileSketch()
+    sketch.update([-0.2, 0.0, 0.3, 0.3, 0.9])
+    data = json.loads(json.dumps(sketch.to_rich_dict()))
+    got = QuantileSketch.from_rich_dict(data)
+    assert got == sketch
+    assert got.quantiles([0, 0.5, 1]) == sketch.quantiles([0, 0.5, 1])
+
+
+def test_summary_add(record):
+    summary = PhyloLimitSummary()
+    summary.add(record)
+    summary.add(record.to_rich_dict())
+    summary.add(phylim(verdict_only=True)(_model_res))
+    summary.add(NotCompleted("ERROR", "test", "failed", source="foo"))
+    assert summary.num_records == 3
+    assert summary.num_not_completed == 1
+    assert summary.fraction_identifiable == 1.0
+    assert summary.num_with_boundary == 2
+    assert summary.boundary_params == {"A/G": 2}
+    assert summary.violation_types == {"none": 3}
+    num_edges = len(record.delta_col)
+    assert summary.delta_col.count == 2 * num_edges
+    assert sum(summary.categories.values()) == 2 * num_edges
+    assert summary.categories["identity"] == 2 * sum(
+        m.name == "identity" for m in record.nondlc_and_identity.values()
+    )
+    assert summary.delta_col.quantile(0) == min(record.delta_col.values())
+
+
+def test_summary_merge(record):
+    records = [record, phylim(strict=True)(_model_res), record]
+    whole = PhyloLimitSummary()
+    for rec in records:
+        whole.add(rec)
+    first, second = PhyloLimitSummary(), PhyloLimitSummary()
+    first.add(records[0])
+    for rec in records[1:]:
+        second.add(rec)
+    merged = first + second
+    assert merged == whole
+    assert first.num_records == 1
+    assert merged.violation_types == {"none": 2, "bad_matrices": 1}
+    first.merge(second)
+    assert first == whole
+
+
+def test_summary_rich_dict(record):
+    summary = PhyloLimitSummary()
+    summary.add(record)
+    data = json.loads(json.dumps(summary.to_rich_dict()))
+    assert deserialise_object(data) == summary
+    assert pickle.loads(pickle.dumps(summary)) == summary
+    assert summary.to_table().shape[1] == 2
+
+
+def test_phylim_aggregate(record):
+    app = phylim_aggregate()
+    assert app(record) is record
+    failed = NotCompleted("ERROR", "test", "failed", source="foo")
+    assert app(failed) is failed
+    assert app.summary.num_records == 1
+    assert app.summary.num_not_completed == 1
+    composed = phylim() + phylim_aggregate()
+    assert composed(_model_res) == record
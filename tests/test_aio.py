@@ -0,0 +1,157 @@
+import asyncio
+import pathlib
+
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from cogent3.app.io import load_json, open_data_store, write_db, write_json
+from cogent3.app.result import model_result
+from cogent3.util.deserialise import deserialise_object
+
+from phylim.aio import iter_phylim_async, phylim_async
+from phylim.apps import BatchSummary, PhyloLimitRec, phylim
+
+DATADIR = pathlib.Path(__file__).parent / "data"
+
+_model_res = deserialise_object(
+    f"{DATADIR}/eval_identifiability/unid_model_result.json"
+)
+
+
+@pytest.fixture(params=["json", "sqlitedb"])
+def model_dstore(request, tmp_path):
+    if request.param == "json":
+        dstore = open_data_store(tmp_path / "fits", suffix="json", mode="w")
+        writer = write_json(dstore)
+    else:
+        dstore = open_data_store(tmp_path / "fits.sqlitedb", mode="w")
+        writer = write_db(dstore)
+    for i in range(5):
+        writer.main(_model_res, identifier=f"fit-{i}")
+    return dstore
+
+
+async def _collect(source, **kwargs) -> dict:
+    results = {}
+    async for chunk in iter_phylim_async(source, **kwargs):
+        results.update(chunk)
+    return results
+
+
+@pytest.mark.parametrize("max_in_flight", [1, 3])
+def test_iter_phylim_async(model_dstore, max_in_flight):
+    expect = phylim()(_model_res)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        results = asyncio.run(
+            _collect(
+                model_dstore,
+                executor=executor,
+                max_in_flight=max_in_flight,
+                chunksize=2,
+            )
+        )
+    assert set(results) == {f"fit-{i}" for i in range(5)}
+    for record in results.values():
+        assert isinstance(record, PhyloLimitRec)
+        assert record.check == expect.check
+        # psubs of stored fits are computed from their rich dicts
+        assert record.delta_col == pytest.approx(expect.delta_col)
+
+
+def test_iter_phylim_async_skip(model_dstore):
+    counts = {}
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        results = asyncio.run(
+            _collect(
+                model_dstore, executor=executor, skip={"fit-0", "fit-3"}, counts=counts
+            )
+        )
+    assert set(results) == {"fit-1", "fit-2", "fit-4"}
+    assert counts == {"num_todo": 3, "num_skipped": 2}
+
+
+def test_iter_phylim_async_in_flight(model_dstore):
+    # the consumer is slow, so at most max_in_flight chunks are ever started
+    # ahead of it
+    started = []
+
+    class _Executor(ThreadPoolExecutor):
+        def submit(self, fn, *args, **kwargs):
+            started.append(len(args[0]))
+            return super().submit(fn, *args, **kwargs)
+
+    async def consume():
+        seen = 0
+        async for chunk in iter_phylim_async(
+            model_dstore, executor=executor, max_in_flight=2, chunksize=1
+        ):
+            seen += len(chunk)
+            assert len(started) <= seen + 2
+            await asyncio.sleep(0.01)
+        return seen
+
+    with _Executor(max_workers=1) as executor:
+        assert asyncio.run(consume()) == 5
+
+
+def test_iter_phylim_async_chunksize(model_dstore):
+    with pytest.raises(ValueError):
+        asyncio.run(_collect(model_dstore, chunksize=0))
+
+
+@pytest.mark.parametrize("out_name", ["checked.sqlitedb", "checked"])
+def test_phylim_async(model_dstore, tmp_path, out_name):
+    out_path = tmp_path / out_name
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        summary = asyncio.run(
+            phylim_async(model_dstore, str(out_path), executor=executor, chunksize=2)
+        )
+        assert isinstance(summary, BatchSummary)
+        assert summary.num_completed == 5
+        assert summary.num_not_completed == 0
+        out = open_data_store(out_path, suffix="json")
+        assert {m.unique_id.split(".")[0] for m in out.completed} == {
+            f"fit-{i}" for i in range(5)
+        }
+        # a second run skips everything already done
+        summary = asyncio.run(
+            phylim_async(model_dstore, str(out_path), executor=executor)
+        )
+    assert summary.num_skipped == 5
+    assert summary.num_completed == 0
+
+
+@pytest.mark.parametrize("strict", [False, True])
+def test_phylim_async_filter(model_dstore, tmp_path, strict):
+    out = open_data_store(tmp_path / "kept", suffix="json", mode="w")
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        summary = asyncio.run(
+            phylim_async(
+                model_dstore, out, strict=strict, as_filter=True, executor=executor
+            )
+        )
+    # the identity matrices only make the model non-identifiable when strict
+    if strict:
+        assert summary.num_not_completed == len(out.not_completed) == 5
+    else:
+        assert summary.num_completed == len(out.completed) == 5
+        assert isinstance(load_json()(out.completed[0]), model_result)
+
+
+def test_phylim_async_not_completed(tmp_path):
+    dstore = open_data_store(tmp_path / "fits", suffix="json", mode="w")
+    dstore.write(unique_id="bad.json", data="{}")
+    with ThreadPoolExecutor(max_workers=1) as executor:
+        summary = asyncio.run(
+            phylim_async(dstore, str(tmp_path / "checked"), executor=executor)
+        )
+    assert summary.num_not_completed == 1
+    assert summary.num_completed == 0
+
+
+def test_phylim_async_process_pool(model_dstore, tmp_path):
+    out = open_data_store(tmp_path / "checked", suffix="json", mode="w")
+    summary = asyncio.run(phylim_async(model_dstore, out, max_workers=2, chunksize=2))
+    assert summary.num_completed == 5
+    assert len(out.completed) == 5
@@ -1,27 +1,62 @@
+import json
 import pathlib
+import pickle
 import sys
 
 import pytest
-from cogent3 import get_app, load_aligned_seqs
+from cogent3 import get_app, get_model, load_aligned_seqs, make_tree
 from cogent3.app.composable import NotCompleted
+from cogent3.app.io import (
+    compress,
+    decompress,
+    open_data_store,
+    pickle_it,
+    to_primitive,
+    unpickle_it,
+    write_db,
+    write_json,
+)
 from cogent3.app.result import model_result
+from cogent3.evolve.parameter_controller import AlignmentLikelihoodFunction
 from cogent3.core.table import Table
 from cogent3.util.deserialise import deserialise_object
-from numpy import allclose
+from numpy import allclose, array_equal
 
 from phylim.apps import (
+    BatchSummary,
+    InferenceContext,
     PhyloLimitRec,
     _get_lf,
+    check_fit_boundaries,
     check_fit_boundary,
     classify_model_psubs,
+    load_context,
+    load_param_arrays,
     load_param_values,
     load_psubs,
+    load_rich_dict,
+    load_rich_dict_context,
+    load_tree_context,
     phylim,
+    phylim_batch,
     phylim_filter,
     phylim_to_model_result,
 )
-from phylim.check_boundary import BoundsViolation, ParamRules
-from phylim.classify_matrix import ModelMatrixCategories, ModelPsubs
+from phylim.check_boundary import (
+    EXCLUDE_PARS,
+    BoundaryTolerance,
+    BoundsViolation,
+    ParamArrays,
+    ParamRules,
+    check_boundary,
+)
+from phylim.classify_matrix import (
+    LIMIT,
+    RICH_DICT_FORMAT,
+    ModelMatrixCategories,
+    ModelPsubs,
+)
+from phylim.eval_identifiability import CheckMode
 
 DATADIR = pathlib.Path(__file__).parent / "data"
 
@@ -63,6 +98,36 @@ def test_load_psubs():
     assert isinstance(result, ModelPsubs)
 
 
+def test_load_context():
+    result = load_context(_model_res)
+    assert isinstance(result, InferenceContext)
+    assert isinstance(result.psubs, ModelPsubs)
+    assert isinstance(result.params, ParamArrays)
+    assert result.tree is _model_res.lf.tree
+    assert result.model_name == _model_res.name
+
+
+def test_phylim_extracts_once(monkeypatch):
+    lf = _model_res.lf
+    calls = {"get_all_psubs": 0, "get_param_rules": 0}
+
+    def counted(name):
+        func = getattr(lf, name)
+
+        def wrapped(*args, **kwargs):
+            calls[name] += 1
+            return func(*args, **kwargs)
+
+        return wrapped
+
+    for name in calls:
+        monkeypatch.setattr(lf, name, counted(name))
+
+    phylim()(lf)
+    # param values are read from their settings, without the param rules
+    assert calls == {"get_all_psubs": 1, "get_param_rules": 0}
+
+
 def test_generate_record():
     # two I
     rec_app = phylim()  # default `strict` == F
@@ -100,6 +165,103 @@ def test_to_rich_dict_phylolimitrec():
     )
 
 
+@pytest.mark.parametrize("strict", [False, True])
+def test_phylim_verdict_only(strict):
+    full = phylim(strict=strict)(_model_res)
+    record = phylim(strict=strict, verdict_only=True)(_model_res)
+    assert isinstance(record, PhyloLimitRec)
+    assert record.is_identifiable == full.is_identifiable
+    assert record.boundary_values is None
+    assert record.nondlc_and_identity is None
+    assert record.delta_col is None
+    assert isinstance(record.to_rich_dict(), dict)
+
+
+def test_phylim_profile():
+    assert phylim()(_model_res).profile is None
+
+    record = phylim(profile=True)(_model_res)
+    stages = [s.name for s in record.profile.stages]
+    assert stages == ["extract", "boundary", "classify", "identifiability", "delta_col"]
+    assert record.profile.source == record.check.source
+    assert record.profile["classify"].counts["edges_classified"] == 7
+    assert record.profile["identifiability"].counts["paths_broken"] == 4
+    assert "profile" in record.to_rich_dict()
+
+
+@pytest.mark.parametrize("app", [phylim, phylim_filter], ids=["phylim", "filter"])
+def test_on_profile(app):
+    profiles = []
+    kwargs = {"verdict_only": True} if app is phylim else {}
+    result = app(on_profile=profiles.append, **kwargs)(_model_res)
+    assert len(profiles) == 1
+    assert [s.name for s in profiles[0].stages] == ["extract", "verdict"]
+    assert profiles[0]["verdict"].counts["edges_classified"] == 7
+    assert getattr(result, "profile", None) is None
+
+
+@pytest.mark.parametrize(
+    "app",
+    [phylim(), phylim(strict=True), phylim(verdict_only=True), phylim(profile=True)],
+)
+def test_deserialise_phylolimitrec(app):
+    record = app(_model_res)
+    got = deserialise_object(json.dumps(record.to_rich_dict()))
+    assert isinstance(got, PhyloLimitRec)
+    assert got.to_rich_dict() == record.to_rich_dict()
+    assert got.check == record.check
+    assert got.delta_col == record.delta_col
+    if record.profile is not None:
+        assert got.profile == record.profile
+
+
+def test_deserialise_phylolimitrec_legacy():
+    # the rich dict before edge categories and delta_col were encoded, which
+    # has no format
+    data = {
+        "type": "phylim.apps.PhyloLimitRec",
+        "source": "foo",
+        "strict": False,
+        "names": ["edge.0"],
+        "violation_type": "bad_matrices",
+        "model_name": "GTR",
+        "boundary_values": [],
+        "nondlc_and_identity": {"edge.0": "limit"},
+        "delta_col": {"edge.0": -0.5, "edge.1": 0.25},
+        "version": "2025.1.12",
+    }
+    got = deserialise_object(data)
+    assert got.check.names == {"edge.0"}
+    assert got.violation_type == "bad_matrices"
+    assert got.nondlc_and_identity == {"edge.0": LIMIT}
+    assert got.delta_col == {"edge.0": -0.5, "edge.1": 0.25}
+    assert got.boundary_values == []
+    assert got.to_rich_dict()["format"] == RICH_DICT_FORMAT
+    # as written by the first releases, without a type
+    del data["type"]
+    data["delta_col"] = {"edges": 0.5, "values": 0.25}
+    data["nondlc_and_identity"] = {}
+    got = PhyloLimitRec.from_rich_dict(data)
+    assert got.delta_col == {"edges": 0.5, "values": 0.25}
+    assert got.nondlc_and_identity == {}
+
+
+def test_phylolimitrec_newer_format():
+    data = phylim()(_model_res).to_rich_dict()
+    data["format"] = RICH_DICT_FORMAT + 1
+    with pytest.raises(ValueError):
+        PhyloLimitRec.from_rich_dict(data)
+
+
+def test_phylolimitrec_data_store(tmp_path):
+    record = phylim()(_model_res)
+    dstore = open_data_store(tmp_path / "records.sqlitedb", mode="w")
+    write_db(dstore).main(record, identifier="foo")
+    got = get_app("load_db")(dstore.completed[0])
+    assert isinstance(got, PhyloLimitRec)
+    assert got.to_rich_dict() == record.to_rich_dict()
+
+
 def test_violation_type_phylolimitrec():
     rec_app = phylim()
     record = rec_app(_model_res)
@@ -132,10 +294,171 @@ def test_classify_model_psubs():
     assert isinstance(res, ModelMatrixCategories)
 
 
+@pytest.mark.parametrize("float32", [False, True])
+def test_classify_model_psubs_float32(float32):
+    expect = classify_model_psubs()(_model_res)
+    got = classify_model_psubs(float32=float32)(_model_res)
+    assert got.mcats == expect.mcats
+
+
+@pytest.mark.parametrize(
+    "app", [classify_model_psubs, phylim, phylim_filter], ids=lambda a: a.__name__
+)
+def test_negative_tolerance(app):
+    with pytest.raises(ValueError):
+        app(atol=-1e-8)
+
+
+def test_phylim_tolerances():
+    # with tolerances this large every matrix is an identity matrix
+    default = phylim(strict=True)(_model_res)
+    record = phylim(strict=True, atol=1.0)(_model_res)
+    assert not record.is_identifiable
+    assert len(record.check.names) > len(default.check.names)
+    assert set(record.check.names) == set(record.nondlc_and_identity)
+
+
+@pytest.mark.parametrize("verdict_only", [False, True])
+def test_phylim_float32(verdict_only):
+    expect = phylim(verdict_only=verdict_only)(_model_res)
+    record = phylim(verdict_only=verdict_only, float32=True)(_model_res)
+    assert record.check == expect.check
+    assert record.delta_col == expect.delta_col
+
+
+@pytest.mark.parametrize("verdict_only", [False, True])
+def test_phylim_cache(verdict_only):
+    expect = phylim(verdict_only=verdict_only)(_model_res)
+    app = phylim(verdict_only=verdict_only, cache_size=100)
+    assert app(_model_res) == expect
+    misses = app.cache.stats.misses
+    assert misses and not app.cache.stats.hits
+    assert app(_model_res) == expect
+    assert app.cache.stats.hits == misses
+    assert app.cache.stats.misses == misses
+    assert phylim().cache is None
+
+
+def test_phylim_lazy():
+    expect = phylim()(_model_res)
+    profile = []
+    record = phylim(lazy=True, on_profile=profile.append)(_model_res)
+    assert [s.name for s in profile[0].stages] == [
+        "extract",
+        "classify",
+        "identifiability",
+    ]
+    assert record.is_identifiable == expect.is_identifiable
+    assert record.pending == ["boundary_values", "nondlc_and_identity", "delta_col"]
+    assert record.delta_col == expect.delta_col
+    assert record.pending == ["boundary_values", "nondlc_and_identity"]
+    assert record.materialize() is record
+    assert record.pending == []
+    assert record == expect
+    assert record.to_rich_dict() == expect.to_rich_dict()
+
+
+def test_phylim_modes():
+    loose = CheckMode(strict=True, atol=1.0)
+    profile = []
+    record = phylim(
+        modes=[False, True, loose],
+        on_profile=profile.append,
+    )(_model_res)
+    expect = {
+        mode: phylim(strict=mode.strict, atol=mode.atol)(_model_res).check
+        for mode in (CheckMode(False), CheckMode(True), loose)
+    }
+    assert record.checks == expect
+    assert record.check == expect[CheckMode(False)]
+    # the classify stage made the default classification, only the loose
+    # tolerances need another
+    assert profile[0]["identifiability"].counts["classifications"] == 1
+    assert record.delta_col is not None
+    got = deserialise_object(json.loads(json.dumps(record.to_rich_dict())))
+    assert got.checks == record.checks
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [{"modes": [True]}, {"lazy": True}, {"bound_tolerance": BoundaryTolerance()}],
+)
+def test_phylim_verdict_only_invalid(kwargs):
+    with pytest.raises(ValueError, match="verdict_only cannot be combined"):
+        phylim(verdict_only=True, **kwargs)
+    # the defaults, and profiling, are accepted
+    phylim(verdict_only=True, modes=[], profile=True)
+
+
+def test_phylim_modes_lazy():
+    record = phylim(lazy=True, modes=[True])(_model_res)
+    assert not record.checks[CheckMode(True)].is_identifiable
+    assert record.materialize() == phylim(modes=[True])(_model_res)
+    assert phylim()(_model_res).checks is None
+
+
+def test_phylim_lazy_pickle():
+    record = phylim(lazy=True)(_model_res)
+    got = pickle.loads(pickle.dumps(record))
+    assert got == phylim()(_model_res)
+    assert got.pending == []
+    with pytest.raises(AttributeError):
+        record.not_a_field
+
+
 def test_check_fit_boundary():
     check_app = check_fit_boundary()
     res = check_app(_model_res)
     assert isinstance(res, BoundsViolation)
+    assert res.vio == check_boundary(load_param_values(_model_res.lf)).vio
+    assert [v["par_name"] for v in res.vio] == ["A/G"]
+    excluded = check_fit_boundary(BoundaryTolerance(exclude={"A/G", "length"}))
+    assert excluded(_model_res).vio == []
+
+
+def test_load_param_arrays():
+    lf = _model_res.lf
+    params = load_param_arrays(lf)
+    rules = [r for r in lf.get_param_rules() if r["par_name"] not in EXCLUDE_PARS]
+    assert [params.rule(i) for i in range(len(params))] == rules
+    assert params.values.tolist() == [r["init"] for r in rules]
+    lengths = load_param_arrays(lf, exclude=["mprobs"])
+    assert set(lengths.par_names) - set(params.par_names) == {"length"}
+    # the rules are made when read, and pickle as a list
+    restored = pickle.loads(pickle.dumps(params))
+    assert list(restored.rules) == rules
+    assert array_equal(restored.values, params.values)
+
+
+def test_load_param_arrays_unchecked():
+    lf = get_model(
+        "HKY85", ordered_param="rate", distribution="gamma"
+    ).make_likelihood_function(make_tree(tip_names=_algn.names), bins=2)
+    lf.set_alignment(_algn)
+    with pytest.warns(UserWarning, match=r"\['bprobs'\] are not checked"):
+        params = load_param_arrays(lf)
+    # the derived rate of each bin is not a free param
+    rules = [
+        r
+        for r in lf.get_param_rules()
+        if r["par_name"] not in {*EXCLUDE_PARS, "bprobs"}
+    ]
+    assert list(params.rules) == rules
+
+
+def test_check_fit_boundaries():
+    tree = _load_piqtree("gtr_tree", "GTR")
+    summary = check_fit_boundaries([_model_res, _model_res.lf, tree])
+    assert summary.has_violation.tolist() == [True, True, False]
+    assert summary[0] == check_fit_boundary()(_model_res)
+    assert summary.to_table().columns["par_name"].tolist() == ["A/G", "A/G"]
+
+
+def test_phylim_bound_tolerance():
+    tolerance = BoundaryTolerance(exclude={"A/G", "length", "mprobs"})
+    record = phylim(bound_tolerance=tolerance)(_model_res)
+    assert record.boundary_values == []
+    assert not phylim(bound_tolerance=tolerance, lazy=True)(_model_res).has_BV
 
 
 @pytest.mark.xfail(reason="need new version of piqtree")
@@ -163,6 +486,164 @@ def test_piqtree_app():
     assert isinstance(checked, PhyloLimitRec)
 
 
+def _load_piqtree(name, model_name):
+    data = json.loads((DATADIR / "piqtree" / f"{name}.json").read_text())
+    # some trees are stored as a json string
+    tree = deserialise_object(json.loads(data) if isinstance(data, str) else data)
+    tree.params["model"] = model_name
+    tree.source = f"{name}.fa"
+    return tree
+
+
+@pytest.mark.parametrize(
+    "name,model_name",
+    [("gtr_tree", "GTR"), ("hky_tree", "HKY"), ("unrest_tree", "UNREST")],
+)
+def test_load_tree_context(name, model_name):
+    tree = _load_piqtree(name, model_name)
+    lf = phylim_to_model_result()(tree).lf
+    context = load_tree_context(tree)
+    assert context.model_name == model_name
+    assert context.source == f"{name}.fa"
+    expect = lf.get_all_psubs()
+    # keyed by edge name, as the likelihood function
+    assert list(context.psubs.psubs) == list(expect)
+    for edge, psub in context.psubs.items():
+        assert allclose(psub.array, expect[edge].array, rtol=0, atol=1e-12)
+        assert psub.keys() == expect[edge].keys()
+    rates = {p["par_name"]: p for p in lf.get_param_rules() if "init" in p}
+    params = context.params
+    for i, name in enumerate(params.par_names):
+        assert params.rule(i) == {k: rates[name][k] for k in params.rule(i)}
+        assert params.values[i] == rates[name]["init"]
+    assert load_tree_context(tree, with_params=False).params is None
+
+
+@pytest.mark.parametrize("verdict_only", [False, True])
+def test_phylim_tree(verdict_only):
+    tree = _load_piqtree("unrest_tree", "UNREST")
+    app = phylim(verdict_only=verdict_only)
+    record = app(tree)
+    assert isinstance(record, PhyloLimitRec)
+    expect = app(phylim_to_model_result()(tree))
+    assert record.check.violation_type == expect.check.violation_type
+    assert record.check.names == expect.check.names
+    assert record.boundary_values == expect.boundary_values
+    assert (record.delta_col is None) == verdict_only
+    if not verdict_only:
+        assert record.nondlc_and_identity == expect.nondlc_and_identity
+        assert list(record.delta_col) == list(expect.delta_col)
+
+
+def _rich_dict(result) -> dict:
+    return json.loads(json.dumps(result.to_rich_dict()))
+
+
+def _assert_same_record(got: PhyloLimitRec, expect: PhyloLimitRec) -> None:
+    assert got.check == expect.check
+    assert got.model_name == expect.model_name
+    assert got.boundary_values == expect.boundary_values
+    assert got.nondlc_and_identity == expect.nondlc_and_identity
+    assert got.delta_col == pytest.approx(expect.delta_col)
+
+
+def _gn_fit() -> model_result:
+    """a GN fit with rate params on each edge, a bound hit on one"""
+    tree = make_tree(tip_names=_algn.names)
+    lf = get_model("GN").make_likelihood_function(tree)
+    lf.set_alignment(_algn)
+    for i, edge in enumerate(tree.get_node_names(include_self=False)):
+        lf.set_param_rule("A>C", edge=edge, init=1e-6 if i == 0 else 1.0 + i)
+        lf.set_param_rule("length", edge=edge, init=0.1 * (i + 1))
+    result = model_result(name="GN", source="foo")
+    result["GN"] = lf
+    return result
+
+
+@pytest.mark.parametrize("result", [_model_res, _gn_fit()], ids=["GTR", "GN"])
+def test_load_rich_dict_context(result, monkeypatch):
+    data = _rich_dict(result)
+    expect = load_context(result)
+    # no likelihood function is built
+    monkeypatch.setattr(AlignmentLikelihoodFunction, "__init__", None)
+    context = load_rich_dict_context(data)
+    assert context.source == expect.source
+    assert context.model_name == expect.model_name
+    assert context.tree.get_newick() == expect.tree.get_newick()
+    psubs = expect.psubs.psubs
+    assert list(context.psubs.psubs) == list(psubs)
+    for edge, psub in context.psubs.items():
+        assert allclose(psub.array, psubs[edge].array, rtol=0, atol=1e-12)
+        assert psub.keys() == psubs[edge].keys()
+    assert context.params.par_names.tolist() == expect.params.par_names.tolist()
+    assert array_equal(context.params.values, expect.params.values)
+    assert load_rich_dict_context(data, with_params=False).params is None
+
+
+@pytest.mark.parametrize("result", [_model_res, _gn_fit()], ids=["GTR", "GN"])
+def test_phylim_rich_dict(result):
+    data = _rich_dict(result)
+    record = phylim()(data)
+    _assert_same_record(record, phylim()(result))
+    assert (
+        phylim(verdict_only=True)(data).check == phylim(verdict_only=True)(result).check
+    )
+
+
+def test_load_rich_dict_context_fallback():
+    # rate heterogeneity is not computed from the rich dict
+    lf = get_model(
+        "HKY85", ordered_param="rate", distribution="gamma"
+    ).make_likelihood_function(make_tree(tip_names=_algn.names), bins=2)
+    lf.set_alignment(_algn)
+    result = model_result(name="HKY85", source="foo")
+    result["HKY85"] = lf
+    with pytest.warns(UserWarning, match="bprobs"):
+        _assert_same_record(phylim()(_rich_dict(result)), phylim()(result))
+    # as for the model_result, several likelihood functions are an error
+    record = phylim()(_rich_dict(_model_res_split))
+    assert isinstance(record, NotCompleted)
+    assert "exactly one likelihood function" in record.message
+
+
+@pytest.mark.parametrize("name", ["fits", "fits.sqlitedb"])
+def test_load_rich_dict(tmp_path, name):
+    dstore = open_data_store(tmp_path / name, suffix="json", mode="w")
+    writer = write_json(dstore) if name == "fits" else write_db(dstore)
+    writer.main(_model_res, identifier="fit")
+    data = load_rich_dict()(dstore.completed[0])
+    assert data == _rich_dict(_model_res)
+    app = load_rich_dict() + phylim()
+    _assert_same_record(app(dstore.completed[0]), phylim()(_model_res))
+
+
+def test_load_rich_dict_deserialiser(tmp_path):
+    dstore = open_data_store(tmp_path / "fits.sqlitedb", mode="w")
+    serialiser = to_primitive() + pickle_it() + compress()
+    write_db(dstore, serialiser=serialiser).main(_model_res, identifier="fit")
+    loader = load_rich_dict(deserialiser=decompress() + unpickle_it())
+    assert loader(dstore.completed[0]) == _rich_dict(_model_res)
+    # the default deserialiser does not decompress
+    assert isinstance(load_rich_dict()(dstore.completed[0]), NotCompleted)
+
+
+def test_load_rich_dict_not_rich_dict(tmp_path):
+    dstore = open_data_store(tmp_path / "fits.sqlitedb", mode="w")
+    dstore.write(unique_id="fit", data=pickle.dumps([1, 2]))
+    record = load_rich_dict()(dstore.completed[0])
+    assert isinstance(record, NotCompleted)
+    assert "is not the rich dict of a cogent3 object" in record.message
+
+
+@pytest.mark.parametrize("key", ["model", "tree", "param_rules"])
+def test_phylim_rich_dict_missing_key(key):
+    data = _rich_dict(_model_res)
+    del data["items"][0][1][key]
+    record = phylim()(data)
+    assert isinstance(record, NotCompleted)
+    assert f"rich dict has no ['{key}']" in record.message
+
+
 def test_phylim_filter_app_pass():
     filter_app = phylim_filter(strict=True)
     result1 = filter_app(_model_res)
@@ -191,3 +672,59 @@ def test_calc_delta_col_tree_coverage():
     delta_col_dict = record.delta_col
 
     assert len(delta_col_dict) == expected_edge_count
+
+
+@pytest.fixture(params=["json", "sqlitedb"])
+def model_dstore(request, tmp_path):
+    if request.param == "json":
+        dstore = open_data_store(tmp_path / "fits", suffix="json", mode="w")
+        writer = write_json(dstore)
+    else:
+        dstore = open_data_store(tmp_path / "fits.sqlitedb", mode="w")
+        writer = write_db(dstore)
+    for i in range(5):
+        writer.main(_model_res, identifier=f"fit-{i}")
+    return dstore
+
+
+@pytest.mark.parametrize("out_name", ["checked.sqlitedb", "checked"])
+def test_phylim_batch(model_dstore, tmp_path, out_name):
+    out_path = tmp_path / out_name
+    batch = phylim_batch(str(out_path), max_workers=1, chunksize=2)
+    summary = batch(model_dstore)
+    assert isinstance(summary, BatchSummary)
+    assert summary.num_completed == 5
+    assert summary.num_not_completed == 0
+    assert summary.throughput > 0
+    out = open_data_store(out_path, suffix="json")
+    assert {m.unique_id.split(".")[0] for m in out.completed} == {
+        f"fit-{i}" for i in range(5)
+    }
+    # a second run skips everything already done
+    summary = batch(model_dstore)
+    assert summary.num_skipped == 5
+    assert summary.num_completed == 0
+
+
+def test_phylim_batch_process_pool(model_dstore, tmp_path):
+    out = open_data_store(tmp_path / "checked", suffix="json", mode="w")
+    summary = phylim_batch(out, max_workers=2, chunksize=2)(model_dstore)
+    assert summary.num_completed == 5
+    assert len(out.completed) == 5
+    assert isinstance(summary.to_table(), Table)
+
+
+def test_phylim_batch_not_completed(tmp_path):
+    dstore = open_data_store(tmp_path / "fits", suffix="json", mode="w")
+    dstore.write(unique_id="bad.json", data="{}")
+    summary = phylim_batch(str(tmp_path / "checked"), max_workers=1)(dstore)
+    assert summary.num_not_completed == 1
+    assert summary.num_completed == 0
+
+
+def test_phylim_batch_pickles(tmp_path):
+    out_path = tmp_path / "checked.sqlitedb"
+    batch = phylim_batch(str(out_path), max_workers=1)
+    # the output is opened when the batch is run
+    assert not out_path.exists()
+    assert pickle.loads(pickle.dumps(batch)).out_dstore == str(out_path)
@@ -0,0 +1,180 @@
+import dataclasses
+import pathlib
+
+import numpy
+import pytest
+from cogent3.core.table import Table
+from cogent3.util.deserialise import deserialise_object
+
+from phylim.apps import PhyloLimitRec, phylim
+from phylim.batch import PhyloLimitBatch, _StringTable
+from phylim.classify_matrix import LIMIT
+from phylim.eval_identifiability import BADNODES, IDENTIFIABLE, IdentCheckRes
+
+
+DATADIR = pathlib.Path(__file__).parent / "data"
+
+_model_res = deserialise_object(
+    f"{DATADIR}/eval_identifiability/unid_model_result.json"
+)
+
+
+@pytest.fixture(scope="module")
+def records():
+    hand_made = PhyloLimitRec(
+        check=IdentCheckRes(
+            source="foo",
+            strict=False,
+            names={"edge.0", "edge.1"},
+            violation_type=BADNODES,
+        ),
+        model_name=None,
+        boundary_values=[
+            {
+                "par_name": "kappa",
+                "init": 1e-6,
+                "lower": 1e-6,
+                "upper": 50,
+                "edges": ["a"],
+            }
+        ],
+        nondlc_and_identity={("a",): LIMIT},
+        delta_col={("a",): -0.5, ("b",): 0.25},
+    )
+    return [
+        phylim()(_model_res),
+        phylim(strict=True)(_model_res),
+        phylim(verdict_only=True)(_model_res),
+        phylim(profile=True, modes=[True])(_model_res),
+        hand_made,
+    ]
+
+
+def _plain_keys(record):
+    # a batch keys edges by name, not by ModelPsubs tuples
+    changes = {}
+    for attr in ("nondlc_and_identity", "delta_col"):
+        if (value := getattr(record, attr)) is not None:
+            changes[attr] = {
+                k[0] if isinstance(k, tuple) else k: v for k, v in value.items()
+            }
+    return dataclasses.replace(record, **changes)
+
+
+def test_string_table():
+    strings = _StringTable()
+    assert [strings.code(s) for s in ["a", "b", "a"]] == [0, 1, 0]
+    copied = strings.copy()
+    assert copied.code("c") == 2
+    assert len(strings) == 2
+    assert strings[1] == "b"
+    strings.code("\u00e9t\u00e9")
+    loaded = _StringTable.from_arrays(strings.to_arrays())
+    assert loaded.values == strings.values
+    assert loaded.code("b") == 1
+    # as written by earlier versions
+    legacy = {"strings": numpy.array(strings.values, dtype=str)}
+    assert _StringTable.from_arrays(legacy).values == strings.values
+    assert _StringTable.from_arrays(_StringTable().to_arrays()).values == []
+
+
+def test_missing_bounds():
+    record = PhyloLimitRec(
+        check=IdentCheckRes(
+            source="foo", strict=False, names=None, violation_type=IDENTIFIABLE
+        ),
+        model_name="GN",
+        boundary_values=[
+            {"par_name": "A/G", "init": 1e-6},
+            {"par_name": "C/T", "init": 1e-6, "lower": None, "upper": None},
+        ],
+        nondlc_and_identity={},
+        delta_col={},
+    )
+    got = PhyloLimitBatch.from_records([record])[0]
+    assert [(v["lower"], v["upper"]) for v in got.boundary_values] == [
+        (-numpy.inf, numpy.inf)
+    ] * 2
+
+
+def test_round_trip(records):
+    batch = PhyloLimitBatch.from_records(records)
+    assert len(batch) == len(records)
+    got = batch.to_records()
+    assert got == [_plain_keys(r) for r in records]
+    assert batch[-1] == got[-1]
+
+
+def test_columns(records):
+    batch = PhyloLimitBatch.from_records(records)
+    assert batch.is_identifiable.tolist() == [r.is_identifiable for r in records]
+    assert batch.has_BV.tolist() == [r.has_BV for r in records]
+    assert batch.strict.tolist() == [r.check.strict for r in records]
+    assert batch.violation_type.tolist()[-1] == "bad_nodes"
+    assert batch.source.tolist()[-1] == "foo"
+    expect = min(records[0].delta_col.values())
+    assert batch.delta_col_min[0] == expect
+    assert numpy.isnan(batch.delta_col_min[2])
+    assert batch.delta_col_min[-1] == -0.5
+
+
+def test_append_extend(records):
+    batch = PhyloLimitBatch()
+    batch.append(records[0])
+    batch.extend(records[1:])
+    assert batch.to_records() == PhyloLimitBatch.from_records(records).to_records()
+
+
+def test_filter_take(records):
+    batch = PhyloLimitBatch.from_records(records * 3)
+    subset = batch.filter(batch.is_identifiable)
+    assert subset.is_identifiable.all()
+    assert subset.to_records() == [r for r in batch if r.is_identifiable]
+
+    taken = batch.take([3, 0, -1])
+    assert taken.to_records() == [batch[3], batch[0], batch[-1]]
+    assert len(batch.take([])) == 0
+
+    with pytest.raises(ValueError):
+        batch.filter([True])
+    with pytest.raises(IndexError):
+        batch.take([len(batch)])
+
+
+def test_to_table(records):
+    batch = PhyloLimitBatch.from_records(records)
+    table = batch.to_table()
+    assert isinstance(table, Table)
+    assert table.shape[0] == len(records)
+    assert isinstance(batch._repr_html_(), str)
+
+
+@pytest.mark.parametrize("compress", [False, True])
+def test_save_load(records, tmp_path, compress):
+    batch = PhyloLimitBatch.from_records(records)
+    path = tmp_path / "records.npz"
+    batch.save(path, compress=compress)
+    got = PhyloLimitBatch.load(path)
+    assert got.to_records() == batch.to_records()
+    # a loaded batch can grow
+    got.append(records[0])
+    assert got[-1] == batch[0]
+
+
+def test_load_without_profile(records, tmp_path):
+    # as saved before the profile and checks were stored
+    batch = PhyloLimitBatch.from_records(records[:1])
+    batch.save(tmp_path / "records.npz")
+    with numpy.load(tmp_path / "records.npz") as data:
+        arrays = {k: data[k] for k in data.files if k not in ("profile", "checks")}
+    numpy.savez(tmp_path / "earlier.npz", **arrays)
+    assert PhyloLimitBatch.load(tmp_path / "earlier.npz")[0] == batch[0]
+
+
+def test_empty(tmp_path):
+    batch = PhyloLimitBatch()
+    assert len(batch) == 0
+    assert batch.to_records() == []
+    assert batch.delta_col_min.shape == (0,)
+    batch.save(tmp_path / "empty.npz")
+    assert len(PhyloLimitBatch.load(tmp_path / "empty.npz")) == 0
@@ -0,0 +1,77 @@
+import pathlib
+import sys
+
+import numpy
+import pytest
+
+from phylim.classify_matrix import MATRIX_CATEGORIES, MatrixCategory, classify_psubs
+from phylim.topology import make_tree_index
+
+
+sys.path.insert(0, str(pathlib.Path(__file__).parent.parent))
+generators = pytest.importorskip("benchmarks.generators")
+
+
+@pytest.mark.parametrize("shape", generators.TREE_SHAPES)
+@pytest.mark.parametrize("num_tips", [3, 10, 101])
+def test_make_tree(shape, num_tips):
+    tree = generators.make_tree(shape, num_tips, seed=1)
+    assert len(tree.tips()) == num_tips
+    # names are unique, as make_tree_index checks
+    index = make_tree_index(tree)
+    assert index.is_tip.sum() == num_tips
+    assert all(n.length > 0 for n in tree.preorder(include_self=False))
+
+
+def test_make_tree_caterpillar_depth():
+    tree = generators.make_tree("caterpillar", 5000)
+    tip = tree.get_node_matching_name("t0")
+    assert len(tip.ancestors()) == 4998
+
+
+@pytest.mark.parametrize("mcat", list(MatrixCategory))
+@pytest.mark.parametrize("dim", [3, 4, 20, 61])
+def test_make_matrices(mcat, dim):
+    rng = numpy.random.default_rng(dim)
+    matrices = generators.make_matrices(mcat, 20, dim, rng)
+    assert matrices.shape == (20, dim, dim)
+    assert numpy.allclose(matrices.sum(axis=2), 1)
+    assert {MATRIX_CATEGORIES[c] for c in classify_psubs(matrices)} == {mcat}
+
+
+def test_make_psubs():
+    tree = generators.make_tree("random", 200)
+    categories = generators.assign_categories(tree, generators.DEFAULT_MIX)
+    assert set(categories.mcats.values()) == set(generators.DEFAULT_MIX)
+    psubs = generators.make_psubs(categories, 4)
+    assert list(psubs.psubs) == list(categories.mcats)
+    codes = classify_psubs(psubs.to_array())
+    assert [MATRIX_CATEGORIES[c] for c in codes] == list(categories.mcats.values())
+
+
+def test_make_param_rules():
+    from phylim.check_boundary import check_boundary
+
+    params = generators.make_param_rules(1000, at_bound=0.1)
+    num_vio = len(check_boundary(params).vio)
+    assert 50 < num_vio < 150
+
+
+def test_make_matrices_sympathetic_2x2():
+    with pytest.raises(ValueError):
+        generators.make_matrices(
+            MatrixCategory.sympathetic, 1, 2, numpy.random.default_rng()
+        )
+
+
+def test_bench_measure_and_cases():
+    bench = pytest.importorskip("benchmarks.bench")
+    calls = []
+    result = bench.measure(
+        lambda: calls.append("func"), 2, lambda: calls.append("setup")
+    )
+    assert calls == ["setup", "func"] * 3
+    assert result["repeat"] == 2
+    cases = bench._cases(("random",), (20,), (4,), generators.DEFAULT_MIX, 1, 0)
+    names = [case["benchmark"] for case in cases]
+    assert {"eval_paths", "eval_paths_warm", "phylim", "phylim_psubs"} <= set(names)
@@ -1,6 +1,20 @@
+import json
+import pickle
+import warnings
+
 import pytest
 
-from phylim.check_boundary import BoundsViolation, ParamRules, check_boundary
+from cogent3.util.deserialise import deserialise_object
+
+from phylim.check_boundary import (
+    BoundarySummary,
+    BoundaryTolerance,
+    BoundsViolation,
+    ParamArrays,
+    ParamRules,
+    check_boundaries,
+    check_boundary,
+)
 
 
 @pytest.mark.parametrize(
@@ -76,3 +90,110 @@ def test_to_rich_dict_boundsviolation():
     result = test_input.to_rich_dict()
     assert isinstance(result, dict)
     assert all(k in result for k in ["source", "vio", "version"])
+
+
+def test_deserialise_boundsviolation():
+    vio = BoundsViolation(
+        source="foo",
+        vio=[{"par_name": "A/G", "init": 1e-06, "lower": 1e-06, "upper": 200}],
+    )
+    got = deserialise_object(json.dumps(vio.to_rich_dict()))
+    assert got == vio
+
+
+def _rules(*params) -> ParamRules:
+    return ParamRules(
+        source="foo",
+        params=[
+            {"par_name": name, "init": init, "lower": 1e-06, "upper": 200}
+            for name, init in params
+        ],
+    )
+
+
+def test_check_boundary_rtol():
+    params = _rules(("A/G", 1.001e-06), ("C/T", 190.0))
+    assert check_boundary(params).vio == []
+    got = check_boundary(params, BoundaryTolerance(rtol=1e-3))
+    assert [v["par_name"] for v in got.vio] == ["A/G"]
+    got = check_boundary(params, BoundaryTolerance(atol=20.0))
+    assert [v["par_name"] for v in got.vio] == ["A/G", "C/T"]
+
+
+def test_check_boundary_per_param():
+    params = _rules(("A/G", 1.001e-06), ("C/T", 190.0))
+    tolerance = BoundaryTolerance(per_param={"C/T": (20.0, 0.0)})
+    assert [v["par_name"] for v in check_boundary(params, tolerance).vio] == ["C/T"]
+
+
+def test_check_boundary_exclude():
+    params = _rules(("A/G", 1e-06), ("C/T", 200))
+    tolerance = BoundaryTolerance(exclude={"A/G"})
+    assert [v["par_name"] for v in check_boundary(params, tolerance).vio] == ["C/T"]
+    # excluding nothing checks the lengths too, but not non-scalar params
+    params.params.append({"par_name": "length", "init": 0, "lower": 0, "upper": 10})
+    params.params.append({"par_name": "mprobs", "init": {"A": 1.0}})
+    params.params.append({"par_name": "kappa", "value": 1, "is_constant": True})
+    with pytest.warns(UserWarning, match=r"\['mprobs'\] are not checked"):
+        got = check_boundary(params, BoundaryTolerance(exclude=()))
+    assert [v["par_name"] for v in got.vio] == ["A/G", "C/T", "length"]
+
+
+def test_param_arrays_from_rules():
+    params = _rules(("A/G", 1e-06))
+    params.params.append({"par_name": "mprobs", "init": {"A": 1.0}})
+    params.params.append({"par_name": "kappa", "value": 1, "is_constant": True})
+    with pytest.warns(UserWarning, match="foo: the bounds of \\['mprobs'\\]"):
+        arrays = ParamArrays.from_rules(params, exclude=())
+    assert arrays.par_names.tolist() == ["A/G"]
+    assert arrays.rule(0) is params.params[0]
+    # the excluded non-scalar params are not named
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        arrays = ParamArrays.from_rules(params)
+    assert pickle.loads(pickle.dumps(arrays)).rules == arrays.rules
+
+
+@pytest.mark.parametrize("tolerance", [(-1, 0), (0, -1)])
+def test_boundary_tolerance_invalid(tolerance):
+    with pytest.raises(ValueError):
+        BoundaryTolerance(*tolerance)
+    with pytest.raises(ValueError):
+        BoundaryTolerance(per_param={"A/G": tolerance})
+
+
+def test_param_arrays_unbounded():
+    params = ParamRules(
+        source="foo",
+        params=[{"par_name": "A/G", "init": 1.0, "lower": None, "upper": None}],
+    )
+    arrays = ParamArrays.from_rules(params)
+    assert arrays.lower[0] == -float("inf")
+    assert check_boundary(params, BoundaryTolerance(rtol=1.0)).vio == []
+
+
+def test_check_boundaries():
+    fits = [
+        _rules(("A/G", 1e-06), ("C/T", 200)),
+        _rules(),
+        _rules(("A/G", 1.0), ("C/T", 5.0)),
+        _rules(("A/G", 3.0), ("C/T", 200)),
+    ]
+    summary = check_boundaries([ParamArrays.from_rules(p) for p in fits])
+    assert isinstance(summary, BoundarySummary)
+    assert len(summary) == 4
+    assert summary.num_violations.tolist() == [2, 0, 0, 1]
+    assert summary.has_violation.tolist() == [True, False, False, True]
+    assert summary.to_list() == [check_boundary(p) for p in fits]
+    assert summary[-1].vio == [fits[-1].params[1]]
+
+    table = summary.to_table()
+    assert table.shape == (3, 5)
+    assert table.columns["bound"].tolist() == ["lower", "upper", "upper"]
+
+
+def test_check_boundaries_empty():
+    summary = check_boundaries([])
+    assert len(summary) == 0
+    assert summary.has_violation.tolist() == []
+    assert summary.to_table().shape[0] == 0
@@ -1,27 +1,34 @@
+import json
 import pathlib
 
 import numpy
 import pytest
 
 from cogent3.core.table import Table
+from cogent3.util.deserialise import deserialise_object
 
 from phylim.classify_matrix import (
+    CATEGORY_CODES,
     CHAINSAW,
     DLC,
     IDENTITY,
     LIMIT,
+    MATRIX_CATEGORIES,
     SYMPATHETIC,
+    ClassificationCache,
     ModelMatrixCategories,
     ModelPsubs,
     classify_matrix,
     classify_psub,
+    classify_psubs,
+    distinct_matrices,
     is_chainsaw,
     is_dlc,
     is_identity,
     is_limit,
+    screen_psubs,
 )
 
-
 DATADIR = pathlib.Path(__file__).parent / "data"
 
 
@@ -121,6 +128,32 @@ def test_to_rich_dict_modelmatrixcategories():
     assert all(k in result for k in ["source", "mcats", "version"])
 
 
+def test_deserialise_modelmatrixcategories():
+    # keyed by edge name, as the psubs of a likelihood function
+    labelled = ModelMatrixCategories(
+        source="foo",
+        mcats={"a": CHAINSAW, "b": DLC, "edge.0": IDENTITY, "c": LIMIT},
+    )
+    result = labelled.to_rich_dict()
+    assert result["mcats"]["codes"] == "".join(
+        str(CATEGORY_CODES[m]) for m in labelled.mcats.values()
+    )
+    got = deserialise_object(json.dumps(result))
+    assert got == labelled
+    assert got.to_table().columns["edge name"].tolist() == ["a", "b", "edge.0", "c"]
+
+
+def test_modelmatrixcategories_rich_dict_format():
+    # the layout before the categories were encoded, without a format
+    legacy = {"source": "foo", "mcats": {"edge.0": "limit", "b": "DLC"}}
+    got = ModelMatrixCategories.from_rich_dict(legacy)
+    assert got.mcats == {"edge.0": LIMIT, "b": DLC}
+    newer = ModelMatrixCategories(source="foo", mcats={}).to_rich_dict()
+    newer["format"] += 1
+    with pytest.raises(ValueError):
+        ModelMatrixCategories.from_rich_dict(newer)
+
+
 def test_to_table_modelmatrixcategories():
     labelled = ModelMatrixCategories(source="foo", mcats={("bar",): CHAINSAW})
     result = labelled.to_table()
@@ -139,3 +172,229 @@ def test_classify_psubs(make_dlc):
     psub = {(str("bar"),): dict_array.DictArray(make_dlc())}
     mpsubs = ModelPsubs(source="foo", psubs=psub)
     assert isinstance(classify_matrix(mpsubs), ModelMatrixCategories)
+
+
+def test_classify_psubs_stacked(make_dlc, make_chainsaw, make_limit):
+    with open(f"{DATADIR}/matrices/sympathetic1.npy", "rb") as f:
+        sym = numpy.load(f)
+    matrices = [numpy.eye(4), make_limit(), make_dlc(), make_chainsaw(), sym]
+    codes = classify_psubs(numpy.stack(matrices * 3))
+    assert codes.dtype == numpy.uint8
+    got = [MATRIX_CATEGORIES[c] for c in codes]
+    assert got == [IDENTITY, LIMIT, DLC, CHAINSAW, SYMPATHETIC] * 3
+    assert got == [classify_psub(m) for m in matrices * 3]
+
+
+@pytest.mark.parametrize("shape", [(4, 4), (2, 4, 3)])
+def test_classify_psubs_bad_shape(shape):
+    with pytest.raises(ValueError):
+        classify_psubs(numpy.zeros(shape))
+
+
+def test_classify_matrix_order(make_dlc, make_chainsaw):
+    from cogent3.util import dict_array
+
+    psub = {
+        ("a",): dict_array.DictArray(make_chainsaw()),
+        ("b",): dict_array.DictArray(make_dlc()),
+        ("c",): dict_array.DictArray(numpy.eye(4)),
+    }
+    got = classify_matrix(ModelPsubs(source="foo", psubs=psub))
+    assert got.mcats == {("a",): CHAINSAW, ("b",): DLC, ("c",): IDENTITY}
+
+
+def _matrices_of_size(dim, rng):
+    dlc = rng.dirichlet(numpy.ones(dim), size=dim) * 0.3 + numpy.eye(dim) * 0.7
+    chainsaw = dlc[numpy.roll(numpy.arange(dim), 1)]
+    limit = numpy.tile(rng.dirichlet(numpy.ones(dim)), (dim, 1))
+    near_limit = limit.copy()
+    near_limit[dim // 2] += 1e-3
+    tied = dlc.copy()
+    tied[1, 0] = tied[0, 0]
+    return [numpy.eye(dim), limit, dlc, chainsaw, near_limit, tied]
+
+
+@pytest.mark.parametrize("dim", [4, 20, 61, 64])
+def test_classify_psubs_large(dim):
+    rng = numpy.random.default_rng(dim)
+    matrices = _matrices_of_size(dim, rng)
+    codes = classify_psubs(numpy.stack(matrices))
+    got = [MATRIX_CATEGORIES[c] for c in codes]
+    assert got == [IDENTITY, LIMIT, DLC, CHAINSAW, SYMPATHETIC, SYMPATHETIC]
+
+
+@pytest.mark.parametrize("dim", [20, 61])
+def test_classify_psubs_near_identity(dim):
+    # within numpy.isclose tolerances of an identity matrix
+    matrix = numpy.eye(dim)
+    matrix[0, 1] = 1e-9
+    matrix[1, 1] = 1 - 5e-6
+    assert classify_psub(matrix) is IDENTITY
+    matrix[0, 1] = 1e-7
+    assert classify_psub(matrix) is DLC
+
+
+def test_classify_psubs_tolerances():
+    rng = numpy.random.default_rng(2)
+    near_limit = numpy.tile(rng.dirichlet(numpy.ones(4)), (4, 1))
+    near_limit[2] += 1e-4
+    assert classify_psubs(near_limit[numpy.newaxis])[0] != CATEGORY_CODES[LIMIT]
+    codes = classify_psubs(near_limit[numpy.newaxis], atol=1e-3)
+    assert codes[0] == CATEGORY_CODES[LIMIT]
+    codes = classify_psubs(near_limit[numpy.newaxis], atol=0, rtol=1e-2)
+    assert codes[0] == CATEGORY_CODES[LIMIT]
+
+
+@pytest.mark.parametrize("func", [classify_psubs, screen_psubs])
+@pytest.mark.parametrize("tols", [(-1e-8, 1e-5), (1e-8, -1e-5)])
+def test_negative_tolerances(func, tols):
+    with pytest.raises(ValueError):
+        func(numpy.eye(4)[numpy.newaxis], *tols)
+
+
+def _borderline_matrices(dim, rng):
+    matrices = _matrices_of_size(dim, rng)
+    for delta in (0.0, 1e-9, 3e-8, 1e-7, 1e-6, 1e-4):
+        near_identity = numpy.eye(dim)
+        near_identity[0, 1] = delta
+        near_limit = numpy.tile(rng.dirichlet(numpy.ones(dim)), (dim, 1))
+        near_limit[1] += delta
+        near_tie = rng.dirichlet(numpy.ones(dim), size=dim) * 0.5 + numpy.eye(dim) / 2
+        near_tie[1, 0] = near_tie[0, 0] - delta
+        matrices.extend([near_identity, near_limit, near_tie, near_tie[::-1]])
+    return numpy.stack(matrices)
+
+
+@pytest.mark.parametrize("dim", [4, 20, 61])
+@pytest.mark.parametrize("tols", [(1e-8, 1e-5), (0, 0), (1e-6, 0), (1e-3, 1e-2)])
+def test_screen_psubs(dim, tols):
+    p_matrices = _borderline_matrices(dim, numpy.random.default_rng(dim))
+    expect = classify_psubs(p_matrices, *tols)
+    assert (screen_psubs(p_matrices, *tols) == expect).all()
+    low = p_matrices.astype(numpy.float32)
+    got = screen_psubs(low, *tols, take=lambda indices: p_matrices[indices])
+    assert (got == expect).all()
+
+
+def test_model_psubs_to_array_dtype(make_dlc):
+    from cogent3.util import dict_array
+
+    psubs = ModelPsubs(
+        source="foo",
+        psubs={
+            ("a",): dict_array.DictArray(make_dlc()),
+            ("b",): dict_array.DictArray(numpy.eye(4)),
+        },
+    )
+    low = psubs.to_array(numpy.float32)
+    assert low.dtype == numpy.float32
+    assert psubs.to_array(numpy.float32) is low
+    assert psubs.to_array().dtype == numpy.float64
+    assert numpy.array_equal(psubs.take(numpy.array([1])), numpy.eye(4)[numpy.newaxis])
+
+
+@pytest.mark.parametrize("float32", [False, True])
+def test_classify_matrix_float32(make_dlc, make_chainsaw, float32):
+    from cogent3.util import dict_array
+
+    psub = {
+        ("a",): dict_array.DictArray(make_chainsaw()),
+        ("b",): dict_array.DictArray(make_dlc()),
+        ("c",): dict_array.DictArray(numpy.eye(4)),
+    }
+    got = classify_matrix(ModelPsubs(source="foo", psubs=psub), float32=float32)
+    assert got.mcats == {("a",): CHAINSAW, ("b",): DLC, ("c",): IDENTITY}
+
+
+def test_classify_matrix_float32_cache(make_dlc, make_chainsaw):
+    from cogent3.util import dict_array
+
+    matrices = [make_dlc(), make_chainsaw(), numpy.eye(4), make_dlc()]
+    psubs = ModelPsubs(
+        source="foo",
+        psubs={(f"edge.{i}",): dict_array.DictArray(m) for i, m in enumerate(matrices)},
+    )
+    cache = ClassificationCache()
+    got = classify_matrix(psubs, float32=True, cache=cache)
+    assert list(got.mcats.values()) == [DLC, CHAINSAW, IDENTITY, DLC]
+    # screened from the float32 stack, the float64 one is never made
+    assert numpy.dtype(numpy.float64) not in psubs._stacked
+    again = classify_matrix(psubs, float32=True, cache=cache)
+    assert again.mcats == got.mcats
+    assert cache.stats.hits == 4
+
+
+@pytest.mark.parametrize("dim", [4, 20, 61])
+def test_distinct_matrices(dim):
+    rng = numpy.random.default_rng(dim)
+    unique = rng.random((5, dim, dim))
+    # differs from unique[0] only off the hashed diagonal and first row
+    unique[4] = unique[0]
+    unique[4, -1, 0] += 1
+    order = numpy.array([3, 0, 0, 4, 1, 3, 2, 0])
+    first, inverse = distinct_matrices(unique[order])
+    assert first.tolist() == [0, 1, 3, 4, 6]
+    assert numpy.array_equal(unique[order][first][inverse], unique[order])
+
+
+def test_distinct_matrices_empty():
+    first, inverse = distinct_matrices(numpy.empty((0, 4, 4)))
+    assert first.shape == inverse.shape == (0,)
+
+
+def test_classify_matrix_duplicates(make_dlc, make_chainsaw):
+    from cogent3.util import dict_array
+
+    matrices = [make_dlc(), make_chainsaw(), numpy.eye(4)]
+    psubs = ModelPsubs(
+        source="foo",
+        psubs={
+            (f"edge.{i}",): dict_array.DictArray(matrices[i % 3]) for i in range(10)
+        },
+    )
+    first, inverse = psubs.distinct()
+    assert first.tolist() == [0, 1, 2]
+    assert psubs.distinct()[0] is first
+    got = classify_matrix(psubs)
+    assert list(got.mcats.values()) == [
+        [DLC, CHAINSAW, IDENTITY][i % 3] for i in range(10)
+    ]
+
+
+def test_classification_cache(make_dlc, make_chainsaw):
+    from cogent3.util import dict_array
+
+    def model_psubs(*matrices):
+        return ModelPsubs(
+            source="foo",
+            psubs={
+                (f"edge.{i}",): dict_array.DictArray(m) for i, m in enumerate(matrices)
+            },
+        )
+
+    dlc, chainsaw, identity = make_dlc(), make_chainsaw(), numpy.eye(4)
+    cache = ClassificationCache(maxsize=2)
+    got = classify_matrix(model_psubs(dlc, chainsaw, dlc), cache=cache)
+    assert list(got.mcats.values()) == [DLC, CHAINSAW, DLC]
+    stats = cache.stats
+    assert (stats.hits, stats.misses, stats.evictions, stats.currsize) == (0, 2, 0, 2)
+
+    got = classify_matrix(model_psubs(chainsaw, identity), cache=cache)
+    assert list(got.mcats.values()) == [CHAINSAW, IDENTITY]
+    stats = cache.stats
+    assert (stats.hits, stats.misses, stats.evictions, stats.currsize) == (1, 3, 1, 2)
+
+    # dlc was the least recently used, so it was evicted
+    classify_matrix(model_psubs(dlc), cache=cache)
+    assert cache.stats.misses == 4
+
+    # tolerances are part of the key
+    got = classify_matrix(model_psubs(chainsaw), atol=1.0, cache=cache)
+    assert got.mcats == {("edge.0",): IDENTITY}
+    assert cache.stats.misses == 5
+
+    cache.clear()
+    assert len(cache) == 0
+    assert cache.stats.hits == cache.stats.misses == 0
+    with pytest.raises(ValueError):
+        ClassificationCache(maxsize=0)
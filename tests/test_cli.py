@@ -0,0 +1,81 @@
+import json
+import pathlib
+
+import pytest
+from click.testing import CliRunner
+from cogent3.app.io import open_data_store, write_json
+from cogent3.util.deserialise import deserialise_object
+
+from phylim.cli import main
+
+
+DATADIR = pathlib.Path(__file__).parent / "data"
+
+_model_res = deserialise_object(
+    f"{DATADIR}/eval_identifiability/unid_model_result.json"
+)
+
+
+@pytest.fixture()
+def fits_dir(tmp_path):
+    dstore = open_data_store(tmp_path / "fits", suffix="json", mode="w")
+    writer = write_json(dstore)
+    for i in range(5):
+        writer.main(_model_res, identifier=f"fit-{i}")
+    return tmp_path / "fits"
+
+
+def _read_jsonl(path: pathlib.Path) -> list[dict]:
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_cli_jsonl(fits_dir, tmp_path):
+    out = tmp_path / "checked.jsonl"
+    result = CliRunner().invoke(main, [str(fits_dir), str(out), "--batch-size", "2"])
+    assert result.exit_code == 0, result.output
+    records = _read_jsonl(out)
+    assert {r["identifier"] for r in records} == {f"fit-{i}" for i in range(5)}
+    assert all(r["completed"] for r in records)
+    assert all("delta_col" in r["data"] for r in records)
+
+
+def test_cli_glob(fits_dir, tmp_path):
+    out = tmp_path / "checked.jsonl"
+    pattern = str(fits_dir / "fit-[0-2].json")
+    result = CliRunner().invoke(main, [pattern, str(out), "--verdict-only"])
+    assert result.exit_code == 0, result.output
+    assert {r["identifier"] for r in _read_jsonl(out)} == {"fit-0", "fit-1", "fit-2"}
+
+
+def test_cli_resume(fits_dir, tmp_path):
+    out = tmp_path / "checked.jsonl"
+    runner = CliRunner()
+    runner.invoke(main, [str(fits_dir / "fit-[0-1].json"), str(out)])
+    # simulate an interrupted write of a third record
+    with out.open("a") as outfile:
+        outfile.write('{"identifier": "fit-2", "comp')
+
+    result = runner.invoke(main, [str(fits_dir), str(out)])
+    assert result.exit_code != 0
+    assert "--resume" in result.output
+
+    result = runner.invoke(main, [str(fits_dir), str(out), "--resume"])
+    assert result.exit_code == 0, result.output
+    assert "2 already done" in result.output
+    identifiers = [r["identifier"] for r in _read_jsonl(out)]
+    assert sorted(identifiers) == [f"fit-{i}" for i in range(5)]
+
+
+def test_cli_sqlitedb(fits_dir, tmp_path):
+    out = tmp_path / "checked.sqlitedb"
+    runner = CliRunner()
+    result = runner.invoke(main, [str(fits_dir), str(out), "--strict"])
+    assert result.exit_code == 0, result.output
+    assert len(open_data_store(out).completed) == 5
+    result = runner.invoke(main, [str(fits_dir), str(out), "--resume"])
+    assert "checked 0" in result.output
+
+
+def test_cli_bad_output(fits_dir, tmp_path):
+    result = CliRunner().invoke(main, [str(fits_dir), str(tmp_path / "out.txt")])
+    assert result.exit_code != 0
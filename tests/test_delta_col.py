@@ -3,7 +3,13 @@ import pytest
 from cogent3.util.dict_array import DictArray
 
 from phylim.classify_matrix import ModelPsubs
-from phylim.delta_col import calc_delta_col
+from phylim.delta_col import (
+    calc_delta_col,
+    calc_delta_col_margins,
+    col_margins,
+    min_col_diff,
+    min_diff_from_diag,
+)
 
 
 @pytest.mark.parametrize(
@@ -49,3 +55,94 @@ def test_calc_delta_col_hand_constructed(matrix, expected_delta_col):
     psubs = ModelPsubs(psubs={("test_edge",): dict_array}, source="test")
     result = calc_delta_col(psubs)
     assert numpy.isclose(result[("test_edge",)], expected_delta_col)
+
+
+def test_col_margins_matches_per_matrix():
+    rng = numpy.random.default_rng(3)
+    p_matrices = rng.random((20, 5, 5))
+    diag = numpy.diag_indices(5)
+    offdiag = ~numpy.eye(5, dtype=bool)
+    # the margins of each matrix, from the diagonal and masked column maxima
+    expect = [
+        m[diag] - m.max(axis=0, where=offdiag, initial=m.min()) for m in p_matrices
+    ]
+    assert numpy.allclose(col_margins(p_matrices), expect)
+    got = [min_diff_from_diag(m, diag, offdiag) for m in p_matrices]
+    assert numpy.allclose(got, expect)
+    assert min_col_diff(p_matrices[0], diag, offdiag) == min(got[0])
+    assert numpy.allclose([min_diff_from_diag(m) for m in p_matrices], expect)
+
+
+def test_min_diff_from_diag_indices():
+    m = numpy.random.default_rng(5).random((4, 4))
+    # only the first two rows are compared with the diagonal
+    offdiag = ~numpy.eye(4, dtype=bool)
+    offdiag[2:] = False
+    got = min_diff_from_diag(m, numpy.diag_indices(4), offdiag)
+    expect = numpy.diagonal(m) - numpy.where(offdiag, m, m.min()).max(axis=0)
+    assert numpy.allclose(got, expect)
+    assert not numpy.allclose(got, min_diff_from_diag(m))
+    assert min_col_diff(m, off_diag_indices=offdiag) == expect.min()
+
+
+def test_calc_delta_col_margins():
+    rng = numpy.random.default_rng(4)
+    psubs = ModelPsubs(
+        source="test",
+        psubs={(f"edge.{i}",): DictArray(rng.random((4, 4))) for i in range(6)},
+    )
+    delta_col, margins = calc_delta_col_margins(psubs)
+    assert margins.shape == (6, 4)
+    assert numpy.allclose(delta_col, margins.min(axis=1))
+    assert list(calc_delta_col(psubs).values()) == delta_col.tolist()
+
+
+def test_calc_delta_col_empty():
+    psubs = ModelPsubs(source="test", psubs={})
+    delta_col, margins = calc_delta_col_margins(psubs)
+    assert delta_col.shape == (0,)
+    assert calc_delta_col(psubs) == {}
+
+
+@pytest.mark.parametrize("dim", [20, 61])
+def test_col_margins_large(dim):
+    matrix = numpy.full((dim, dim), 0.1 / (dim - 1))
+    numpy.fill_diagonal(matrix, 0.9)
+    matrix[dim - 1, 0] = 0.5
+    margins = col_margins(matrix[numpy.newaxis])
+    assert margins.shape == (1, dim)
+    assert numpy.isclose(margins[0, 0], 0.4)
+    assert numpy.allclose(margins[0, 1:], 0.9 - 0.1 / (dim - 1))
+
+
+def test_calc_delta_col_duplicates():
+    rng = numpy.random.default_rng(5)
+    matrices = rng.random((3, 4, 4))
+    psubs = ModelPsubs(
+        source="test",
+        psubs={(f"edge.{i}",): DictArray(matrices[i % 3]) for i in range(7)},
+    )
+    delta_col, margins = calc_delta_col_margins(psubs)
+    assert numpy.array_equal(margins, col_margins(psubs.to_array()))
+    assert numpy.array_equal(delta_col, margins.min(axis=1))
+
+
+@pytest.mark.parametrize("dim", [4, 20])
+@pytest.mark.parametrize("stacked", [False, True])
+def test_calc_delta_col_float32(dim, stacked):
+    rng = numpy.random.default_rng(dim)
+    matrices = rng.random((12, dim, dim))
+    # columns whose margins differ by less than float32 resolution
+    matrices[::2, 1, 0] = matrices[::2, 0, 0] - 1e-12
+    matrices[::3, :, 2] = matrices[::3, :, 1] + 1e-13
+    keys = [(f"edge.{i}",) for i in range(12)]
+    if stacked:
+        psubs = ModelPsubs.from_array("test", keys, matrices)
+    else:
+        psubs = ModelPsubs(
+            source="test", psubs={k: DictArray(m) for k, m in zip(keys, matrices)}
+        )
+    got = calc_delta_col(psubs, float32=True)
+    if not stacked:
+        assert numpy.dtype(numpy.float64) not in psubs._stacked
+    assert got == calc_delta_col(psubs)
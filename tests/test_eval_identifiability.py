@@ -1,20 +1,44 @@
+import json
+import pathlib
+import random
+
+import numpy
 import pytest
 
 from cogent3 import make_tree
+from cogent3.core.tree import PhyloNode
+from cogent3.util.deserialise import deserialise_object
 
-from phylim.classify_matrix import CHAINSAW, DLC, IDENTITY, LIMIT, SYMPATHETIC
+from phylim.classify_matrix import (
+    CATEGORY_CODES,
+    MATRIX_CATEGORIES,
+    CHAINSAW,
+    DLC,
+    IDENTITY,
+    LIMIT,
+    SYMPATHETIC,
+    ModelPsubs,
+)
 from phylim.eval_identifiability import (
     BADMTX,
     BADNODES,
     IDENTIFIABLE,
+    CheckMode,
     IdentCheckRes,
+    IdentifiabilityEvaluator,
     ModelMatrixCategories,
     break_path,
     eval_identifiability,
+    eval_identifiability_batch,
+    eval_identifiability_modes,
     eval_mcats,
     eval_paths,
+    eval_strictness,
+    eval_verdict,
     find_bad_nodes,
     find_intersection,
+    find_unreachable,
+    tip_reachable,
     trav_tip_to_root,
 )
 
@@ -357,3 +381,344 @@ def test_to_rich_dict_identcheckres():
     assert all(
         k in result for k in ["source", "strict", "names", "violation_type", "version"]
     )
+
+
+@pytest.mark.parametrize(
+    "names,violation_type",
+    [(None, IDENTIFIABLE), ({"edge.0", "edge.1"}, BADMTX), ({"root"}, BADNODES)],
+)
+def test_deserialise_identcheckres(names, violation_type):
+    check = IdentCheckRes(
+        source="foo", strict=True, names=names, violation_type=violation_type
+    )
+    assert deserialise_object(json.dumps(check.to_rich_dict())) == check
+
+
+def _random_tree(num_tips: int, rng: random.Random) -> PhyloNode:
+    nodes = [PhyloNode(name=f"t{i}") for i in range(num_tips)]
+    num_internal = 0
+    while len(nodes) > 3:
+        first, second = (nodes.pop(rng.randrange(len(nodes))) for _ in range(2))
+        nodes.append(PhyloNode(name=f"edge.{num_internal}", children=[first, second]))
+        num_internal += 1
+    return PhyloNode(name="root", children=nodes)
+
+
+def _eval_paths_by_paths(mcats, tree) -> set:
+    """the original tip-to-root path algorithm"""
+    msyms = {k[0] for k, v in mcats.items() if v in {SYMPATHETIC, LIMIT}}
+    if len(msyms) < 2:
+        return set()
+    tips = set(tree.get_tip_names())
+    nodes = set(tree.get_node_names()) - tips
+    breaked_paths = []
+    for path in trav_tip_to_root(tree):
+        breaked_paths.extend(break_path(path, msyms))
+    return find_bad_nodes(find_intersection(breaked_paths), tips, nodes)
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_eval_paths_matches_path_algorithm(seed):
+    rng = random.Random(seed)
+    tree = _random_tree(rng.randint(3, 40), rng)
+    sym_fraction = rng.random()
+    mcats = {
+        (node.name,): SYMPATHETIC if rng.random() < sym_fraction else DLC
+        for node in tree.preorder(include_self=False)
+    }
+    assert eval_paths(mcats, tree) == _eval_paths_by_paths(mcats, tree)
+
+
+@pytest.mark.parametrize(
+    "cut,expected",
+    [
+        ([False] * 5, [True] * 5),
+        ([False, True, False, False, False], [True, True, True, True, True]),
+        ([False, True, False, True, True], [False, True, True, True, True]),
+        ([False, False, True, True, True], [False, False, True, True, True]),
+    ],
+)
+def test_tip_reachable(cut, expected):
+    # ((t3,t4)edge.0,t2)root in preorder: root, edge.0, t3, t4, t2
+    parents = [-1, 0, 1, 1, 0]
+    is_tip = [False, False, True, True, True]
+    assert tip_reachable(parents, is_tip, cut) == expected
+
+
+def test_eval_paths_deep_caterpillar():
+    num_tips = 100_000
+    node = PhyloNode(name="t0")
+    for i in range(1, num_tips - 1):
+        node = PhyloNode(name=f"edge.{i}", children=[node, PhyloNode(name=f"t{i}")])
+    tree = PhyloNode(name="root", children=[node, PhyloNode(name=f"t{num_tips - 1}")])
+    mcats = {(n.name,): DLC for n in tree.preorder(include_self=False)}
+    # every internal edge sympathetic, every tip DLC: all nodes reach a tip
+    mcats |= {(f"edge.{i}",): SYMPATHETIC for i in range(1, num_tips - 1)}
+    assert eval_paths(mcats, tree) == set()
+    # sympathetic tips on the lower half leave those nodes without a tip
+    mcats |= {(f"t{i}",): SYMPATHETIC for i in range(num_tips // 2)}
+    expected = {f"edge.{i}" for i in range(1, num_tips // 2)}
+    assert eval_paths(mcats, tree) == expected
+
+
+@pytest.mark.parametrize("strict", [False, True])
+@pytest.mark.parametrize("seed", range(10))
+def test_identifiability_evaluator_updates(seed, strict):
+    rng = random.Random(seed)
+    tree = _random_tree(rng.randint(3, 30), rng)
+    edges = [n.name for n in tree.preorder(include_self=False)]
+    choices = [DLC, DLC, SYMPATHETIC, SYMPATHETIC, LIMIT, IDENTITY, CHAINSAW]
+    mcats = {(e,): rng.choice(choices[:5]) for e in edges}
+    evaluator = IdentifiabilityEvaluator(
+        ModelMatrixCategories(source="foo", mcats=mcats), tree, strict=strict
+    )
+    for _ in range(50):
+        edge = rng.choice(edges)
+        mcat = rng.choice(choices)
+        mcats[(edge,)] = mcat
+        evaluator.update(edge, mcat)
+        expected = eval_identifiability(
+            ModelMatrixCategories(source="foo", mcats=mcats), tree, strict=strict
+        )
+        assert evaluator.check == expected
+
+
+def test_identifiability_evaluator_update_many():
+    tree = make_tree("((1,2)edge.0,(3,4)edge.1);")
+    mcats = {(n,): DLC for n in ["1", "2", "3", "4", "edge.0", "edge.1"]}
+    evaluator = IdentifiabilityEvaluator(
+        ModelMatrixCategories(source="foo", mcats=mcats), tree
+    )
+    assert evaluator.check.is_identifiable
+    evaluator.update_many({("3",): SYMPATHETIC, "4": SYMPATHETIC, "edge.1": LIMIT})
+    assert evaluator.bad_nodes == {"edge.1"}
+    assert evaluator.check.violation_type == BADNODES
+    evaluator.update("4", DLC)
+    assert evaluator.check.is_identifiable
+    evaluator.update("edge.0", CHAINSAW)
+    assert evaluator.check.violation_type == BADMTX
+    assert evaluator.check.names == {"edge.0"}
+
+
+DATADIR = pathlib.Path(__file__).parent / "data"
+
+
+@pytest.fixture()
+def make_psub(make_dlc, make_chainsaw, make_limit):
+    sym = numpy.load(DATADIR / "matrices" / "sympathetic1.npy")
+    makers = {
+        DLC: make_dlc,
+        CHAINSAW: make_chainsaw,
+        LIMIT: make_limit,
+        IDENTITY: lambda: numpy.eye(4),
+        SYMPATHETIC: lambda: sym,
+    }
+    return lambda mcat: makers[mcat]()
+
+
+@pytest.mark.parametrize(
+    "cut,expected",
+    [
+        ([False] * 5, None),
+        ([False, True, False, True, True], 0),
+        ([False, False, True, True, True], 0),
+        ([False, True, True, True, False], 1),
+    ],
+)
+def test_find_unreachable(cut, expected):
+    # ((t3,t4)edge.0,t2)root in preorder: root, edge.0, t3, t4, t2
+    parents = [-1, 0, 1, 1, 0]
+    is_tip = [False, False, True, True, True]
+    assert find_unreachable(parents, is_tip, cut) == expected
+
+
+@pytest.mark.parametrize("strict", [False, True])
+@pytest.mark.parametrize("seed", range(10))
+def test_eval_verdict(seed, strict, make_psub):
+    rng = random.Random(seed)
+    tree = _random_tree(rng.randint(3, 30), rng)
+    choices = [DLC] * 6 + [SYMPATHETIC] * 3 + [LIMIT, IDENTITY, CHAINSAW]
+    mcats = {(n.name,): rng.choice(choices) for n in tree.preorder(include_self=False)}
+    psubs = ModelPsubs(source="foo", psubs={k: make_psub(v) for k, v in mcats.items()})
+    expected = eval_identifiability(
+        ModelMatrixCategories(source="foo", mcats=mcats), tree, strict=strict
+    )
+    got = eval_verdict(psubs, tree, strict=strict, chunk_size=4)
+    assert got.violation_type == expected.violation_type
+    assert got.strict == strict
+    if expected.names is None:
+        assert got.names is None
+    else:
+        assert len(got.names) == 1
+        assert got.names <= expected.names
+
+
+def test_eval_paths_counts():
+    tree = make_tree("((a,b)edge.0,(c,d)edge.1,e);")
+    mcats = {(n,): DLC for n in tree.get_node_names(include_self=False)}
+    counts = {}
+    eval_paths(mcats | {("a",): SYMPATHETIC}, tree, counts)
+    assert counts == {"paths_broken": 1, "nodes_examined": 0}
+    eval_paths(mcats | {("a",): SYMPATHETIC, ("b",): SYMPATHETIC}, tree, counts)
+    assert counts == {"paths_broken": 2, "nodes_examined": 8}
+
+
+def test_eval_verdict_duplicates(make_dlc):
+    tree = make_tree("((a,b)edge.0,(c,d)edge.1,e);")
+    dlc = make_dlc()
+    psubs = ModelPsubs(
+        source="foo",
+        psubs={(n,): dlc for n in tree.get_node_names(include_self=False)},
+    )
+    counts = {}
+    got = eval_verdict(psubs, tree, strict=False, chunk_size=1, counts=counts)
+    assert got.violation_type == IDENTIFIABLE
+    assert counts["edges_classified"] == 7
+
+
+@pytest.mark.parametrize("strict", [False, True])
+@pytest.mark.parametrize("seed", range(5))
+def test_eval_identifiability_batch(seed, strict):
+    rng = random.Random(seed)
+    tree = _random_tree(rng.randint(3, 40), rng)
+    edges = tree.get_node_names(include_self=False)
+    rng.shuffle(edges)
+    # few chainsaws, so that many replicates reach the path check
+    mix = {DLC: 20.0, SYMPATHETIC: 3.0, LIMIT: 3.0, IDENTITY: 0.5, CHAINSAW: 0.1}
+    weights = numpy.array([mix[m] for m in MATRIX_CATEGORIES])
+    codes = numpy.random.default_rng(seed).choice(
+        len(MATRIX_CATEGORIES), size=(200, len(edges)), p=weights / weights.sum()
+    )
+    got = eval_identifiability_batch(codes, tree, strict=strict, edges=edges)
+    assert len(got) == 200
+    for i, row in enumerate(codes):
+        mcats = {(e,): MATRIX_CATEGORIES[c] for e, c in zip(edges, row)}
+        expect = eval_identifiability(
+            ModelMatrixCategories(source=str(i), mcats=mcats), tree, strict=strict
+        )
+        assert got[i] == expect
+        assert got.is_identifiable[i] == expect.is_identifiable
+    assert {c.violation_type for c in got.to_list()} >= {BADNODES, IDENTIFIABLE}
+
+
+def test_eval_identifiability_batch_defaults():
+    tree = make_tree("((a,b)edge.0,(c,d)edge.1,e)root;")
+    edges = tree.get_node_names(include_self=False)
+    codes = numpy.full((2, len(edges)), CATEGORY_CODES[DLC])
+    # edge.0 is cut from its parent and both children
+    cut = [edges.index(n) for n in ("a", "b", "edge.0")]
+    codes[1, cut] = CATEGORY_CODES[SYMPATHETIC]
+    got = eval_identifiability_batch(codes, tree, strict=False, sources=["x", "y"])
+    assert got.edges == tuple(edges)
+    assert got[0].is_identifiable
+    assert got[1].names == {"edge.0"}
+    assert got[1].source == "y"
+
+    with pytest.raises(ValueError):
+        eval_identifiability_batch(codes[:, 1:], tree, strict=False)
+    with pytest.raises(ValueError):
+        eval_identifiability_batch(codes, tree, strict=False, sources=["x"])
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_eval_strictness(seed):
+    rng = random.Random(seed)
+    tree = _random_tree(rng.randint(3, 30), rng)
+    choices = [DLC] * 6 + [SYMPATHETIC] * 3 + [LIMIT, IDENTITY, CHAINSAW]
+    mcats = ModelMatrixCategories(
+        source="foo",
+        mcats={
+            (n.name,): rng.choice(choices) for n in tree.preorder(include_self=False)
+        },
+    )
+    got = eval_strictness(mcats, tree, [False, True])
+    assert got == {
+        strict: eval_identifiability(mcats, tree, strict) for strict in (False, True)
+    }
+
+
+def test_eval_strictness_one_tree_pass():
+    tree = make_tree("((a,b)edge.0,(c,d)edge.1,e);")
+    mcats = {(n,): DLC for n in tree.get_node_names(include_self=False)}
+    # edge.0 is cut from its parent and both children
+    mcats |= {(n,): SYMPATHETIC for n in ("a", "b", "edge.0")}
+    mcats[("c",)] = IDENTITY
+    counts = {}
+    got = eval_strictness(
+        ModelMatrixCategories(source="foo", mcats=mcats), tree, [True, False], counts
+    )
+    assert got[True].violation_type == BADMTX
+    assert got[True].names == {"c"}
+    assert got[False].violation_type == BADNODES
+    assert got[False].names == {"edge.0"}
+    assert counts == {"bad_matrices": 1, "paths_broken": 3, "nodes_examined": 8}
+
+
+def test_eval_identifiability_modes(make_psub):
+    tree = make_tree("((a,b)edge.0,(c,d)edge.1,e);")
+    mcats = {(n,): DLC for n in tree.get_node_names(include_self=False)}
+    mcats[("c",)] = IDENTITY
+    psubs = ModelPsubs(source="foo", psubs={k: make_psub(v) for k, v in mcats.items()})
+    # a near identity matrix, which is IDENTITY only with a loose atol
+    psubs.psubs[("d",)] = numpy.eye(4) * (1 - 3e-5) + 1e-5
+    modes = [
+        CheckMode(strict=False),
+        CheckMode(strict=True),
+        CheckMode(strict=True, atol=1e-3),
+    ]
+    counts = {}
+    got = eval_identifiability_modes(psubs, tree, modes, counts=counts)
+    assert list(got) == modes
+    assert got[modes[0]].is_identifiable
+    assert got[modes[1]].names == {"c"}
+    assert got[modes[2]].names == {"c", "d"}
+    assert counts["classifications"] == 2
+
+    classified = {}
+    eval_identifiability_modes(psubs, tree, modes[:1], classified=classified)
+    counts = {}
+    again = eval_identifiability_modes(
+        psubs, tree, modes, classified=classified, counts=counts
+    )
+    assert again == got
+    assert counts["classifications"] == 1
+
+
+def test_check_mode_rich_dict():
+    mode = CheckMode(strict=True, atol=1e-3)
+    assert CheckMode.from_rich_dict(json.loads(json.dumps(mode.to_rich_dict()))) == mode
+
+
+def test_lf_edge_keys(make_dlc, make_chainsaw):
+    # likelihood functions key psubs by edge name, taking the first
+    # character of these keys gave "e" for both edge.0 and edge.1
+    tree = make_tree("((a,b)edge.0,(c,d)edge.1);")
+    names = tree.get_node_names(include_self=False)
+    mcats = {n: DLC for n in names} | {"edge.0": SYMPATHETIC, "edge.1": SYMPATHETIC}
+    as_tuples = {(k,): v for k, v in mcats.items()}
+    counts = {}
+    got = eval_identifiability(
+        ModelMatrixCategories(source="foo", mcats=mcats), tree, False, counts=counts
+    )
+    expect = eval_identifiability(
+        ModelMatrixCategories(source="foo", mcats=as_tuples), tree, False
+    )
+    assert got == expect
+    assert got.violation_type == BADNODES
+    assert got.names == {"root"}
+    assert counts["paths_broken"] == 2
+    assert eval_paths(mcats, tree) == eval_paths(as_tuples, tree)
+
+    evaluator = IdentifiabilityEvaluator(
+        ModelMatrixCategories(source="foo", mcats=mcats), tree, strict=False
+    )
+    assert evaluator.check == expect
+
+    dlc = make_dlc()
+    psubs = ModelPsubs(
+        source="foo",
+        psubs={n: dlc for n in names} | {"edge.1": make_chainsaw()},
+    )
+    got = eval_verdict(psubs, tree, strict=False)
+    assert got.violation_type == BADMTX
+    assert got.names == {"edge.1"}
@@ -0,0 +1,41 @@
+import pytest
+
+from cogent3.app.data_store import Mode
+from cogent3.app.io import open_data_store
+
+from phylim.parallel import _is_sqlite, _map_chunks, _open_dstore
+
+
+@pytest.mark.parametrize("max_workers", [1, 2])
+def test_map_chunks(max_workers):
+    chunks = [[1] * i for i in range(10)]
+    got = sorted(_map_chunks(len, chunks, max_workers))
+    assert got == list(range(10))
+
+
+def test_map_chunks_bounded():
+    taken = []
+
+    def chunks():
+        for i in range(20):
+            taken.append(i)
+            yield [i]
+
+    results = _map_chunks(sum, chunks(), 2)
+    next(results)
+    # no more than 2 * max_workers chunks are taken before a result is used
+    assert len(taken) <= 4
+    assert len(list(results)) == 19
+    assert len(taken) == 20
+
+
+@pytest.mark.parametrize("name", ["fits", "fits.sqlitedb"])
+def test_open_dstore(tmp_path, name):
+    dstore = _open_dstore(str(tmp_path / name), mode="w")
+    assert _is_sqlite(dstore) == name.endswith(".sqlitedb")
+    assert _open_dstore(dstore, mode="a") is dstore
+    # worker processes only get read-only members
+    reader = _open_dstore(dstore, mode="r")
+    assert reader is not dstore and reader.mode is Mode.r
+    reopened = _open_dstore(dstore, mode="a", reopen=True)
+    assert reopened is not dstore and reopened.source == dstore.source
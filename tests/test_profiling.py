@@ -0,0 +1,43 @@
+import pytest
+from cogent3.core.table import Table
+
+from phylim.profiling import NO_PROFILE, StageProfile
+
+
+def test_stage_profile():
+    profile = StageProfile(source="foo")
+    with profile.stage("first") as counts:
+        counts["edges"] = 3
+    with profile.stage("second"):
+        pass
+    assert [s.name for s in profile.stages] == ["first", "second"]
+    assert profile["first"].counts == {"edges": 3}
+    assert profile["second"].seconds >= 0
+    assert profile.total_seconds == sum(s.seconds for s in profile.stages)
+    with pytest.raises(KeyError):
+        profile["third"]
+
+
+def test_stage_profile_records_failed_stage():
+    profile = StageProfile()
+    with pytest.raises(ValueError):
+        with profile.stage("fails"):
+            raise ValueError
+    assert profile["fails"].seconds >= 0
+
+
+def test_stage_profile_output():
+    profile = StageProfile(source="foo")
+    with profile.stage("first") as counts:
+        counts["edges"] = 3
+    rich = profile.to_rich_dict()
+    assert rich["source"] == "foo"
+    assert rich["stages"][0]["counts"] == {"edges": 3}
+    assert isinstance(profile.to_table(), Table)
+    assert isinstance(profile._repr_html_(), str)
+
+
+def test_no_profile():
+    with NO_PROFILE.stage("ignored") as counts:
+        counts["edges"] = 3
+    assert not hasattr(NO_PROFILE, "stages")
@@ -0,0 +1,113 @@
+import pathlib
+
+import numpy
+import pytest
+
+from cogent3 import make_tree
+from cogent3.util.deserialise import deserialise_object
+
+from phylim.apps import InferenceContext, load_context, phylim
+from phylim.classify_matrix import ModelPsubs, _edge_name, classify_matrix
+from phylim.delta_col import calc_delta_col
+from phylim.eval_identifiability import eval_identifiability
+from phylim.psub_archive import PsubArchive, PsubArchiveWriter, write_psub_archive
+
+
+DATADIR = pathlib.Path(__file__).parent / "data"
+
+_model_res = deserialise_object(
+    f"{DATADIR}/eval_identifiability/unid_model_result.json"
+)
+
+
+@pytest.fixture
+def archive(tmp_path):
+    return write_psub_archive(tmp_path / "archive", [_model_res, _model_res.lf])
+
+
+def test_archive_round_trip(archive):
+    assert len(archive) == 2
+    expect = _model_res.lf.get_all_psubs()
+    for context in archive:
+        assert context.params is None
+        got = context.psubs.psubs
+        assert list(got) == sorted(expect)
+        for key, psub in got.items():
+            numpy.testing.assert_array_equal(psub.to_array(), expect[key].to_array())
+            assert list(psub.keys()) == list(expect[key].keys())
+    assert archive.sources == [archive[0].source] * 2
+    assert [c.model_name for c in archive] == [_model_res.name, _model_res.lf.name]
+
+
+def test_archive_is_memory_mapped(archive):
+    stacked = archive.stacked(0)
+    assert isinstance(stacked, numpy.memmap)
+    assert not stacked.flags.writeable
+    assert archive.stacked(-1).shape == stacked.shape
+
+
+def test_archive_shares_trees(archive):
+    assert archive.tree(0) is archive.tree(1)
+    assert set(archive.tree(0).get_node_names()) == set(
+        _model_res.lf.tree.get_node_names()
+    )
+
+
+@pytest.mark.parametrize("strict", [False, True])
+def test_archive_checks_match(archive, strict):
+    direct = phylim(strict=strict)(_model_res)
+    context = archive[0]
+    mcats = classify_matrix(context.psubs)
+    expect = classify_matrix(load_context(_model_res, with_params=False).psubs)
+    assert {_edge_name(k): v for k, v in mcats.items()} == {
+        _edge_name(k): v for k, v in expect.items()
+    }
+    assert calc_delta_col(context.psubs) == pytest.approx(direct.delta_col)
+    check = eval_identifiability(mcats, context.tree, strict)
+    assert check.violation_type == direct.check.violation_type
+    assert check.names == direct.check.names
+
+
+def test_phylim_on_archive(archive):
+    direct = phylim()(_model_res)
+    record = phylim()(archive[0])
+    assert record.is_identifiable == direct.is_identifiable
+    assert record.boundary_values is None
+    assert record.nondlc_and_identity == direct.nondlc_and_identity
+    assert record.delta_col == pytest.approx(direct.delta_col)
+    lazy = phylim(lazy=True)(archive[0])
+    assert lazy.boundary_values is None
+    verdict = phylim(verdict_only=True)(archive[0])
+    assert verdict.is_identifiable == direct.is_identifiable
+
+
+def test_writer_refuses_existing(tmp_path):
+    path = tmp_path / "archive"
+    with PsubArchiveWriter(path) as writer:
+        writer.add(_model_res)
+        assert len(writer) == 1
+    with pytest.raises(FileExistsError):
+        PsubArchiveWriter(path)
+    with PsubArchiveWriter(path, overwrite=True):
+        pass
+    assert len(PsubArchive(path)) == 0
+
+
+@pytest.mark.parametrize("num_tips", [10, 1000])
+def test_archive_index_size(tmp_path, num_tips):
+    # the short strings are not padded to the length of the newick tree
+    tree = make_tree(tip_names=[f"tip{i}" for i in range(num_tips)])
+    edges = tree.get_node_names(include_self=False)
+    stacked = numpy.tile(numpy.eye(2), (len(edges), 1, 1))
+    num_fits = 20
+    path = tmp_path / "archive"
+    with PsubArchiveWriter(path) as writer:
+        for i in range(num_fits):
+            psubs = ModelPsubs.from_array(f"fit{i}", edges, stacked)
+            writer.add(InferenceContext(f"fit{i}", "GN", tree, psubs, None))
+    newick = len(tree.get_newick(with_node_names=True))
+    codes = 4 * num_fits * len(edges)
+    assert (path / "index.npz").stat().st_size < 2 * (newick + codes) + 10_000
+    archive = PsubArchive(path)
+    assert archive.edge_names(-1) == edges
+    assert archive.sources[-1] == f"fit{num_fits - 1}"
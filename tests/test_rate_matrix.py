@@ -0,0 +1,48 @@
+import numpy
+import pytest
+
+from cogent3.maths.matrix_exponentiation import PadeExponentiator
+
+from phylim.rate_matrix import expm_lengths
+
+
+def _reversible(dim, rng):
+    mprobs = rng.dirichlet(numpy.ones(dim))
+    rates = rng.uniform(0.1, 5.0, size=(dim, dim))
+    q_matrix = (rates + rates.T) * mprobs
+    numpy.fill_diagonal(q_matrix, 0)
+    numpy.fill_diagonal(q_matrix, -q_matrix.sum(axis=1))
+    return q_matrix, mprobs
+
+
+@pytest.mark.parametrize("dim", [4, 20, 61])
+@pytest.mark.parametrize("reversible", [False, True])
+def test_expm_lengths(dim, reversible):
+    rng = numpy.random.default_rng(dim)
+    if reversible:
+        q_matrix, mprobs = _reversible(dim, rng)
+    else:
+        q_matrix = rng.uniform(0.1, 2.0, size=(dim, dim))
+        numpy.fill_diagonal(q_matrix, 0)
+        numpy.fill_diagonal(q_matrix, -q_matrix.sum(axis=1))
+        mprobs = None
+    lengths = numpy.array([0.0, 1e-4, 0.05, 0.5, 3.0])
+    got = expm_lengths(q_matrix, lengths, mprobs=mprobs)
+    assert got.shape == (len(lengths), dim, dim)
+    expm = PadeExponentiator(q_matrix)
+    for psub, length in zip(got, lengths):
+        assert numpy.allclose(psub, expm(length), atol=1e-12)
+    assert numpy.allclose(got.sum(axis=2), 1)
+
+
+def test_expm_lengths_defective():
+    # not diagonalisable, so the Pade fallback is used
+    q_matrix = numpy.array([[-1.0, 1.0, 0.0], [0.0, -1.0, 1.0], [0.0, 0.0, 0.0]])
+    got = expm_lengths(q_matrix, [0.5, 2.0])
+    expm = PadeExponentiator(q_matrix)
+    assert numpy.allclose(got[0], expm(0.5))
+    assert numpy.allclose(got[1], expm(2.0))
+
+
+def test_expm_lengths_empty():
+    assert expm_lengths(-numpy.eye(4), []).shape == (0, 4, 4)
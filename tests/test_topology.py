@@ -0,0 +1,89 @@
+import numpy
+import pytest
+
+from cogent3 import make_tree
+
+from phylim.topology import (
+    TreeIndex,
+    clear_tree_index_cache,
+    make_tree_index,
+    tree_index_cache_info,
+)
+
+
+def test_make_tree_index():
+    tree = make_tree("((A,B)edge.0,(C,D)edge.1);")
+    index = make_tree_index(tree)
+    assert isinstance(index, TreeIndex)
+    assert index.names == tuple(tree.get_node_names())
+    assert len(index) == 7
+    assert index.parents[0] == -1
+    for node in tree.preorder(include_self=False):
+        assert index.names[index.parents[index.ids[node.name]]] == node.parent.name
+    assert index.tip_names == tree.get_tip_names()
+    assert numpy.all(index.parents[1:] < numpy.arange(1, len(index)))
+
+
+def test_make_tree_index_duplicate_names():
+    tree = make_tree("((A,B)x,(C,D)y);")
+    tree.get_node_matching_name("y").name = "x"
+    with pytest.raises(ValueError):
+        make_tree_index(tree)
+
+
+def test_make_tree_index_cached():
+    clear_tree_index_cache()
+    first = make_tree_index(make_tree("((A,B)edge.0,(C,D)edge.1);"))
+    # same topology and names, different branch lengths
+    second = make_tree_index(make_tree("((A:1,B:2)edge.0:1,(C:3,D:1)edge.1:2);"))
+    assert second is first
+    info = tree_index_cache_info()
+    assert (info.hits, info.misses) == (1, 1)
+    # a different topology with the same names is not shared
+    other = make_tree_index(make_tree("((A,C)edge.0,(B,D)edge.1);"))
+    assert other is not first
+    assert tree_index_cache_info().misses == 2
+
+
+def test_make_tree_index_renamed():
+    tree = make_tree("((A,B)edge.0,(C,D)edge.1);")
+    index = make_tree_index(tree)
+    tree.get_node_matching_name("A").name = "E"
+    renamed = make_tree_index(tree)
+    assert renamed is not index
+    assert "E" in renamed.ids and "A" not in renamed.ids
+
+
+def test_tree_index_children():
+    tree = make_tree("((A,B,C)edge.0,(D,(E,F)edge.1)edge.2,G);")
+    index = make_tree_index(tree)
+    for node in tree.preorder():
+        i = index.ids[node.name]
+        got = index.children[index.child_offsets[i] : index.child_offsets[i + 1]]
+        assert [index.names[c] for c in got] == [c.name for c in node.children]
+        assert index.depth[i] == len(node.ancestors())
+        assert index.is_tip[i] == node.is_tip()
+
+
+def test_tree_index_levels():
+    tree = make_tree("((A,B,C)edge.0,(D,(E,F)edge.1)edge.2,G);")
+    index = make_tree_index(tree)
+    seen = []
+    for depth, (nodes, parents, starts, run_parents) in enumerate(index.levels, 1):
+        assert (index.depth[nodes] == depth).all()
+        assert (index.parents[nodes] == parents).all()
+        assert (parents[starts] == run_parents).all()
+        assert len(set(run_parents)) == len(run_parents)
+        seen.extend(nodes)
+    assert sorted(seen) == list(range(1, len(index)))
+
+
+def test_tree_index_read_only():
+    index = make_tree_index(make_tree("((A,B)edge.0,(C,D)edge.1);"))
+    with pytest.raises(ValueError):
+        index.parents[1] = 0
+    with pytest.raises(ValueError):
+        index.levels[0][0][0] = 0
+    assert index.mask(["A", "edge.1"]).tolist() == [
+        n in ("A", "edge.1") for n in index.names
+    ]